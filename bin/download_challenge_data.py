@@ -4,6 +4,8 @@ import warnings
 import re
 from guss import GUSS
 from guss.gussErrors import GussExceptions
+from guss.downloader import download_jobs
+from guss.filters import ReferenceFilter
 
 class Challenger:
     def __init__(self, **kwargs):
@@ -12,6 +14,12 @@ class Challenger:
         self.as_of_date = kwargs.get("as_of_date")
         self.category = kwargs.get("category")
         self.state_fips_list = kwargs.get("state_fips_list")
+        self.max_workers = kwargs.get("max_workers")
+        self.refresh_reference = kwargs.get("refresh_reference", False)
+        # download again files the manifest already holds
+        self.force_download = kwargs.get("force_download", False)
+        # keep a persisted job plan and resume an interrupted run of the same query
+        self.resume = kwargs.get("resume", True)
 
     def __repr__(self):
         return self.guss_instance
@@ -33,51 +41,31 @@ class Challenger:
 
             reference_df = guss.list_challenge_data(as_of_date=self.as_of_date,
                                                     params=category_params,
-                                                    file_name=f"challenge_data_as_of_{self.as_of_date}_{self.category}.csv")
+                                                    file_name=f"challenge_data_as_of_{self.as_of_date}_{self.category}.csv",
+                                                    refresh=self.refresh_reference)
             if len(reference_df) ==0:
                 raise GussExceptions(f"The Challenge reference table is empty for as of data: {self.as_of_date}")
-            num_state = len(self.state_fips_list)
-            state_query = ''
-            if num_state > 1:
-
-                state_list_query = [f"state_fips == '{x}'" for x in self.state_fips_list]
-
-                if 'all' in [x.lower() for x in self.state_fips_list]:
-
-                    reference_df_filtered = reference_df
-                else:
-                    state_query = ' or '.join(state_list_query)
-                    reference_df_filtered = reference_df.query(f"{state_query}")
-
-            elif num_state == 1:
-
-                if 'all' in [x.lower() for x in self.state_fips_list]:
-                    reference_df_filtered = reference_df
-                else:
-
-                    state_query = f"state_fips == '{self.state_fips_list[0]}'"
-                    reference_df_filtered = reference_df.query(f"{state_query}")
-            else:
+            if len(self.state_fips_list) == 0:
                 raise GussExceptions(message="No state fips list provided")
 
+            reference_filter = ReferenceFilter(reference_df, guss.reference_index(reference_df)) \
+                .isin('state_fips', self.state_fips_list)
+            reference_df_filtered = reference_filter.apply()
+
             if len(reference_df_filtered) == 0:
                 raise GussExceptions("check your query params:\n"
                                      f"{reference_df_filtered}\n"
                                      "I got no query back. Try again")
             else:
-                print(f"There are about {len(reference_df_filtered)} download files using the following query:{state_query}")
-
-            output_path = []
+                print(f"There are about {len(reference_df_filtered)} download files using the following query:{reference_filter}")
 
+            jobs = []
             for i, row in reference_df_filtered.iterrows():
-                print(row)
-
                 file_id = row['file_id']
+                print(f"Queued {row['state_fips']} {row['state_name']}, file_id {file_id}")
                 file_name = f"{self.category.replace(' ', '_').replace('-', '_')}_{self.as_of_date.replace('-','_')}_{row['state_fips']}_{row['state_name']}.zip"
+                jobs.append({'data_type': 'challenge', 'file_id': file_id, 'file_name': file_name, 'gis_type': None,
+                             'force': self.force_download, 'as_of_date': self.as_of_date})
 
-                saved_output = guss.download_file(data_type='challenge',
-                                                  file_id=file_id, file_name=file_name,
-                                                  gis_type=None)
-                output_path.append(saved_output)
-
-            return output_path
+            return download_jobs(guss, 'challenge', jobs, max_workers=self.max_workers, resume=self.resume,
+                                 as_of_date=self.as_of_date)
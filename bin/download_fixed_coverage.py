@@ -1,12 +1,15 @@
 import os
 import ast
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import warnings
-import re
-import pandas as pd
-import geopandas as gpd
 from guss import GUSS
 from guss.gussErrors import GussExceptions
-from guss.GUSS import GPK_OUTPUT, SHP_OUTPUT
+from guss.downloader import download_jobs
+from guss.filters import ReferenceFilter
+from guss.availability import read_availability_chunks
+from guss.writers import frame_to_record_batch, write_arrow_layer, write_geoparquet, partial_path, finish_output, \
+    discard_output, drop_gpkg_layer
 
 
 class FixedCoverageDealer:
@@ -20,7 +23,29 @@ class FixedCoverageDealer:
         self.technology_list = kwargs.get("technology_list")
         self.technology_type = kwargs.get("technology_type")
         self.polygonize = kwargs.get("polygonize")
-        self.gis_type = kwargs.get("gis_type")
+        # 'gpkg', 'shp', 'parquet' or 'fgb' in any case, the GUI and README use 'GPKG', 'PARQUET', ...
+        self.gis_type = str(kwargs["gis_type"]).lower() if kwargs.get("gis_type") else None
+        self.max_workers = kwargs.get("max_workers")
+        self.refresh_reference = kwargs.get("refresh_reference", False)
+        # download again files the manifest already holds
+        self.force_download = kwargs.get("force_download", False)
+        # keep a persisted job plan and resume an interrupted run of the same query
+        self.resume = kwargs.get("resume", True)
+        # processes building hex geometry, defaults to one per CPU core, 1 keeps it in the calling process
+        self.polygon_workers = kwargs.get("polygon_workers") or os.cpu_count() or 1
+        # rows read, polygonized and written at a time
+        self.csv_chunk_size = kwargs.get("csv_chunk_size") or 500_000
+        # 'pyarrow' parses with Arrow: categorical codes, narrow integers and h3_res8_id written as int64
+        self.csv_engine = kwargs.get("csv_engine") or 'c'
+        # gis_type 'parquet': rows per row group and codec of the GeoParquet output
+        self.parquet_row_group_size = kwargs.get("parquet_row_group_size") or 100_000
+        self.parquet_compression = kwargs.get("parquet_compression") or 'zstd'
+        # gis_type 'gpkg': 'file' writes a GeoPackage per downloaded file, 'single' one for the whole run and
+        # 'state' one per state
+        self.gpkg_layout = kwargs.get("gpkg_layout") or 'file'
+        # consolidated GeoPackages: 'provider' writes a layer per downloaded file, 'partitioned' a single
+        # 'availability' layer holding every file
+        self.gpkg_layers = kwargs.get("gpkg_layers") or 'provider'
 
     def __repr__(self):
         return self.guss_instance
@@ -43,119 +68,208 @@ class FixedCoverageDealer:
             subcategory = guss.category_subcategory[category][1]
             technology_type = guss.technology_type[1]
 
-            reference_df = guss.get_download_reference(as_of_date=self.as_of_date)
+            reference_df = guss.get_download_reference(as_of_date=self.as_of_date,
+                                                        refresh=self.refresh_reference)
 
             if reference_df.empty:
                 raise GussExceptions(message="please check your as of date, no reference found")
 
-            reference_df_filtered = reference_df[
+            reference_filter = ReferenceFilter(reference_df, guss.reference_index(reference_df))
+            reference_filter.key(category, subcategory, technology_type, 'csv')
 
-                (reference_df['category'] == f'{category}')
-                & (reference_df['subcategory'] == f"{subcategory}")
-                & (reference_df['technology_type'] == f"{technology_type}")
-                & (reference_df["file_type"] == 'csv')
-
-                ]
-            if reference_df_filtered.empty:
+            if reference_filter.count() == 0:
                 raise GussExceptions(
                     message="No reference after filtering. Check your category or subcategory or technology_type,"
                             " or file_type query parameters")
 
-            num_state = len(self.state_fips_list)
-            num_technology = len(self.technology_list)
-            num_provider = len(self.provider_id_list)
-
-            if num_state > 1:
-                state_list_query = [f"state_fips == '{x}'" for x in self.state_fips_list]
-                state_query = ' or '.join(state_list_query)
-                filter_df = reference_df_filtered.query(f"{state_query}")
-            elif num_state == 1:
-                if 'all' in [x.lower() for x in self.state_fips_list]:
-                    filter_df = reference_df_filtered
-                else:
-                    state_query = f"state_fips == '{self.state_fips_list[0]}'"
-                    filter_df = reference_df_filtered.query(f"{state_query}")
-            else:
+            if len(self.state_fips_list) == 0:
                 raise GussExceptions(message="No state fips list provided")
+            if len(self.technology_list) == 0:
+                raise GussExceptions(message="No technology id list provided")
+            if len(self.provider_id_list) == 0:
+                raise GussExceptions(message="No provider id list provided")
 
-            if num_technology > 1:
-
-                technology_list = [f"{x}" for x in self.technology_list]
-
-                if 'all' in [str(x).lower() for x in technology_list]:
-                    raise GussExceptions(message="check technology code list, 'all' should not be provided with other code "
-                                                 "techs")
+            if len(self.technology_list) > 1 and 'all' in [str(x).lower() for x in self.technology_list]:
+                raise GussExceptions(message="check technology code list, 'all' should not be provided with other code "
+                                             "techs")
 
-                technology_query = "|".join(technology_list)
+            # technology_code can hold several comma separated codes, each asked code matches whole codes only:
+            # 4 does not select '40', with one code or several (a single code used to match as a substring)
+            reference_filter.isin('state_fips', self.state_fips_list) \
+                .contains_any('technology_code', self.technology_list) \
+                .isin('provider_id', self.provider_id_list)
 
-                technology_query = fr"\b(?:{technology_query})\b"
+            filter_df = reference_filter.apply(sort_by=['provider_id', 'state_fips', "technology_code", 'speed_tier'])
 
-                filter_df = filter_df[
-                    filter_df['technology_code'].str.contains(technology_query, flags=re.IGNORECASE, regex=True)]
+            print(f"There are total of {len(filter_df)} number of files ready for download.")
 
-            elif num_technology == 1:
-                if 'all' in [str(x).lower() for x in self.technology_list]:
-                    filter_df = reference_df_filtered
-                else:
-                    technology_query = f"{self.technology_list[0]}"
-                    filter_df = filter_df[filter_df['technology_code'].str.contains(technology_query)]
+            jobs = []
+            state_by_file = {}
+            for row in filter_df.itertuples(index=False):
+                file_name = f"{technology_type.replace(' ', '')}_{subcategory.replace(' ', '')}_{row.file_name}.zip"
+                jobs.append({'data_type': self.data_type, 'file_id': row.file_id, 'file_name': file_name,
+                             'gis_type': None, 'force': self.force_download,
+                             'as_of_date': self.as_of_date})
+                state_by_file[file_name] = row.state_fips
+
+            output_path_list = download_jobs(guss, 'fixed', jobs, max_workers=self.max_workers, resume=self.resume,
+                                             as_of_date=self.as_of_date)
+
+            if self.polygonize:
+                executor = None
+                if int(self.polygon_workers) > 1:
+                    # one pool for the whole run, process start-up is paid once. The workers are spawned, forking
+                    # this process would copy the locks held by the download threads, urllib3 pools and SQLite
+                    executor = ProcessPoolExecutor(max_workers=int(self.polygon_workers),
+                                                   mp_context=multiprocessing.get_context('spawn'))
+                try:
+                    if self.gis_type == 'gpkg' and self.gpkg_layout != 'file':
+                        try:
+                            self.polygonize_consolidated(guss, output_path_list, state_by_file, executor=executor)
+                        except GussExceptions:
+                            if not guss.stop:
+                                raise
+                            print("Stopped polygonizing per User request")
+                    else:
+                        for saved_output in output_path_list:
+                            if guss.stop:
+                                print("Stopped polygonizing per User request")
+                                break
+                            try:
+                                self.polygonize_file(guss, saved_output, executor=executor)
+                            except GussExceptions:
+                                if not guss.stop:
+                                    raise
+                finally:
+                    if executor is not None:
+                        executor.shutdown(cancel_futures=True)
+                cache_stats = guss.boundary_cache.stats
+                print(f"Hex boundary cache: {cache_stats['cells']} cells, hit rate {cache_stats['hit_rate']:.0%} "
+                      f"({cache_stats['hits'] + cache_stats['disk_hits']} hits, {cache_stats['misses']} computed)")
+
+            return output_path_list
+
+    def polygonize_file(self, guss, saved_output, executor=None):
+        file_name = os.path.basename(saved_output)
+        try:
+            if self.gis_type == 'gpkg':
+                output_path = os.path.join(GUSS.GPK_OUTPUT, file_name.replace('.zip', '.gpkg'))
+                write_params = {'layer': file_name.replace('.zip', '.gpkg'), 'driver': "GPKG"}
+            elif self.gis_type == 'shp':
+                output_path = os.path.join(GUSS.SHP_OUTPUT, file_name.replace('.zip', '.shp'))
+                write_params = {'driver': 'ESRI Shapefile'}
+            elif self.gis_type == 'parquet':
+                output_path = os.path.join(GUSS.PARQUET_OUTPUT, file_name.replace('.zip', '.parquet'))
+                write_params = {'row_group_size': int(self.parquet_row_group_size),
+                                'compression': self.parquet_compression}
+            elif self.gis_type == 'fgb':
+                output_path = os.path.join(GUSS.FGB_OUTPUT, file_name.replace('.zip', '.fgb'))
+                write_params = {'layer': file_name.replace('.zip', ''), 'driver': 'FlatGeobuf',
+                                'layer_options': {'SPATIAL_INDEX': 'YES'}}
             else:
-                raise GussExceptions(message="No technology id list provided")
-
-            if num_provider > 1:
-                provider_id_list_query = [f"provider_id == '{x}'" for x in self.provider_id_list]
-                provider_id_query = ' or '.join(provider_id_list_query)
-                filter_df = filter_df.query(provider_id_query)
-
-            elif num_provider == 1:
-                if 'all' in self.provider_id_list:
-                    filter_df = filter_df
+                raise GussExceptions(message="Oh no, gis_type was not provided, please indicate gis_type = 'shp', "
+                                             "'gpkg', 'parquet' or 'fgb'")
+
+            # GeoParquet keeps a bbox column so readers can skip row groups outside their area
+            stopped = []
+            batches = self.record_batches(guss, [saved_output], stopped, executor=executor,
+                                          bbox=self.gis_type == 'parquet')
+            # written under a partial name and renamed once complete, a cancel or a failure leaves no truncated
+            # file under the final name
+            partial = partial_path(output_path)
+            discard_output(partial)
+            try:
+                if self.gis_type == 'parquet':
+                    rows = write_geoparquet(partial, batches, **write_params)
                 else:
-                    provider_id_query = f"provider_id == '{self.provider_id_list[0]}'"
-                    filter_df = filter_df.query(provider_id_query)
+                    rows = write_arrow_layer(partial, batches, **write_params)
+            except BaseException:
+                discard_output(partial)
+                raise
+            if stopped:
+                discard_output(partial)
+                raise GussExceptions(message=f"Stopped polygonizing {file_name} per User request")
+            finish_output(partial, output_path)
+
+            if self.gis_type == 'gpkg':
+                print(f"GeoPackage saved to {output_path} ({rows} features)")
+            elif self.gis_type == 'parquet':
+                print(f"GeoParquet saved to {output_path} ({rows} features)")
+            elif self.gis_type == 'fgb':
+                print(f"FlatGeobuf saved to {output_path} ({rows} features)")
             else:
-                raise GussExceptions(message="No provider id list provided")
-
-            filter_df = filter_df.sort_values(
-                by=['provider_id', 'state_fips', "technology_code", 'speed_tier'])
-
-            print(f"There are total of {len(filter_df)} number of files ready for download.")
-
-            output_path_list = []
-            for i, row in filter_df.iterrows():
-                file_id = row['file_id']
-                file_name = f"{technology_type.replace(' ', '')}_{subcategory.replace(' ', '')}_{row['file_name']}.zip"
-
+                print(f"shp saved to {output_path} ({rows} features)")
+        except GussExceptions:
+            raise
+        except Exception as e:
+            raise GussExceptions(message=e)
+
+    def record_batches(self, guss, saved_outputs, stopped, executor=None, bbox=False):
+        # read, polygonize and stream one chunk at a time into a single Arrow write, no file is ever held in memory
+        # whole. A stop request ends the stream and is recorded in stopped.
+        for saved_output in saved_outputs:
+            for df in read_availability_chunks(saved_output, chunk_size=self.csv_chunk_size, engine=self.csv_engine):
                 if guss.stop:
-                    print("Stopped download per User request")
-                    guss.stop = True
-                    break
-                else:
-
-                    saved_output = guss.download_file(data_type=self.data_type, file_id=file_id, file_name=file_name, gis_type=None)
-
+                    stopped.append(True)
+                    return
+                yield frame_to_record_batch(df, guss.polygonize_many(df['h3_res8_id'], executor=executor), bbox=bbox)
+
+    def polygonize_consolidated(self, guss, saved_outputs, state_by_file, executor=None):
+        """
+        Appends every polygonized file into one GeoPackage for the run (gpkg_layout='single') or one per state
+        (gpkg_layout='state'), as a layer per file (gpkg_layers='provider') or one 'availability' layer
+        (gpkg_layers='partitioned').
+
+        Each layer is written in a single write session, so GDAL builds its R-tree once in bulk when the layer is
+        done instead of updating it row by row, and the run leaves a handful of databases instead of thousands.
+
+        :param saved_outputs: list, zip files saved by the download
+        :param state_by_file: dict, state fips of each saved file name, used by gpkg_layout='state'
+        """
+        if self.gpkg_layout not in ('single', 'state'):
+            raise GussExceptions(message="gpkg_layout should be 'file', 'single' or 'state'")
+        if self.gpkg_layers not in ('provider', 'partitioned'):
+            raise GussExceptions(message="gpkg_layers should be 'provider' or 'partitioned'")
+
+        groups = {}
+        for saved_output in saved_outputs:
+            if self.gpkg_layout == 'state':
+                state_fips = state_by_file.get(os.path.basename(saved_output), 'unknown')
+                name = f"availability_{self.as_of_date}_{state_fips}.gpkg"
+            else:
+                name = f"availability_{self.as_of_date}.gpkg"
+            groups.setdefault(os.path.join(GUSS.GPK_OUTPUT, name), []).append(saved_output)
 
-                    if self.polygonize:
-                        try:
-                            df = pd.read_csv(saved_output, compression='zip')
-                            df['geometry'] = df['h3_res8_id'].apply(guss.polygonize)
-
-                            gdf = gpd.GeoDataFrame(df, geometry='geometry', crs=4326)
-                            if self.gis_type == 'gpkg':
-                                output_path = os.path.join(GPK_OUTPUT, file_name.replace('.zip', '.gpkg'))
-                                layer_name = file_name.replace('.zip', '.gpkg')
-                                gdf.to_file(output_path, layer=layer_name, driver="GPKG", engine='pyogrio')
-                                print(f"GeoPackage saved to {output_path}")
-
-                            elif self.gis_type == 'shp':
-                                output_path = os.path.join(SHP_OUTPUT, file_name.replace('.zip', '.shp'))
-                                gdf.to_file(output_path, driver='ESRI Shapefile', engine='pyogrio')
-                                print(f"shp saved to {output_path}")
-                            else:
-                                raise GussExceptions(message="Oh no, gis_type was not provided, please indicate gis_type = 'shp' "
-                                                             "or 'gpkg'")
-                        except Exception as e:
-                            raise GussExceptions(message=e)
-
-                output_path_list.append(saved_output)
-            return output_path_list
\ No newline at end of file
+        try:
+            for output_path, files in groups.items():
+                if self.gpkg_layers == 'partitioned':
+                    layers = [('availability', files)]
+                else:
+                    layers = [(os.path.basename(saved_output).replace('.zip', ''), [saved_output])
+                              for saved_output in files]
+                for layer, layer_files in layers:
+                    stopped = []
+                    created = not os.path.exists(output_path)
+                    try:
+                        rows = write_arrow_layer(output_path, self.record_batches(guss, layer_files, stopped,
+                                                                                  executor=executor),
+                                                 layer=layer, driver='GPKG')
+                    except BaseException:
+                        self.remove_partial_layer(output_path, layer, created)
+                        raise
+                    if stopped:
+                        self.remove_partial_layer(output_path, layer, created)
+                        raise GussExceptions(message=f"Stopped polygonizing {layer} per User request")
+                    print(f"GeoPackage layer {layer} saved to {output_path} ({rows} features)")
+        except GussExceptions:
+            raise
+        except Exception as e:
+            raise GussExceptions(message=e)
+
+    @staticmethod
+    def remove_partial_layer(output_path, layer, created):
+        # the layers written before stay in the GeoPackage, a GeoPackage this layer created goes away with it
+        if created:
+            discard_output(output_path)
+        else:
+            drop_gpkg_layer(output_path, layer)
@@ -1,4 +1,41 @@
 from guss.gussErrors import GussExceptions
+from guss.downloader import download_jobs
+from guss.filters import ReferenceFilter, is_all
+
+
+def speed_tier_selection(reference_filter, technology_list, fiveG_speed_tier_list):
+    """
+    Speed tier clause of a mobile query. 3G/LTE files have no speed tier, 5G-NR files are picked by tier.
+
+    :param reference_filter: ReferenceFilter over the download reference table
+    :param technology_list: list, technology codes (300, 400, 500), ['999'] for Mobile Voice or ['all']
+    :param fiveG_speed_tier_list: list, 5G speed tiers such as "35/3", "7/1"
+    :return: tuple, (boolean mask or None to keep every tier, clause describing it)
+    """
+    lower_tech = (400 in technology_list) or (300 in technology_list)
+    speed_tiers = [str(x) for x in fiveG_speed_tier_list]
+    num_speed_tier = len(speed_tiers)
+
+    if num_speed_tier >= 1:
+        if '999' in technology_list:
+            return None, ''
+        if (400 in technology_list) and (300 in technology_list) and not (500 in technology_list):
+            return reference_filter.isna_mask('speed_tier'), "speed_tier is null"
+        if is_all(technology_list) or ((lower_tech and (500 in technology_list)) if num_speed_tier > 1
+                                       else (lower_tech or (500 in technology_list))):
+            mask = reference_filter.isna_mask('speed_tier') | reference_filter.isin_mask('speed_tier', speed_tiers)
+            return mask, f"(speed_tier is null or speed_tier in {speed_tiers})"
+        return reference_filter.isin_mask('speed_tier', speed_tiers), f"speed_tier in {speed_tiers}"
+
+    if 500 in technology_list:
+        raise GussExceptions(message="No speed tier list provided with technology 500 in technology list")
+    if 300 in technology_list or 400 in technology_list:
+        raise GussExceptions(message="Since Your asking for mobile voice, please remove the technology code(s)"
+                                     " in technology_list parameter")
+    if "999" in technology_list or is_all(technology_list):
+        # every technology, every tier
+        return None, ''
+    raise GussExceptions(message="No speed tier list provided")
 
 
 class MobileCoverageDealer:
@@ -19,6 +56,8 @@ class MobileCoverageDealer:
     :param fiveG_speed_tier_list:
     :param data_type: "35/3", "7/1"
     :param gis_type: valid options "SHP", "GPKG"
+    :param max_workers: int, number of files downloaded at the same time (default guss_instance.download_workers)
+    :param refresh_reference: bool, True to re-download the reference listing instead of using the local cache
     :return: list of downloaded coverage paths.
     """
     def __init__(self, **kwargs):
@@ -33,6 +72,12 @@ class MobileCoverageDealer:
         self.fiveG_speed_tier_list = kwargs.get("fiveG_speed_tier_list")
         self.data_type = kwargs.get("data_type")
         self.gis_type = kwargs.get("gis_type")
+        self.max_workers = kwargs.get("max_workers")
+        self.refresh_reference = kwargs.get("refresh_reference", False)
+        # download again files the manifest already holds
+        self.force_download = kwargs.get("force_download", False)
+        # keep a persisted job plan and resume an interrupted run of the same query
+        self.resume = kwargs.get("resume", True)
 
     def __repr__(self):
         return self.guss_instance
@@ -66,160 +111,55 @@ class MobileCoverageDealer:
         if self.run:
             guss = self.guss_instance
 
-            reference_df = guss.get_download_reference(as_of_date=self.as_of_date)
+            reference_df = guss.get_download_reference(as_of_date=self.as_of_date,
+                                                        refresh=self.refresh_reference)
 
             if reference_df.empty:
                 raise GussExceptions(message=f"Error: no data found for as of date: {self.as_of_date}")
 
-            reference_df_filtered = reference_df[
-
-                (reference_df['category'] == 'Provider')
-                & (reference_df['subcategory'] == f"{self.subcategory}")
-                & (reference_df['technology_type'] == f"{self.technology_type}")
-                & (reference_df["file_type"] == 'gis')
+            reference_filter = ReferenceFilter(reference_df, guss.reference_index(reference_df))
+            reference_filter.key('Provider', self.subcategory, self.technology_type, 'gis')
 
-                ]
-
-            if reference_df_filtered.empty:
+            if reference_filter.count() == 0:
                 raise GussExceptions(message="Error: Check your category or subcategory or technology_type,"
                                              " or file_type query parameters")
 
             num_provider = len(self.provider_id_list)
             num_state = len(self.state_fips_list)
             num_technology = len(self.technology_list)
-            num_speed_tier = len(self.fiveG_speed_tier_list)
-
-            provider_id_query = ''
-            state_query = ''
-            technology_query = ''
-            speed_tier_query = ''
-
-            if num_provider > 1:
-                provider_id_list_query = [f"provider_id == '{x}'" for x in self.provider_id_list]
-                provider_id_query = ' or '.join(provider_id_list_query)
-            elif num_provider == 1:
-                provider_id_query = f"provider_id == '{self.provider_id_list[0]}'"
-            else:
-                raise GussExceptions(message="No provider id list provided")
 
-            if num_state > 1:
-                state_list_query = [f"state_fips == '{x}'" for x in self.state_fips_list]
-                state_query = ' or '.join(state_list_query)
-            elif num_state == 1:
-                state_query = f"state_fips == '{self.state_fips_list[0]}'"
-            else:
+            if num_provider == 0:
+                raise GussExceptions(message="No provider id list provided")
+            if num_state == 0:
                 raise GussExceptions(message="No state fips list provided")
-
-            if num_technology > 1:
-                technology_list_query = [f"technology_code == '{str(x)}'" for x in self.technology_list]
-                technology_query = ' or '.join(technology_list_query)
-            elif num_technology == 1:
-                technology_query = f"technology_code == '{self.technology_list[0]}'"
-            else:
+            if num_technology == 0:
                 raise GussExceptions(message="No technology id list provided")
 
-            if num_speed_tier == 2:
-                # print(num_speed_tier)
-                if ((400 in self.technology_list) and (300 in self.technology_list)) and not (
-                        500 in self.technology_list):
-                    speed_tier_list_query = [f"speed_tier.isna()" for x in self.technology_list]
-                elif ((400 in self.technology_list) or (300 in self.technology_list)) and (500 in self.technology_list):
-                    speed_tier_lower_tech = [f"speed_tier.isna()" for x in [400]]
-                    speed_tier_5G_tech = [f"speed_tier == '{str(x)}'" for x in self.fiveG_speed_tier_list]
-                    speed_tier_list_query = speed_tier_lower_tech + speed_tier_5G_tech
-
-                else:
-                    speed_tier_list_query = [f"speed_tier == '{str(x)}'" for x in self.fiveG_speed_tier_list]
-                if '999' in self.technology_list:
-                    speed_tier_query = ""
-                else:
-                    speed_tier_query = ' or '.join(speed_tier_list_query)
-            elif num_speed_tier == 1:
-                # print(num_speed_tier)
-                if (400 in self.technology_list) and (300 in self.technology_list) and not (
-                        500 in self.technology_list):
-                    speed_tier_list_query = [f"speed_tier.isna()" for x in self.technology_list]
-                elif ((400 in self.technology_list) or (300 in self.technology_list)) or (500 in self.technology_list):
-                    speed_tier_lower_tech = [f"speed_tier.isna()" for x in [400]]
-                    speed_tier_5G_tech = [f"speed_tier == '{str(x)}'" for x in self.fiveG_speed_tier_list]
-                    speed_tier_list_query = speed_tier_lower_tech + speed_tier_5G_tech
-                else:
-                    speed_tier_list_query = [f"speed_tier == '{str(x)}'" for x in self.fiveG_speed_tier_list]
-
-                if '999' in self.technology_list:
-                    speed_tier_query = ""
-                else:
-                    speed_tier_query = ' or '.join(speed_tier_list_query)
-
-            elif num_speed_tier == 0 and (500 in self.technology_list):
-                raise GussExceptions(message="No speed tier list provided with technology 500 in technology list")
-
-            elif num_speed_tier == 0 and (
-                    300 in self.technology_list or 400 in self.technology_list or 500 in self.technology_list):
-                raise GussExceptions(message="Since Your asking for mobile voice, please remove the technology code(s)"
-                                             " in technology_list parameter")
-            elif num_speed_tier == 0 and "999" in self.technology_list:
-                pass
-
-
-            else:
-                raise GussExceptions(message="No speed tier list provided")
-
-            try:
-
-                if ('all' in [x.lower() for x in self.state_fips_list]) and (
-                        'all' in [x.lower() for x in self.provider_id_list]):
-                    if '999' in self.technology_list:
-                        query_string = f"({technology_query})"
-                    else:
-                        query_string = f"({technology_query}) and ({speed_tier_query})"
+            speed_tier_mask, speed_tier_clause = speed_tier_selection(reference_filter, self.technology_list,
+                                                                      self.fiveG_speed_tier_list)
 
-                elif 'all' in [x.lower() for x in self.state_fips_list]:
-                    if '999' in self.technology_list:
-                        query_string = f"({provider_id_query}) and ({technology_query})"
-                    else:
-                        query_string = f"({provider_id_query}) and ({technology_query}) and ({speed_tier_query})"
+            reference_filter.isin('provider_id', self.provider_id_list) \
+                .isin('state_fips', self.state_fips_list) \
+                .isin('technology_code', self.technology_list)
+            if speed_tier_mask is not None:
+                reference_filter.where(speed_tier_mask, speed_tier_clause)
 
-                elif 'all' in [x.lower() for x in self.provider_id_list]:
-                    if '999' in self.technology_list:
-                        query_string = f"({state_query}) and ({technology_query})"
-                    else:
-                        query_string = f"({state_query}) and ({technology_query}) and ({speed_tier_query})"
-
-
-                else:
-                    if '999' in self.technology_list:
-                        query_string = f"({provider_id_query}) and ({state_query}) and ({technology_query})"
-                    else:
-                        query_string = f"({provider_id_query}) and ({state_query}) and ({technology_query}) and ({speed_tier_query})"
-            except AttributeError:
-                raise GussExceptions(message="Please provide provider ids as string")
-
-            filter_df = reference_df_filtered.query(f"{query_string}").sort_values(
-                by=['provider_id', 'state_fips', "technology_code", 'speed_tier'])
+            filter_df = reference_filter.apply(sort_by=['provider_id', 'state_fips', "technology_code", 'speed_tier'])
 
             if len(filter_df) == 0:
                 raise GussExceptions("check your query params:\n"
-                                     f"{query_string}\n"
+                                     f"{reference_filter}\n"
                                      "I got no query back. Try again")
             else:
                 print(f"There are about {len(filter_df)} download files using the following query:"
-                      f"\n\t{query_string}")
-
-            output_path = []
-            for i, row in filter_df.iterrows():
-                # print(row)
-
-                file_id = row['file_id']
-                file_name = f"{self.technology_type.replace(' ', '')}_{self.subcategory.replace(' ', '')}_{row['file_name']}.zip"
+                      f"\n\t{reference_filter}")
 
-                if guss.stop:
-                    print("Stopped download per User request")
-                    guss.stop = True
-                    break
-                else:
-                    saved_output = guss.download_file(data_type=self.data_type, file_id=file_id, file_name=file_name,
-                                                      gis_type=self.gis_type)
-                output_path.append(saved_output)
+            jobs = []
+            for row in filter_df.itertuples(index=False):
+                file_name = f"{self.technology_type.replace(' ', '')}_{self.subcategory.replace(' ', '')}_{row.file_name}.zip"
+                jobs.append({'data_type': self.data_type, 'file_id': row.file_id, 'file_name': file_name,
+                             'gis_type': self.gis_type, 'force': self.force_download,
+                             'as_of_date': self.as_of_date})
 
-            return output_path
+            return download_jobs(guss, 'mobile', jobs, max_workers=self.max_workers, resume=self.resume,
+                                 as_of_date=self.as_of_date)
@@ -0,0 +1,84 @@
+import logging
+import queue
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+
+class LogBuffer:
+    """
+    Thread-safe queue of printed text with an optional rotating log file, the Qt-free half of the LogSink.
+
+    write() can be called from any thread. take() is called from the one thread that shows the log, it returns the
+    text queued since the last call and writes the whole lines of it to the file.
+
+    :param log_path: path of the log file, None to keep no file
+    :param max_bytes: int, size of the log file before it rotates
+    :param backup_count: int, rotated log files kept
+    """
+
+    # chunks returned per take(), what is left waits for the next call so the GUI stays responsive
+    MAX_BATCH = 5000
+
+    def __init__(self, log_path=None, max_bytes=5 * 1024 * 1024, backup_count=3):
+        self._queue = queue.SimpleQueue()
+        # unfinished last line, the file only gets whole lines
+        self._partial = ''
+
+        self.log_path = log_path
+        self._handler = None
+        self._logger = None
+        if log_path is not None:
+            Path(log_path).parent.mkdir(parents=True, exist_ok=True)
+            self._handler = RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backup_count,
+                                                encoding='utf-8')
+            self._handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            self._logger = logging.getLogger(f"guss.gui.{id(self)}")
+            self._logger.setLevel(logging.INFO)
+            self._logger.propagate = False
+            self._logger.addHandler(self._handler)
+
+    def __repr__(self):
+        return f"LogBuffer({self.log_path})"
+
+    def write(self, text):
+        # safe from any thread
+        if not isinstance(text, str):
+            text = str(text)
+        if text:
+            self._queue.put(text)
+        return len(text)
+
+    def empty(self):
+        return self._queue.empty()
+
+    def take(self):
+        """
+        :return: str, the text queued since the last call, at most MAX_BATCH writes of it, '' when nothing is queued
+        """
+        chunks = []
+        try:
+            while len(chunks) < self.MAX_BATCH:
+                chunks.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        text = ''.join(chunks)
+
+        if text and self._logger is not None:
+            lines = (self._partial + text).split('\n')
+            self._partial = lines.pop()
+            for line in lines:
+                if line.strip():
+                    self._logger.info(line)
+        return text
+
+    def close(self):
+        """
+        Writes the unfinished last line and closes the log file, the queue is left as it is.
+        """
+        if self._logger is not None:
+            if self._partial.strip():
+                self._logger.info(self._partial)
+            self._partial = ''
+            self._logger.removeHandler(self._handler)
+            self._handler.close()
+            self._logger = None
@@ -0,0 +1,74 @@
+from PyQt5.QtCore import QObject, QTimer
+from PyQt5.QtGui import QTextCursor
+
+from gui.log_buffer import LogBuffer
+
+
+class LogSink(QObject):
+    """
+    Buffered stdout replacement feeding the log view.
+
+    write() only puts the text on a thread-safe LogBuffer, so the download threads never touch the widget. A timer in
+    the GUI thread drains the buffer and inserts everything that arrived since the last tick in one go, the view
+    keeps the last max_lines lines and the full log goes to a rotating file.
+
+    :param text_browser: QTextBrowser showing the log
+    :param log_path: path of the log file, None to keep no file
+    :param max_lines: int, lines kept in the view, older lines are dropped
+    :param interval_ms: int, time between two flushes to the view
+    :param max_bytes: int, size of the log file before it rotates
+    :param backup_count: int, rotated log files kept
+    """
+
+    def __init__(self, text_browser, log_path=None, max_lines=5000, interval_ms=100, max_bytes=5 * 1024 * 1024,
+                 backup_count=3, parent=None):
+        super().__init__(parent)
+        self.text_browser = text_browser
+        self.text_browser.document().setMaximumBlockCount(max_lines)
+        self.buffer = LogBuffer(log_path, max_bytes=max_bytes, backup_count=backup_count)
+        self.log_path = log_path
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval_ms)
+        self.timer.timeout.connect(self.drain)
+        self.timer.start()
+
+    def __repr__(self):
+        return f"LogSink({self.log_path})"
+
+    def write(self, text):
+        # safe from any thread
+        return self.buffer.write(text)
+
+    def flush(self):
+        # print(..., flush=True) from a worker thread, the timer does the actual flushing
+        pass
+
+    def drain(self):
+        """
+        Moves the queued text to the view and the log file, called by the timer in the GUI thread.
+        """
+        text = self.buffer.take()
+        if not text:
+            return
+
+        scrollbar = self.text_browser.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum()
+        cursor = QTextCursor(self.text_browser.document())
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(text)
+        # follow the log unless the user scrolled up to read
+        if at_bottom:
+            scrollbar.setValue(scrollbar.maximum())
+
+    def clear(self):
+        self.text_browser.clear()
+
+    def close(self):
+        """
+        Stops the timer and writes what is still queued, call it before the window goes away.
+        """
+        self.timer.stop()
+        while not self.buffer.empty():
+            self.drain()
+        self.buffer.close()
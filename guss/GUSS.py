@@ -1,18 +1,29 @@
 from pathlib import Path
 
 import requests
+import urllib3
+from requests.adapters import HTTPAdapter
 import pandas as pd
 import warnings
 import json
 import os
 import ast
+import time
+import threading
+import hashlib
 from guss.gussErrors import GussExceptions
-import h3
-from shapely.geometry import Polygon
+from guss.retry import RetryPolicy
+from guss.ratelimit import TokenBucket
+from guss.cache import ReferenceCache
+from guss.manifest import DownloadManifest
+from guss.connection import DB
+from guss.reference_index import ReferenceIndex
+# h3 and shapely (guss.geometry) are imported when the first hex is polygonized, a download never loads them
 
 
 
-from . import BASE_DIR, DATA_INPUT, DATA_OUTPUT, CSV_OUTPUT, GPK_OUTPUT, SHP_OUTPUT
+from . import BASE_DIR, DATA_INPUT, DATA_OUTPUT, CSV_OUTPUT, GPK_OUTPUT, SHP_OUTPUT, PARQUET_OUTPUT, FGB_OUTPUT
+from . import ensure_directories
 
 
 def create_initial_directories(base_folder):
@@ -23,17 +34,53 @@ def create_initial_directories(base_folder):
     CSV_OUTPUT = DATA_OUTPUT / "csv"
     SHP_OUTPUT = DATA_OUTPUT / 'shp'
     GPK_OUTPUT = DATA_OUTPUT / 'gpkg'
+    PARQUET_OUTPUT = DATA_OUTPUT / 'parquet'
+    FGB_OUTPUT = DATA_OUTPUT / 'fgb'
 
-    for dir_path in [DATA_DIR, DATA_INPUT, DATA_OUTPUT, CSV_OUTPUT, SHP_OUTPUT, GPK_OUTPUT]:
-        if not Path.exists(dir_path):
-            Path.mkdir(dir_path)
+    # base_folder itself may not exist yet
+    for dir_path in [DATA_DIR, DATA_INPUT, DATA_OUTPUT, CSV_OUTPUT, SHP_OUTPUT, GPK_OUTPUT, PARQUET_OUTPUT, FGB_OUTPUT]:
+        Path(dir_path).mkdir(parents=True, exist_ok=True)
 
-    return BASE_DIR, DATA_DIR, DATA_INPUT, DATA_OUTPUT, CSV_OUTPUT, SHP_OUTPUT, GPK_OUTPUT
+    return BASE_DIR, DATA_DIR, DATA_INPUT, DATA_OUTPUT, CSV_OUTPUT, SHP_OUTPUT, GPK_OUTPUT, PARQUET_OUTPUT, FGB_OUTPUT
+
+
+# dtypes of the reference listing columns, the repeated codes are stored as categoricals
+REFERENCE_CATEGORICAL_COLUMNS = ['provider_id', 'state_fips', 'state_name', 'technology_code', 'technology_type',
+                                 'speed_tier', 'category', 'subcategory', 'file_type']
+REFERENCE_INTEGER_COLUMNS = ['file_id']
+
+
+def set_reference_dtypes(df):
+    for column in REFERENCE_CATEGORICAL_COLUMNS:
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+            if not pd.api.types.is_string_dtype(df[column].cat.categories):
+                # keep codes such as provider_id comparable to strings whatever type the json used
+                df[column] = df[column].cat.rename_categories(lambda x: str(x))
+    for column in REFERENCE_INTEGER_COLUMNS:
+        if column in df.columns:
+            values = pd.to_numeric(df[column])
+            df[column] = values.astype('int64') if not values.isna().any() else values.astype('Int64')
+    return df
 
 
 class Guss:
 
-    def __init__(self, **credentials):
+    # pool_connections: number of per-host pools kept alive, pool_maxsize: max open connections per host,
+    # pool_block: wait for a free connection instead of opening an extra one once a host pool is full,
+    # download_workers: default number of files the dealers download at the same time,
+    # chunk_size: bytes held in memory per download while streaming a file to disk,
+    # retry_policy: RetryPolicy for transient connection errors and 429/5xx replies,
+    # listing_rate/download_rate: requests per second allowed on the list* endpoints and on downloadFile,
+    # listing_burst/download_burst: requests that may go out back to back after an idle period,
+    # reference_cache_ttl: seconds a cached reference listing is reused, None to keep it until refresh=True,
+    # boundary_cache_mb: memory budget of the H3 boundary cache shared by every polygonized file,
+    # boundary_cache_path: SQLite file keeping the boundaries across runs, None to keep them in memory only
+    def __init__(self, pool_connections=4, pool_maxsize=8, pool_block=True, keep_alive=True,
+                 connect_timeout=10, read_timeout=300, download_workers=4, chunk_size=1024 * 1024,
+                 retry_policy=None, listing_rate=1.0, listing_burst=3, download_rate=4.0, download_burst=8,
+                 reference_cache_ttl=24 * 60 * 60, boundary_cache_mb=256, boundary_cache_path=None,
+                 **credentials):
         self.__username = credentials['USERNAME']
         self.__hash_value = credentials['HASH_VALUE']
         self.__baseUrl = os.environ['BASE_URL']
@@ -79,7 +126,36 @@ class Guss:
         self.__CSV_OUTPUT = CSV_OUTPUT
         self.__GPK_OUTPUT = GPK_OUTPUT
         self.__SHP_OUTPUT = SHP_OUTPUT
-
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.download_workers = download_workers
+        self.chunk_size = chunk_size
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        # one budget per endpoint family, shared by every thread using this instance
+        self.rate_limiters = {
+            'listing': TokenBucket(max_rate=listing_rate, capacity=listing_burst),
+            'download': TokenBucket(max_rate=download_rate, capacity=download_burst),
+        }
+        self.__session = None
+        # guards the lazily created session and stores, the dealers' download threads may touch them first
+        self.__lazy_lock = threading.RLock()
+        self.__reference_cache = None
+        self.__download_manifest = None
+        self.__catalog = None
+        self.__reference_indexes = {}
+        self.__boundary_cache = None
+        self.boundary_cache_mb = boundary_cache_mb
+        self.boundary_cache_path = boundary_cache_path
+        self.reference_cache_ttl = reference_cache_ttl
+        self.__closed_pool_stats = {'opened': 0, 'requests': 0}
+        # sha256 of the files save_stream wrote in one go, by output path, taken by download_file
+        self.__stream_digests = {}
+        # the data tree is created by the first instance, not on import
+        ensure_directories(DATA_INPUT, DATA_OUTPUT, CSV_OUTPUT, SHP_OUTPUT, GPK_OUTPUT, PARQUET_OUTPUT, FGB_OUTPUT)
 
     def __repr__(self):
         return f"{self.__username}"
@@ -159,6 +235,67 @@ class Guss:
     def stop(self):
         return self.__stop
 
+    @property
+    def session(self):
+        # one long-lived session per Guss instance, shared by every dealer using this instance
+        if self.__session is None:
+            with self.__lazy_lock:
+                if self.__session is None:
+                    self.__session = self._create_session()
+        return self.__session
+
+    @property
+    def reference_cache(self):
+        if self.__reference_cache is None:
+            with self.__lazy_lock:
+                if self.__reference_cache is None:
+                    self.__reference_cache = ReferenceCache(Path(DATA_INPUT) / 'reference_cache',
+                                                            ttl=self.reference_cache_ttl)
+        return self.__reference_cache
+
+    # verified local copies, read from the 'done' rows of the catalog
+    @property
+    def download_manifest(self):
+        if self.__download_manifest is None:
+            with self.__lazy_lock:
+                if self.__download_manifest is None:
+                    self.__download_manifest = DownloadManifest(self.catalog)
+        return self.__download_manifest
+
+    # SQLite catalog of listed reference rows and download status
+    @property
+    def catalog(self):
+        if self.__catalog is None:
+            with self.__lazy_lock:
+                if self.__catalog is None:
+                    Path(DATA_INPUT).mkdir(parents=True, exist_ok=True)
+                    catalog = DB(str(Path(DATA_INPUT) / 'guss_catalog.db'))
+                    if not catalog.createDB():
+                        raise GussExceptions(message=f"Could not open the catalog at {catalog.db_path}")
+                    self.__catalog = catalog
+        return self.__catalog
+
+    @property
+    def boundary_cache(self):
+        if self.__boundary_cache is None:
+            from guss.geometry import H3BoundaryCache
+            self.__boundary_cache = H3BoundaryCache(max_bytes=int(self.boundary_cache_mb * 1024 * 1024),
+                                                    disk_path=self.boundary_cache_path)
+        return self.__boundary_cache
+
+    @property
+    def timeout(self):
+        return self.connect_timeout, self.read_timeout
+
+    @property
+    def connection_stats(self):
+        opened = self.__closed_pool_stats['opened']
+        requests_sent = self.__closed_pool_stats['requests']
+        for pool in self._connection_pools():
+            opened += pool.num_connections
+            requests_sent += pool.num_requests
+        return {'opened': opened, 'reused': max(requests_sent - opened, 0), 'requests': requests_sent}
+
     @property
     def BASE_DIR(self):
         return self.__BASE_DIR
@@ -244,6 +381,41 @@ class Guss:
         return self.__GPK_OUTPUT
 
 
+    def _create_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize,
+                              pool_block=self.pool_block, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers['Connection'] = 'keep-alive' if self.keep_alive else 'close'
+        return session
+
+    def _connection_pools(self):
+        if self.__session is None:
+            return []
+        pools = []
+        for adapter in set(self.__session.adapters.values()):
+            pool_manager = getattr(adapter, 'poolmanager', None)
+            if pool_manager is None:
+                continue
+            for key in pool_manager.pools.keys():
+                pool = pool_manager.pools.get(key)
+                if pool is not None:
+                    pools.append(pool)
+        return pools
+
+    def close(self):
+        if self.__boundary_cache is not None:
+            self.__boundary_cache.close()
+        if self.__catalog is not None:
+            self.__catalog.close()
+        with self.__lazy_lock:
+            if self.__session is not None:
+                stats = self.connection_stats
+                self.__closed_pool_stats = {'opened': stats['opened'], 'requests': stats['requests']}
+                self.__session.close()
+                self.__session = None
+
     # saves output file in location
     @classmethod
     def save_file(cls, response, output_path, file_name):
@@ -252,31 +424,225 @@ class Guss:
             f.write(response)
         print(f"Saved File to: {output}")
 
-    def api_request(self):
+    # streams the response body to disk in chunk_size pieces, the file only appears under its final name once complete.
+    # mode 'ab' appends to an existing .part file, which is kept on failure or cancel so the next run can resume it.
+    # A file written in one go is hashed on the way to disk, a resumed one is hashed from disk by download_file
+    def save_stream(self, response, output_path, file_name, mode='wb'):
+        output = os.path.join(output_path, file_name)
+        part_file = f"{output}.part"
+        self.__stream_digests.pop(output, None)
+        digest = hashlib.sha256() if mode == 'wb' else None
+        try:
+            with open(part_file, mode) as f:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    if self.stop:
+                        raise GussExceptions(message=f"Stopped download of {file_name} per User request, "
+                                                     f"partial file kept for resume")
+                    f.write(chunk)
+                    if digest is not None:
+                        digest.update(chunk)
+            os.replace(part_file, output)
+            self._remove_part_file(f"{part_file}.meta")
+            if digest is not None:
+                self.__stream_digests[output] = digest.hexdigest()
+        except requests.exceptions.RequestException:
+            # requests errors are OSErrors too, a connection dropped mid-file goes back to download_to_file's retry
+            raise
+        except OSError as e:
+            raise GussExceptions(message=f"Download of {file_name} failed: {e}")
+        finally:
+            response.close()
+        print(f"Saved File to: {output}")
+        return output
+
+    # downloads url_endpoint into output_path/file_name, a connection dropped mid-file is retried from the bytes
+    # already written to the .part file
+    def download_to_file(self, output_path, file_name, url_endpoint=None):
+        attempt = 1
+        while True:
+            try:
+                return self._download_once(output_path, file_name, url_endpoint=url_endpoint)
+            except requests.exceptions.RequestException as e:
+                if not self.retry_policy.is_retryable_exception(e) or not self.retry_policy.can_retry(attempt) \
+                        or self.stop:
+                    raise GussExceptions(message=f"Download of {file_name} failed: {e}")
+                self._wait_before_retry(attempt, f"download of {file_name}", e)
+                attempt += 1
+
+    # continues an existing .part file with a Range request when the server allows it
+    def _download_once(self, output_path, file_name, url_endpoint=None):
+        output = os.path.join(output_path, file_name)
+        part_file = f"{output}.part"
+        meta_file = f"{part_file}.meta"
+
+        offset = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+        headers = None
+        if offset:
+            headers = {'Range': f"bytes={offset}-"}
+            validator = self._read_part_validator(meta_file)
+            if validator:
+                # the server sends the whole file instead of the range if it changed since the partial download
+                headers['If-Range'] = validator
+
+        response = self.api_request(url_endpoint=url_endpoint, stream=True, headers=headers)
+
+        if offset and response.status_code == 416:
+            # the range is not satisfiable, the partial file is stale, start over
+            response.close()
+            self._remove_part_file(part_file)
+            offset = 0
+            response = self.api_request(url_endpoint=url_endpoint, stream=True)
+
+        if response.status_code == 206 and (not offset or self._content_range_start(response) != offset):
+            # a range other than the one asked for is only part of the file, start over without a Range header
+            print(f"Server sent bytes {response.headers.get('Content-Range')} of {file_name} instead of byte "
+                  f"{offset} on, downloading the full file")
+            response.close()
+            self._remove_part_file(part_file)
+            self._remove_part_file(meta_file)
+            offset = 0
+            response = self.api_request(url_endpoint=url_endpoint, stream=True)
+            if response.status_code == 206:
+                response.close()
+                raise GussExceptions(message=f"Download of {file_name} failed: the server answered a full "
+                                             f"download with a partial body")
+
+        self.response = response
+
+        if offset and response.status_code == 206:
+            print(f"Resuming {file_name} from byte {offset}")
+            return self.save_stream(response, output_path=output_path, file_name=file_name, mode='ab')
+
+        if offset:
+            print(f"Server did not accept the range request for {file_name}, downloading the full file")
+        self._write_part_validator(meta_file, response)
+        return self.save_stream(response, output_path=output_path, file_name=file_name, mode='wb')
+
+    def _rate_limiter(self, url_endpoint):
+        if '/downloadFile/' in str(url_endpoint):
+            return self.rate_limiters['download']
+        return self.rate_limiters['listing']
+
+    # waits the retry policy delay, reports the retry on stdout and gives up early when the user cancels
+    def _wait_before_retry(self, attempt, what, reason, retry_after=None):
+        delay = self.retry_policy.delay(attempt, retry_after=retry_after)
+        print(f"Retrying {what} in {delay:.1f}s (attempt {attempt + 1} of {self.retry_policy.max_attempts}): {reason}")
+        deadline = time.monotonic() + delay
+        while True:
+            if self.stop:
+                raise GussExceptions(message=f"Stopped retrying {what} per User request")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(remaining, 0.5))
+
+    @staticmethod
+    def _content_range_start(response):
+        # Content-Range: bytes <start>-<end>/<size>
+        content_range = response.headers.get('Content-Range', '')
+        try:
+            return int(content_range.split(' ', 1)[1].split('-', 1)[0])
+        except (IndexError, ValueError):
+            return None
+
+    @staticmethod
+    def _read_part_validator(meta_file):
+        if not os.path.exists(meta_file):
+            return None
+        with open(meta_file, 'r') as f:
+            return json.load(f).get('validator')
+
+    @staticmethod
+    def _write_part_validator(meta_file, response):
+        validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+        if validator and not validator.startswith('W/'):
+            with open(meta_file, 'w') as f:
+                json.dump({'validator': validator}, f)
+
+    @staticmethod
+    def _remove_part_file(part_file):
+        if os.path.exists(part_file):
+            os.remove(part_file)
+
+    @staticmethod
+    def _file_output_path(gis_data_type):
+        if gis_data_type is None:
+            output_path = CSV_OUTPUT
+        elif str(gis_data_type).lower() == 'gpkg':
+            output_path = GPK_OUTPUT
+        elif str(gis_data_type).lower() == 'shp':
+            output_path = SHP_OUTPUT
+        else:
+            return None
+        if not Path(output_path).exists():
+            Path(output_path).mkdir(parents=True, exist_ok=True)
+        return output_path
+
+    # url_endpoint defaults to self.url_endpoint; pass it explicitly when requests run on several threads.
+    # params: query parameters of this request only, nothing is kept on the instance for the next request
+    def api_request(self, url_endpoint=None, stream=False, headers=None, params=None):
         try:
 
             self.request_header = {
                 'username': self.__username,
                 'hash_value': self.__hash_value
             }
+            request_header = dict(self.request_header, **headers) if headers else self.request_header
+
+            if url_endpoint is None:
+                url_endpoint = self.url_endpoint
+            url = f"{self.baseUrl}{url_endpoint}"
 
-            url = f"{self.baseUrl}{self.url_endpoint}"
+            rate_limiter = self._rate_limiter(url_endpoint)
 
-            if self.request_param is None:
+            attempt = 1
+            while True:
+                if not rate_limiter.acquire(should_stop=lambda: self.stop):
+                    raise GussExceptions(message=f"Stopped request to {url_endpoint} per User request")
+                try:
+                    if params is None:
 
-                r = requests.get(url=url, headers=self.request_header)
+                        r = self.session.get(url=url, headers=request_header, timeout=self.timeout, stream=stream)
 
-            else:
-                r = requests.request(method=str(self.request_type).upper(), url=url, params=self.request_param, headers=self.request_header)
+                    else:
+                        r = self.session.request(method=str(self.request_type or 'GET').upper(), url=url,
+                                                 params=params, headers=request_header,
+                                                 timeout=self.timeout, stream=stream)
+                except requests.exceptions.RequestException as e:
+                    if not self.retry_policy.is_retryable_exception(e) or not self.retry_policy.can_retry(attempt) \
+                            or self.stop:
+                        raise
+                    self._wait_before_retry(attempt, url_endpoint, e)
+                    attempt += 1
+                    continue
+
+                status = r.status_code
+                retry_after = self.retry_policy.parse_retry_after(r.headers.get('Retry-After'))
+                if status == 429:
+                    rate_limiter.throttle(retry_after=retry_after)
+                elif 200 <= status < 300:
+                    # 5xx replies are the server pushing back too, only a served request earns rate back
+                    rate_limiter.success()
+                if self.retry_policy.is_retryable_status(status) and self.retry_policy.can_retry(attempt) \
+                        and not self.stop:
+                    r.close()
+                    self._wait_before_retry(attempt, url_endpoint, f"HTTP {status}", retry_after=retry_after)
+                    attempt += 1
+                    continue
+                break
 
             # error handling
-            status = r.status_code
+            if status == 416 and headers and 'Range' in headers:
+                # let the caller fall back to a full download
+                return r
             if 400 <= status < 500:
                 if status == 401:
                     print("Please Check your Credentials!!")
                     r.raise_for_status()
                 else:
                     r.raise_for_status()
+            elif status >= 500:
+                r.raise_for_status()
 
             return r
 
@@ -290,16 +656,21 @@ class Guss:
         except requests.exceptions.RequestException as err:
             raise GussExceptions(err.__str__())
 
-    def get_request(self, return_df=None, gis_data_type=None, save_file=False, file_name=None):
+    def get_request(self, return_df=None, gis_data_type=None, save_file=False, file_name=None, url_endpoint=None,
+                    params=None):
 
         try:
 
-            self.response = self.api_request()
+            if not return_df and save_file and file_name:
+                # file downloads are streamed to disk instead of being read into memory first
+                output_path = self._file_output_path(gis_data_type)
+                if output_path is None:
+                    return warnings.warn(
+                        "please indicate the what type of GIS data that is, options are:\n1)\tGPKG\n2)\tSHP")
+                return self.download_to_file(output_path, file_name, url_endpoint=url_endpoint)
 
             if return_df:
-                df = pd.json_normalize(self.response.json()["data"])
-                if "as_of_date" in df.columns:
-                    df['as_of_date'] = [pd.to_datetime(x).strftime("%Y-%m-%d") for x in df['as_of_date']]
+                df = self.listing_to_df(url_endpoint=url_endpoint, params=params)
                 if save_file and file_name:
                     if Path(CSV_OUTPUT).exists():
                         output = os.path.join(CSV_OUTPUT, file_name)
@@ -313,39 +684,10 @@ class Guss:
                 else:
                     return warnings.warn("please enter a filename")
                 return df
-            else:
-                if (save_file and file_name) and gis_data_type is None:
-                    if Path(CSV_OUTPUT).exists():
-                        output = os.path.join(CSV_OUTPUT, file_name)
-                    else:
-                        Path(CSV_OUTPUT).mkdir(parents=True, exist_ok=True)
-                        output = os.path.join(CSV_OUTPUT, file_name)
 
-                    self.save_file(self.response.content, output_path=CSV_OUTPUT, file_name=file_name)
-                    return output
-                else:
-                    GussExceptions(message="It looks like you did not provide csv file_name. please provide valid name")
-
-            if save_file and file_name and (str(gis_data_type).lower() == 'gpkg' or str(gis_data_type).lower() == 'shp'):
-
-                if str(gis_data_type).lower() == 'gpkg':
-                    if not Path(GPK_OUTPUT).exists():
-                        Path(GPK_OUTPUT).mkdir(parents=True, exist_ok=True)
-
-                    self.save_file(response=self.response.content, output_path=GPK_OUTPUT, file_name=file_name)
-                    return os.path.join(GPK_OUTPUT, file_name)
-
-                elif str(gis_data_type).lower() == 'shp':
-                    if not Path(SHP_OUTPUT).exists():
-                        Path(SHP_OUTPUT).mkdir(parents=True, exist_ok=True)
-
-                    self.save_file(response=self.response.content, output_path=SHP_OUTPUT, file_name=file_name)
-                    return os.path.join(SHP_OUTPUT, file_name)
-                else:
-                    return warnings.warn(
-                        "please indicate the what type of GIS data that is, options are:\n1)\tGPKG\n2)\tSHP")
-
-            return self.response.json()
+            response = self.api_request(url_endpoint=url_endpoint, params=params)
+            self.response = response
+            return response.json()
 
         # error handling
 
@@ -359,7 +701,91 @@ class Guss:
         aod_list = self.get_request(return_df=True, save_file=True, file_name="as_of_date.csv")
         return aod_list
 
-    def get_download_reference(self, as_of_date=None):
+    # requests the listing and reads its streamed body, a connection dropped while the body is read is retried
+    # like a failed request
+    def listing_to_df(self, url_endpoint=None, params=None):
+        if url_endpoint is None:
+            url_endpoint = self.url_endpoint
+        attempt = 1
+        while True:
+            response = self.api_request(url_endpoint=url_endpoint, stream=True, params=params)
+            self.response = response
+            try:
+                return self.response_to_df(response)
+            except requests.exceptions.RequestException as e:
+                if not self.retry_policy.is_retryable_exception(e) or not self.retry_policy.can_retry(attempt) \
+                        or self.stop:
+                    raise GussExceptions(message=f"Could not read the listing at {url_endpoint}: {e}")
+                self._wait_before_retry(attempt, f"listing {url_endpoint}", e)
+                attempt += 1
+
+    # builds the typed listing frame from the streamed body, the raw json is released before the frame is built.
+    # urllib3 errors raised while reading the body are mapped to the requests exceptions iter_content would raise
+    @staticmethod
+    def response_to_df(response):
+        try:
+            response.raw.decode_content = True
+            records = json.load(response.raw)["data"]
+        except urllib3.exceptions.ProtocolError as e:
+            raise requests.exceptions.ChunkedEncodingError(e)
+        except urllib3.exceptions.DecodeError as e:
+            raise requests.exceptions.ContentDecodingError(e)
+        except urllib3.exceptions.ReadTimeoutError as e:
+            raise requests.exceptions.ConnectionError(e)
+        except urllib3.exceptions.HTTPError as e:
+            raise requests.exceptions.RequestException(e)
+        except ValueError as e:
+            raise GussExceptions(message=f"Could not read the listing response: {e}")
+        finally:
+            response.close()
+
+        if records and any(isinstance(value, dict) for value in records[0].values()):
+            df = pd.json_normalize(records)
+        else:
+            df = pd.DataFrame.from_records(records)
+        del records
+
+        if "as_of_date" in df.columns:
+            df['as_of_date'] = pd.to_datetime(df['as_of_date'], format='ISO8601').dt.strftime("%Y-%m-%d")
+        return set_reference_dtypes(df)
+
+    # returns the listing at url_endpoint (default self.url_endpoint) queried with params from the reference cache,
+    # or fetches and caches it. the ReferenceIndex over the listing is built here, once per loaded listing
+    # data_type: 'availability' or 'challenge', records the listing in the catalog under that name
+    def get_cached_reference(self, as_of_date, file_name, refresh=False, data_type=None, url_endpoint=None,
+                             params=None):
+        if url_endpoint is None:
+            url_endpoint = self.url_endpoint
+        cache_key = {'endpoint': url_endpoint, 'as_of_date': as_of_date, 'params': params}
+        reference_df = None
+        listed = False
+        if not refresh:
+            reference_df = self.reference_cache.load(**cache_key)
+            if reference_df is not None:
+                print(f"Loaded reference listing for as of date {as_of_date} from cache")
+
+        if reference_df is None:
+            reference_df = self.get_request(return_df=True, save_file=True, file_name=file_name,
+                                            url_endpoint=url_endpoint, params=params)
+            listed = True
+            if reference_df is not None and not reference_df.empty:
+                self.reference_cache.save(reference_df, **cache_key)
+
+        if reference_df is not None and not reference_df.empty:
+            self.__reference_indexes[ReferenceCache.key(**cache_key)] = ReferenceIndex(reference_df)
+            if data_type is not None and 'file_id' in reference_df.columns and \
+                    (listed or not self.catalog.has_reference(as_of_date, data_type, params=params)):
+                self.catalog.insert_reference(reference_df, as_of_date, data_type, params=params)
+        return reference_df
+
+    # ReferenceIndex built when reference_df was loaded, or a new one if reference_df did not come from this instance
+    def reference_index(self, reference_df):
+        for index in self.__reference_indexes.values():
+            if index.reference_df is reference_df:
+                return index
+        return ReferenceIndex(reference_df)
+
+    def get_download_reference(self, as_of_date=None, refresh=False):
 
         # set get method
         self.request_type = "GET"
@@ -368,11 +794,14 @@ class Guss:
             as_of_date = '2024-06-30'
 
         self.url_endpoint = f'/api/public/map/downloads/listAvailabilityData/{as_of_date}'
-        reference_df = self.get_request(return_df=True, save_file=True,
-                                        file_name=f"download_reference_list_as_of_date_{as_of_date}.csv")
+        reference_df = self.get_cached_reference(as_of_date=as_of_date, refresh=refresh,
+                                                 file_name=f"download_reference_list_as_of_date_{as_of_date}.csv",
+                                                 data_type='availability', url_endpoint=self.url_endpoint)
         return reference_df
 
-    def download_file(self, data_type, file_id, file_name, gis_type):
+    # files the catalog holds as done and still verified on disk are not downloaded again, force=True downloads
+    # them anyway. Every outcome is recorded in the catalog, as_of_date tags the catalog row.
+    def download_file(self, data_type, file_id, file_name, gis_type, force=False, as_of_date=None):
 
         if str(data_type).lower() == "availability":
             pass
@@ -382,21 +811,56 @@ class Guss:
             raise GussExceptions(f"data_type: {data_type}-- it should be either : availability or challenge")
 
         file_type = ""
+        url_endpoint = None
         if gis_type is not None:
             if gis_type.lower() == "shp":
                 file_type = '1'
-                self.url_endpoint = f"/api/public/map/downloads/downloadFile/{data_type}/{file_id}/{file_type}"
+                url_endpoint = f"/api/public/map/downloads/downloadFile/{data_type}/{file_id}/{file_type}"
             elif gis_type.lower() == 'gpkg':
                 file_type = '2'
-                self.url_endpoint = f"/api/public/map/downloads/downloadFile/{data_type}/{file_id}/{file_type}"
+                url_endpoint = f"/api/public/map/downloads/downloadFile/{data_type}/{file_id}/{file_type}"
         else:
-            self.url_endpoint = f"/api/public/map/downloads/downloadFile/{data_type}/{file_id}"
-        # print(self.url_endpoint)
-        saved_output = self.get_request(save_file=True, return_df=False, file_name=file_name, gis_data_type=gis_type)
+            url_endpoint = f"/api/public/map/downloads/downloadFile/{data_type}/{file_id}"
+        # print(url_endpoint)
+        # get_request only warns about these, a file that cannot be saved fails before its catalog row is written
+        output_path = self._file_output_path(gis_type)
+        if output_path is None:
+            raise GussExceptions(f"gis_type: {gis_type}-- it should be either : shp, gpkg or None for the csv files")
+        if not file_name:
+            raise GussExceptions(f"no file_name given for file_id {file_id}")
+        if not force:
+            saved_output = self.download_manifest.verified_path(data_type, file_id, gis_type,
+                                                                expected_path=os.path.join(output_path, file_name))
+            if saved_output is not None:
+                # the 'done' row of the earlier run stays as it is, with its transfer time
+                print(f"Skipped {file_name}, already downloaded and verified: {saved_output}")
+                return saved_output
+
+        record = {'file_name': file_name, 'as_of_date': as_of_date}
+        self.catalog.record_download(data_type, file_id, gis_type, 'running', **record)
+        start = time.perf_counter()
+        try:
+            saved_output = self.get_request(save_file=True, return_df=False, file_name=file_name,
+                                            gis_data_type=gis_type, url_endpoint=url_endpoint)
+        except Exception as e:
+            self.catalog.record_download(data_type, file_id, gis_type, 'failed', error=str(e),
+                                         duration_s=time.perf_counter() - start, **record)
+            raise
+        if not isinstance(saved_output, str):
+            error = f"Download of {file_name} saved no file"
+            self.catalog.record_download(data_type, file_id, gis_type, 'failed', error=error,
+                                         duration_s=time.perf_counter() - start, **record)
+            raise GussExceptions(message=error)
+        # one row update per file, it is also the manifest entry of the saved copy
+        self.catalog.record_download(data_type, file_id, gis_type, 'done',
+                                     duration_s=time.perf_counter() - start, output_path=saved_output,
+                                     **DownloadManifest.fingerprint(
+                                         saved_output, sha256=self.__stream_digests.pop(saved_output, None)),
+                                     **record)
 
         return saved_output
 
-    def list_challenge_data(self, as_of_date=None, file_name=None, params=None):
+    def list_challenge_data(self, as_of_date=None, file_name=None, params=None, refresh=False):
 
         try:
             self.request_type = 'GET'
@@ -406,9 +870,10 @@ class Guss:
 
             self.url_endpoint = f'/api/public/map/downloads/listChallengeData/{as_of_date}'
 
-            self.request_param = params
-
-            saved_output = self.get_request(save_file=True, return_df=True, file_name=file_name)
+            # the category params go with this listing only, the instance is reused by later jobs
+            saved_output = self.get_cached_reference(as_of_date=as_of_date, file_name=file_name, refresh=refresh,
+                                                     data_type='challenge', url_endpoint=self.url_endpoint,
+                                                     params=params)
 
             return saved_output
 
@@ -417,7 +882,17 @@ class Guss:
             raise GussExceptions(f"error: {e}")
 
     def polygonize(self, hex_id):
+        import h3
+        from shapely.geometry import Polygon
+
         coords = h3.cell_to_boundary(hex_id)
         flipped = tuple(coord[::-1] for coord in coords)
         return Polygon(flipped)
 
+    # polygons of a whole column of hex ids, built in bulk, executor spreads the boundaries over a process pool.
+    # boundaries already computed for an earlier file come from the boundary cache
+    def polygonize_many(self, hex_ids, executor=None):
+        from guss.geometry import h3_polygons
+
+        return h3_polygons(hex_ids, executor=executor, cache=self.boundary_cache)
+
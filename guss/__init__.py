@@ -27,10 +27,14 @@ DATA_OUTPUT = DATA_DIR / "output"
 CSV_OUTPUT = DATA_OUTPUT/ "csv"
 SHP_OUTPUT = DATA_OUTPUT/'shp'
 GPK_OUTPUT = DATA_OUTPUT/'gpkg'
+PARQUET_OUTPUT = DATA_OUTPUT/'parquet'
+FGB_OUTPUT = DATA_OUTPUT/'fgb'
 
 
-for dir in [DATA_DIR, DATA_INPUT, DATA_OUTPUT, CSV_OUTPUT, SHP_OUTPUT, GPK_OUTPUT]:
-    if not Path.exists(dir):
-        Path.mkdir(dir)
+def ensure_directories(*dirs):
+    # importing guss creates nothing, the folders are made when a Guss instance or a workflow needs them
+    for dir in dirs or [DATA_DIR, DATA_INPUT, DATA_OUTPUT, CSV_OUTPUT, SHP_OUTPUT, GPK_OUTPUT, PARQUET_OUTPUT,
+                        FGB_OUTPUT]:
+        Path(dir).mkdir(parents=True, exist_ok=True)
 
 
@@ -0,0 +1,128 @@
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from guss.geometry import h3_to_int64, hex_digits_to_int64
+
+# column types of the 'c' engine, fixed so every chunk of a file gets the same schema. The numeric identifiers stay
+# integers as when the whole file was read at once, nullable so a chunk with a blank id does not turn them to
+# floats. block_geoid is text, a census block GEOID keeps the leading zero of its state
+AVAILABILITY_TEXT_COLUMNS = ['brand_name', 'state_usps', 'block_geoid', 'business_residential_code', 'h3_res8_id']
+AVAILABILITY_ID_COLUMNS = ['frn', 'provider_id', 'location_id']
+
+# column types of the pyarrow engine: low-cardinality codes are dictionary encoded (categoricals in pandas),
+# counts and speeds get the smallest integer type that holds them
+AVAILABILITY_DICTIONARY_COLUMNS = ['provider_id', 'brand_name', 'state_usps', 'business_residential_code']
+AVAILABILITY_STRING_COLUMNS = ['frn', 'block_geoid', 'h3_res8_id']
+AVAILABILITY_INTEGER_COLUMNS = {'location_id': 'int64', 'technology': 'int16',
+                                'max_advertised_download_speed': 'int32', 'max_advertised_upload_speed': 'int32',
+                                'low_latency': 'int8'}
+
+CSV_ENGINES = ('c', 'pyarrow')
+
+
+def read_availability_chunks(path, chunk_size=500_000, engine='c'):
+    """
+    Reads a zipped fixed availability CSV in bounded chunks.
+
+    :param path: path, zip file saved by Guss.download_file
+    :param chunk_size: int, rows per chunk, peak memory is set by this and not by the file size
+    :param engine: str, 'c' for the pandas parser (frn, provider_id and location_id as integers, the other
+                   identifiers as text), 'pyarrow' for the multi-threaded Arrow parser with typed columns:
+                   categorical codes, narrow integers and h3_res8_id as int64
+    :return: iterator of pd.DataFrame
+    """
+    if engine == 'pyarrow':
+        yield from _read_arrow_chunks(path, chunk_size)
+        return
+    if engine != 'c':
+        raise ValueError(f"engine must be one of {CSV_ENGINES}, got {engine!r}")
+
+    dtype = {column: str for column in AVAILABILITY_TEXT_COLUMNS}
+    dtype.update({column: 'Int64' for column in AVAILABILITY_ID_COLUMNS})
+    with pd.read_csv(path, compression='zip', chunksize=chunk_size, dtype=dtype) as reader:
+        for chunk in reader:
+            yield chunk
+
+
+def _arrow_column_types(pa):
+    column_types = {column: pa.dictionary(pa.int32(), pa.string()) for column in AVAILABILITY_DICTIONARY_COLUMNS}
+    column_types.update({column: pa.string() for column in AVAILABILITY_STRING_COLUMNS})
+    column_types.update({column: getattr(pa, type_name)() for column, type_name in
+                         AVAILABILITY_INTEGER_COLUMNS.items()})
+    return column_types
+
+
+def _read_arrow_chunks(path, chunk_size):
+    import pyarrow as pa
+    from pyarrow import csv
+
+    convert_options = csv.ConvertOptions(column_types=_arrow_column_types(pa), strings_can_be_null=True)
+    # blocks of ~16 MB keep the parser threads busy without holding much more than one chunk
+    read_options = csv.ReadOptions(block_size=16 * 1024 * 1024, use_threads=True)
+
+    with zipfile.ZipFile(path) as archive:
+        member = next(name for name in archive.namelist() if name.lower().endswith('.csv'))
+        with archive.open(member) as source:
+            reader = csv.open_csv(source, read_options=read_options, convert_options=convert_options)
+            batches = []
+            rows = 0
+            for batch in reader:
+                # a parse block can hold more rows than a chunk, split it so chunk_size stays the bound
+                while rows + batch.num_rows >= chunk_size:
+                    take = chunk_size - rows
+                    batches.append(batch.slice(0, take))
+                    yield _arrow_to_frame(pa, batches)
+                    batch = batch.slice(take)
+                    batches = []
+                    rows = 0
+                if batch.num_rows:
+                    batches.append(batch)
+                    rows += batch.num_rows
+            if batches:
+                yield _arrow_to_frame(pa, batches)
+
+
+def _arrow_to_frame(pa, batches):
+    table = pa.Table.from_batches(batches)
+    h3_position = table.schema.get_field_index('h3_res8_id')
+    h3_ids = None
+    if h3_position >= 0:
+        h3_ids = arrow_h3_to_int64(table.column(h3_position))
+        table = table.remove_column(h3_position)
+    df = table.to_pandas(split_blocks=True, self_destruct=True)
+    if h3_ids is not None:
+        df.insert(h3_position, 'h3_res8_id', h3_ids)
+    return df
+
+
+def arrow_h3_to_int64(column):
+    """
+    Converts an Arrow string column of hex H3 ids to int64 without building Python strings.
+
+    The ids are padded to 16 digits, so the string data buffer is an (n, 16) block of ascii digits that is decoded
+    in place. Columns with nulls or odd lengths go through the numpy path.
+
+    :param column: pyarrow.Array or pyarrow.ChunkedArray of strings
+    :return: np.ndarray, int64 (pd.Series with <NA> where the column has nulls)
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if isinstance(column, pa.ChunkedArray):
+        column = column.combine_chunks()
+    if column.null_count:
+        values = pd.Series(column.to_numpy(zero_copy_only=False))
+        result = pd.Series(pd.NA, index=values.index, dtype='Int64')
+        present = values.notna().to_numpy()
+        result[present] = h3_to_int64(values[present].to_numpy(dtype=str))
+        return result
+
+    padded = pc.utf8_lpad(column.cast(pa.string()), 16, '0')
+    _, offsets, data = padded.buffers()
+    offsets = np.frombuffer(offsets, dtype=np.int32)[padded.offset:padded.offset + len(padded) + 1]
+    if len(padded) and (np.diff(offsets) == 16).all():
+        digits = np.frombuffer(data, dtype=np.uint8)[offsets[0]:offsets[-1]].reshape(-1, 16)
+        return hex_digits_to_int64(digits)
+    return h3_to_int64(padded.to_numpy(zero_copy_only=False))
@@ -0,0 +1,63 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import pandas as pd
+
+
+class ReferenceCache:
+    """
+    On-disk cache of the download reference listings (listAvailabilityData, listChallengeData).
+
+    Listings are stored as typed Parquet files (categorical codes, integer file ids) and read back memory-mapped,
+    so loading a cached vintage does not parse any text.
+
+    :param cache_dir: path, folder holding the cached listings
+    :param ttl: float, seconds a cached listing stays valid, None to keep it until a forced refresh
+    """
+
+    def __init__(self, cache_dir, ttl=24 * 60 * 60):
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+
+    def __repr__(self):
+        return f"ReferenceCache({self.cache_dir}, ttl={self.ttl})"
+
+    @staticmethod
+    def key(endpoint, as_of_date=None, params=None):
+        payload = json.dumps({'endpoint': endpoint, 'as_of_date': as_of_date, 'params': params},
+                             sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def path(self, endpoint, as_of_date=None, params=None):
+        return self.cache_dir / f"{self.key(endpoint, as_of_date, params)}.parquet"
+
+    def load(self, endpoint, as_of_date=None, params=None):
+        """
+        :return: pd.DataFrame, the cached listing, None if it is missing or older than ttl
+        """
+        path = self.path(endpoint, as_of_date, params)
+        if not path.exists():
+            return None
+        if self.ttl is not None and time.time() - path.stat().st_mtime > self.ttl:
+            return None
+        try:
+            return pd.read_parquet(path, engine='pyarrow', memory_map=True)
+        except Exception:
+            # a corrupt cache entry is just a miss
+            return None
+
+    def save(self, df, endpoint, as_of_date=None, params=None):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self.path(endpoint, as_of_date, params)
+        tmp_path = path.with_suffix('.tmp')
+        df.to_parquet(tmp_path, engine='pyarrow', index=False)
+        os.replace(tmp_path, path)
+        return path
+
+    def clear(self):
+        if self.cache_dir.exists():
+            for path in self.cache_dir.glob('*.parquet'):
+                path.unlink()
@@ -0,0 +1,298 @@
+"""
+Headless entry point of the dealers, for servers and cron jobs. Nothing here imports Qt.
+
+    python -m guss mobile --as-of-date 2024-06-30 --states 36 --providers all --technologies 400,500
+    python -m guss fixed --as-of-date 2024-06-30 --states 36 --providers 130077 --technologies all --polygonize
+    python -m guss challenge --as-of-date 2024-06-30 --category "Fixed Challenge - Resolved" --states 36
+    python -m guss run jobs.yaml
+
+Progress is written to stdout as JSON lines, one object per event: {"event": "log", ...} for every line the
+dealers print, plus job_start, job_done and job_error events carrying the job parameters and saved files.
+"""
+import argparse
+import ast
+import json
+import os
+import signal
+import sys
+import threading
+import time
+
+DEFAULT_BASE_URL = 'https://broadbandmap.fcc.gov'
+
+# dealer parameters given as comma separated text on the command line or in a job file
+LIST_PARAMS = ('provider_id_list', 'state_fips_list', 'technology_list', 'fiveG_speed_tier_list')
+NUMERIC_LIST_PARAMS = ('technology_list',)
+
+JOB_TYPES = ('mobile', 'fixed', 'challenge')
+
+
+class JsonLinesStream:
+    """
+    File-like stdout replacement turning every printed line into a JSON event on the real stdout. The download
+    threads print at the same time: each thread keeps its own unfinished line, since print() writes the text and
+    the newline separately, and writes are serialized so lines are neither lost nor merged.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        # unfinished line of each thread, by thread id
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        thread_id = threading.get_ident()
+        with self._lock:
+            buffer = self._buffers.pop(thread_id, '') + text
+            while '\n' in buffer:
+                line, buffer = buffer.split('\n', 1)
+                if line.strip():
+                    emit(self.stream, 'log', message=line)
+            if buffer:
+                self._buffers[thread_id] = buffer
+        return len(text)
+
+    def flush(self):
+        # the line of this thread and those left by finished threads, another thread may be halfway through a print
+        alive = {thread.ident for thread in threading.enumerate()} - {threading.get_ident()}
+        with self._lock:
+            for thread_id in [thread_id for thread_id in self._buffers if thread_id not in alive]:
+                buffer = self._buffers.pop(thread_id)
+                if buffer.strip():
+                    emit(self.stream, 'log', message=buffer)
+            self.stream.flush()
+
+
+def emit(stream, event, **fields):
+    record = {'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'event': event}
+    record.update(fields)
+    stream.write(json.dumps(record, default=str) + '\n')
+    stream.flush()
+
+
+def split_list(value, numeric=False):
+    # same parsing as the GUI fields: comma separated, digits become ints for technology codes
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        items = [str(x).strip() for x in value]
+    else:
+        items = [x.strip() for x in str(value).split(',')]
+    items = [x for x in items if x]
+    if numeric:
+        return [int(x) if x.isdigit() else x for x in items]
+    return items
+
+
+def normalize_job(job):
+    """
+    :param job: dict, 'type' plus dealer keyword arguments, lists may be comma separated strings
+    :return: tuple, (job type, dealer keyword arguments)
+    """
+    job = dict(job)
+    job_type = str(job.pop('type', '')).lower()
+    if job_type not in JOB_TYPES:
+        raise ValueError(f"job type should be one of {', '.join(JOB_TYPES)}, got {job_type!r}")
+    for param in LIST_PARAMS:
+        if param in job:
+            job[param] = split_list(job[param], numeric=param in NUMERIC_LIST_PARAMS)
+    if job_type in ('mobile', 'fixed'):
+        job.setdefault('data_type', 'availability')
+    return job_type, job
+
+
+def load_job_file(path):
+    """
+    Reads a JSON or YAML job file holding one job, a list of jobs or {"jobs": [...]}.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    if str(path).lower().endswith(('.yaml', '.yml')):
+        try:
+            import yaml
+        except ImportError:
+            raise SystemExit("Reading YAML job files needs PyYAML (pip install pyyaml), or use a JSON job file")
+        data = yaml.safe_load(text)
+    else:
+        data = json.loads(text)
+    if isinstance(data, dict) and 'jobs' in data:
+        data = data['jobs']
+    if isinstance(data, dict):
+        data = [data]
+    return [normalize_job(job) for job in data]
+
+
+def load_credentials(args):
+    if args.env_file:
+        try:
+            from dotenv import load_dotenv
+        except ImportError:
+            raise SystemExit("Reading .env files needs python-dotenv (pip install python-dotenv)")
+        load_dotenv(args.env_file)
+
+    credentials = {}
+    if os.environ.get('credentials'):
+        credentials = ast.literal_eval(os.environ['credentials'])
+    username = args.username or os.environ.get('GUSS_USERNAME') or credentials.get('USERNAME')
+    api_key = args.api_key or os.environ.get('GUSS_API_KEY') or credentials.get('HASH_VALUE')
+    if not username or not api_key:
+        raise SystemExit("No credentials: pass --username and --api-key, set GUSS_USERNAME and GUSS_API_KEY, "
+                         "or point --env-file at a .env file holding credentials = {'USERNAME': ..., "
+                         "'HASH_VALUE': ...}")
+    if args.base_url:
+        os.environ['BASE_URL'] = args.base_url
+    os.environ.setdefault('BASE_URL', DEFAULT_BASE_URL)
+    return {'USERNAME': username, 'HASH_VALUE': api_key}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='guss', description="Download FCC broadband map data without the GUI, "
+                                                              "progress is printed as JSON lines.")
+    parser.add_argument('--env-file', help=".env file holding credentials and BASE_URL")
+    parser.add_argument('--username', help="FCC broadband map API username")
+    parser.add_argument('--api-key', help="FCC broadband map API hash value")
+    parser.add_argument('--base-url', help=f"API base url, default {DEFAULT_BASE_URL}")
+    parser.add_argument('--output-dir', help="base folder of the data/ directory, default the install folder")
+    parser.add_argument('--max-workers', type=int, help="files downloaded at the same time")
+    parser.add_argument('--refresh-reference', action='store_true', help="list the API again instead of using "
+                                                                         "the cached reference")
+    parser.add_argument('--force', action='store_true', help="download files the manifest already holds")
+    parser.add_argument('--no-resume', action='store_true', help="ignore the saved plan of an interrupted run")
+
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    mobile = commands.add_parser('mobile', help="mobile broadband coverage, like the Mobile tab")
+    mobile.add_argument('--as-of-date', required=True)
+    mobile.add_argument('--providers', default='all', help="comma separated provider ids or all")
+    mobile.add_argument('--states', default='all', help="comma separated state fips or all")
+    mobile.add_argument('--technologies', default='all', help="comma separated technology codes or all, all keeps "
+                                                              "3G/LTE files and the 5G files of --speed-tiers")
+    mobile.add_argument('--technology-type', default='Mobile Broadband',
+                        choices=['Mobile Broadband', 'Mobile Voice'])
+    mobile.add_argument('--subcategory', default='Hexagon Coverage', choices=['Hexagon Coverage', 'Raw Coverage'])
+    mobile.add_argument('--speed-tiers', default='35/3,7/1', help="comma separated 5G speed tiers")
+    mobile.add_argument('--gis-type', default='shp', choices=['shp', 'gpkg'])
+
+    fixed = commands.add_parser('fixed', help="fixed broadband availability, like the Fixed tab")
+    fixed.add_argument('--as-of-date', required=True)
+    fixed.add_argument('--providers', default='all', help="comma separated provider ids or all")
+    fixed.add_argument('--states', default='all', help="comma separated state fips or all")
+    fixed.add_argument('--technologies', default='all', help="comma separated technology codes or all")
+    fixed.add_argument('--polygonize', action='store_true', help="write H3 hex geometry")
+    fixed.add_argument('--gis-type', default='gpkg', choices=['shp', 'gpkg', 'parquet', 'fgb'])
+    fixed.add_argument('--polygon-workers', type=int, help="processes building hex geometry, default one per CPU "
+                                                            "core, 1 to polygonize in this process")
+    fixed.add_argument('--csv-chunk-size', type=int)
+    fixed.add_argument('--csv-engine', choices=['c', 'pyarrow'])
+    fixed.add_argument('--gpkg-layout', choices=['file', 'single', 'state'])
+    fixed.add_argument('--gpkg-layers', choices=['provider', 'partitioned'])
+    fixed.add_argument('--parquet-row-group-size', type=int)
+    fixed.add_argument('--parquet-compression')
+
+    challenge = commands.add_parser('challenge', help="challenge data, like the Challenge tab")
+    challenge.add_argument('--as-of-date', required=True)
+    challenge.add_argument('--category', required=True)
+    challenge.add_argument('--states', default='all', help="comma separated state fips or all")
+
+    run = commands.add_parser('run', help="run the jobs of a JSON or YAML job file")
+    run.add_argument('job_file')
+    return parser
+
+
+def jobs_from_args(args):
+    if args.command == 'run':
+        return load_job_file(args.job_file)
+    if args.command == 'mobile':
+        job = {'type': 'mobile', 'as_of_date': args.as_of_date, 'provider_id_list': args.providers,
+               'state_fips_list': args.states, 'technology_list': args.technologies,
+               'technology_type': args.technology_type, 'subcategory': args.subcategory,
+               'fiveG_speed_tier_list': args.speed_tiers, 'gis_type': args.gis_type}
+    elif args.command == 'fixed':
+        job = {'type': 'fixed', 'as_of_date': args.as_of_date, 'provider_id_list': args.providers,
+               'state_fips_list': args.states, 'technology_list': args.technologies,
+               'polygonize': args.polygonize, 'gis_type': args.gis_type if args.polygonize else None}
+        for param in ('polygon_workers', 'csv_chunk_size', 'csv_engine', 'gpkg_layout', 'gpkg_layers',
+                      'parquet_row_group_size', 'parquet_compression'):
+            if getattr(args, param) is not None:
+                job[param] = getattr(args, param)
+    else:
+        job = {'type': 'challenge', 'as_of_date': args.as_of_date, 'category': args.category,
+               'state_fips_list': args.states}
+    return [normalize_job(job)]
+
+
+def run_job(guss, job_type, params):
+    if job_type == 'mobile':
+        from bin.download_mb_coverage import MobileCoverageDealer as Dealer
+    elif job_type == 'fixed':
+        from bin.download_fixed_coverage import FixedCoverageDealer as Dealer
+    else:
+        from bin.download_challenge_data import Challenger as Dealer
+    return Dealer(run=True, guss_instance=guss, **params).download()
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    out = sys.stdout
+    try:
+        jobs = jobs_from_args(args)
+    except (OSError, ValueError) as e:
+        parser.error(f"bad job: {e}")
+    credentials = load_credentials(args)
+
+    from guss import GUSS
+    from guss.gussErrors import GussExceptions
+
+    if args.output_dir:
+        try:
+            directories = GUSS.create_initial_directories(args.output_dir)
+        except OSError as e:
+            parser.error(f"cannot use --output-dir {args.output_dir}: {e}")
+        GUSS.BASE_DIR, GUSS.DATA_DIR, GUSS.DATA_INPUT, GUSS.DATA_OUTPUT, GUSS.CSV_OUTPUT, GUSS.SHP_OUTPUT, \
+            GUSS.GPK_OUTPUT, GUSS.PARQUET_OUTPUT, GUSS.FGB_OUTPUT = directories
+
+    guss = GUSS.Guss(**credentials)
+    guss.stop = None
+
+    def request_stop(signum, frame):
+        # finish the files in flight and stop, the job plan resumes the rest on the next run
+        emit(out, 'stop_requested', signal=signal.Signals(signum).name)
+        guss.stop = True
+
+    signal.signal(signal.SIGINT, request_stop)
+    if hasattr(signal, 'SIGTERM'):
+        signal.signal(signal.SIGTERM, request_stop)
+
+    shared = {'max_workers': args.max_workers, 'refresh_reference': args.refresh_reference,
+              'force_download': args.force, 'resume': not args.no_resume}
+    exit_code = 0
+    sys.stdout = JsonLinesStream(out)
+    try:
+        for number, (job_type, params) in enumerate(jobs, start=1):
+            if guss.stop:
+                break
+            params = {**{k: v for k, v in shared.items() if v is not None}, **params}
+            emit(out, 'job_start', job=number, type=job_type, params=params)
+            started = time.perf_counter()
+            try:
+                output_paths = run_job(guss, job_type, params)
+            except Exception as e:
+                # any failure ends this job only, the next jobs still run and the summary stays JSON
+                sys.stdout.flush()
+                error = str(e) if isinstance(e, GussExceptions) else f"{type(e).__name__}: {e}"
+                emit(out, 'job_error', job=number, type=job_type, error=error)
+                exit_code = 1
+                continue
+            sys.stdout.flush()
+            emit(out, 'job_done', job=number, type=job_type, files=len(output_paths or []),
+                 outputs=output_paths or [], seconds=round(time.perf_counter() - started, 3))
+    finally:
+        sys.stdout.flush()
+        sys.stdout = out
+        guss.close()
+
+    if guss.stop:
+        emit(out, 'stopped')
+        return 130
+    return exit_code
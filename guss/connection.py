@@ -1,64 +1,315 @@
+import json
 import sqlite3
+import threading
+import time
 from typing import Optional
 import pandas as pd
 
 
+# reference listing columns kept in the catalog, listings without one of them store NULL
+REFERENCE_COLUMNS = ['file_id', 'file_name', 'file_type', 'category', 'subcategory', 'technology_type',
+                     'technology_code', 'speed_tier', 'state_fips', 'state_name', 'provider_id', 'provider_name']
+
+DOWNLOAD_STATUSES = ('running', 'done', 'failed')
+
+
 class DB:
-    def __init__(self, db_path:str)->None:
+    """
+    SQLite catalog of reference listings and downloads.
+
+    Holds the reference rows of every listed vintage and the status, size, duration and output path of every
+    downloaded file, so jobs can be planned, resumed and queried without listing the API again or scanning the
+    output folders. The database runs in WAL mode and one connection is shared by the download threads behind a
+    lock.
+
+    :param db_path: path of the SQLite file
+    """
+
+    def __init__(self, db_path: str) -> None:
         self.db_path = db_path
-        self.conn: Optional[sqlite3.Connection]=None
+        self.conn: Optional[sqlite3.Connection] = None
         self.cursor: Optional[sqlite3.Cursor] = None
+        self._lock = threading.RLock()
 
-    def connect(self)->bool:
+    def __repr__(self):
+        return f"DB({self.db_path})"
+
+    def connect(self) -> bool:
+        if self.conn is not None:
+            return True
         try:
-            self.conn = sqlite3.connect(self.db_path)
+            self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
             self.conn.row_factory = sqlite3.Row
+            # readers never block the writer, NORMAL sync is durable in WAL mode up to the last commit
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
             self.cursor = self.conn.cursor()
             return True
         except sqlite3.Error as e:
             print(f"Error connecting to database: {e}")
             return False
 
-    def createDB(self):
+    def close(self) -> None:
+        with self._lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+                self.cursor = None
+
+    def createDB(self) -> bool:
         try:
-            if self.connect():
-                # create as of date table
-                self.cursor.execute(
+            if not self.connect():
+                return False
+            with self._lock, self.conn:
+                # reference listing rows of every vintage, listing keys the query params of the listing so the
+                # challenge categories, listed one at a time, keep their own rows. Vintages, providers, states and
+                # file types are all read from these rows
+                self.conn.execute(
                     '''
-                    CREATE TABLE IF NOT EXISTS as_of_date (
-                        vintage_id TEXT PRIMARY KEY,
-                        date DATE NOT NULL
+                    CREATE TABLE IF NOT EXISTS reference (
+                        as_of_date TEXT NOT NULL,
+                        data_type TEXT NOT NULL,
+                        listing TEXT NOT NULL,
+                        file_id INTEGER NOT NULL,
+                        file_name TEXT,
+                        file_type TEXT,
+                        category TEXT,
+                        subcategory TEXT,
+                        technology_type TEXT,
+                        technology_code TEXT,
+                        speed_tier TEXT,
+                        state_fips TEXT,
+                        state_name TEXT,
+                        provider_id TEXT,
+                        provider_name TEXT,
+                        listed_at TEXT NOT NULL,
+                        PRIMARY KEY (as_of_date, data_type, listing, file_id)
                         );
                     '''
                 )
-                # create provider id List
-                self.cursor.execute(
+                # lookups by file, state and provider within a vintage, across its listings
+                self.conn.execute(
                     '''
-                    CREATE TABLE IF NOT EXISTS pid_list (
-                        pid TEXT PRIMARY KEY,
-                        brand_name Text NOT NULL);
+                    CREATE INDEX IF NOT EXISTS idx_reference_file ON reference (as_of_date, data_type, file_id);
                     '''
                 )
-                # state_fips
-                self.cursor.execute(
+                self.conn.execute(
                     '''
-                    CREATE TABLE IF NOT EXISTS state_fips (
-                        date TEXT PRIMARY KEY);
+                    CREATE INDEX IF NOT EXISTS idx_reference_state ON reference (as_of_date, data_type, state_fips);
+                    '''
+                )
+                self.conn.execute(
+                    '''
+                    CREATE INDEX IF NOT EXISTS idx_reference_provider
+                        ON reference (as_of_date, data_type, provider_id);
+                    '''
+                )
+
+                # one row per downloaded file, gis_type 'raw' for the csv downloads
+                self.conn.execute(
+                    '''
+                    CREATE TABLE IF NOT EXISTS downloads (
+                        data_type TEXT NOT NULL,
+                        file_id INTEGER NOT NULL,
+                        gis_type TEXT NOT NULL,
+                        as_of_date TEXT,
+                        file_name TEXT,
+                        status TEXT NOT NULL,
+                        bytes INTEGER,
+                        duration_s REAL,
+                        output_path TEXT,
+                        error TEXT,
+                        updated_at TEXT NOT NULL,
+                        sha256 TEXT,
+                        mtime_ns INTEGER,
+                        PRIMARY KEY (data_type, file_id, gis_type)
+                        );
+                    '''
+                )
+                self.conn.execute(
+                    '''
+                    CREATE INDEX IF NOT EXISTS idx_downloads_status ON downloads (as_of_date, data_type, status);
                     '''
                 )
 
-                # GiS_file_type
-                self.cursor.execute(
+                # persisted job plans, one item per file in download order
+                self.conn.execute(
+                    '''
+                    CREATE TABLE IF NOT EXISTS job_plans (
+                        plan_id TEXT PRIMARY KEY,
+                        name TEXT NOT NULL,
+                        as_of_date TEXT,
+                        created_at TEXT NOT NULL
+                        );
+                    '''
+                )
+                self.conn.execute(
                     '''
-                    CREATE TABLE IF NOT EXISTS file_type (
-                        file_id INTEGER PRIMARY KEY 
-                        file_type TEXT NOT NULL 
+                    CREATE TABLE IF NOT EXISTS job_plan_items (
+                        plan_id TEXT NOT NULL,
+                        seq INTEGER NOT NULL,
+                        job TEXT NOT NULL,
+                        status TEXT NOT NULL,
+                        output_path TEXT,
+                        updated_at TEXT NOT NULL,
+                        PRIMARY KEY (plan_id, seq)
                         );
                     '''
                 )
+            return True
         except sqlite3.Error as e:
-            print(f"Error connecting to database: {e}")
+            print(f"Error creating database: {e}")
             return False
 
-    def query(self, sql:str)-> pd.DataFrame():
-        pass
\ No newline at end of file
+    @staticmethod
+    def _now() -> str:
+        return time.strftime('%Y-%m-%dT%H:%M:%S%z')
+
+    @staticmethod
+    def _gis_key(gis_type) -> str:
+        return str(gis_type).lower() if gis_type else 'raw'
+
+    def query(self, sql: str, params=None) -> pd.DataFrame:
+        """
+        :param sql: str, SELECT statement, use ? placeholders for values
+        :param params: sequence or dict of the placeholder values
+        :return: pd.DataFrame of the result rows
+        """
+        with self._lock:
+            self.connect()
+            return pd.read_sql_query(sql, self.conn, params=params)
+
+    @staticmethod
+    def _listing_key(params) -> str:
+        # query params of a listing, '' for a listing without params
+        return json.dumps(params, sort_keys=True, default=str) if params else ''
+
+    def has_reference(self, as_of_date: str, data_type: str, params: dict = None) -> bool:
+        with self._lock:
+            self.connect()
+            row = self.conn.execute("SELECT 1 FROM reference WHERE as_of_date = ? AND data_type = ? AND listing = ? "
+                                    "LIMIT 1", (str(as_of_date), str(data_type), self._listing_key(params))).fetchone()
+        return row is not None
+
+    def insert_reference(self, reference_df: pd.DataFrame, as_of_date: str, data_type: str, params: dict = None,
+                         batch_size: int = 50_000) -> int:
+        """
+        Replaces the reference rows of one listing with reference_df, in batched inserts inside one transaction.
+        Listings of the same vintage queried with other params keep their rows.
+
+        :param params: dict, query params the listing was fetched with, e.g. the challenge category
+        :return: int, rows written
+        """
+        columns = [column for column in REFERENCE_COLUMNS if column in reference_df.columns]
+        frame = reference_df[columns].astype(object)
+        listing = self._listing_key(params)
+        prefix = (str(as_of_date), str(data_type), listing, self._now())
+        # sqlite binds plain python values only: file_id as int, the codes as text
+        rows = [prefix + tuple(None if pd.isna(v) else int(v) if column == 'file_id' else str(v)
+                               for column, v in zip(columns, row))
+                for row in frame.itertuples(index=False, name=None)]
+        sql = (f"INSERT OR REPLACE INTO reference (as_of_date, data_type, listing, listed_at, {', '.join(columns)}) "
+               f"VALUES (?, ?, ?, ?, {', '.join('?' * len(columns))})")
+
+        with self._lock:
+            self.connect()
+            with self.conn:
+                self.conn.execute("DELETE FROM reference WHERE as_of_date = ? AND data_type = ? AND listing = ?",
+                                  (str(as_of_date), str(data_type), listing))
+                for start in range(0, len(rows), batch_size):
+                    self.conn.executemany(sql, rows[start:start + batch_size])
+        return len(rows)
+
+    def record_download(self, data_type: str, file_id, gis_type, status: str, file_name: str = None,
+                        as_of_date: str = None, bytes_written: int = None, duration_s: float = None,
+                        output_path: str = None, error: str = None, sha256: str = None,
+                        mtime_ns: int = None) -> None:
+        """
+        Upserts the row of one file. sha256 and mtime_ns fingerprint the saved file of a 'done' row, the download
+        manifest trusts only rows holding them.
+        """
+        if status not in DOWNLOAD_STATUSES:
+            raise ValueError(f"status must be one of {DOWNLOAD_STATUSES}, got {status!r}")
+        with self._lock:
+            self.connect()
+            with self.conn:
+                # keep the as_of_date and file_name of an earlier row when this update does not know them
+                self.conn.execute(
+                    '''
+                    INSERT INTO downloads (data_type, file_id, gis_type, as_of_date, file_name, status, bytes,
+                                           duration_s, output_path, error, updated_at, sha256, mtime_ns)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (data_type, file_id, gis_type) DO UPDATE SET
+                        as_of_date = COALESCE(excluded.as_of_date, downloads.as_of_date),
+                        file_name = COALESCE(excluded.file_name, downloads.file_name),
+                        status = excluded.status, bytes = excluded.bytes, duration_s = excluded.duration_s,
+                        output_path = excluded.output_path, error = excluded.error, updated_at = excluded.updated_at,
+                        sha256 = excluded.sha256, mtime_ns = excluded.mtime_ns
+                    ''',
+                    (str(data_type).lower(), int(file_id), self._gis_key(gis_type), as_of_date, file_name, status,
+                     bytes_written, duration_s, None if output_path is None else str(output_path), error,
+                     self._now(), sha256, mtime_ns))
+
+    def update_download_mtime(self, data_type: str, file_id, gis_type, mtime_ns: int) -> None:
+        # the file was touched but its checksum still matches
+        with self._lock:
+            self.connect()
+            with self.conn:
+                self.conn.execute("UPDATE downloads SET mtime_ns = ? "
+                                  "WHERE data_type = ? AND file_id = ? AND gis_type = ?",
+                                  (mtime_ns, str(data_type).lower(), int(file_id), self._gis_key(gis_type)))
+
+    def download_status(self, data_type: str, file_id, gis_type=None) -> Optional[dict]:
+        with self._lock:
+            self.connect()
+            row = self.conn.execute("SELECT * FROM downloads WHERE data_type = ? AND file_id = ? AND gis_type = ?",
+                                    (str(data_type).lower(), int(file_id), self._gis_key(gis_type))).fetchone()
+        return dict(row) if row is not None else None
+
+    def create_plan(self, plan_id: str, name: str, jobs: list, as_of_date: str = None) -> bool:
+        """
+        Stores a job plan and its items, unless a plan with this id already exists.
+
+        :param jobs: list of dicts, JSON serializable download arguments in download order
+        :return: bool, True if the plan was created, False if it was already stored
+        """
+        now = self._now()
+        with self._lock:
+            self.connect()
+            with self.conn:
+                created = self.conn.execute(
+                    "INSERT OR IGNORE INTO job_plans (plan_id, name, as_of_date, created_at) VALUES (?, ?, ?, ?)",
+                    (plan_id, name, as_of_date, now)).rowcount == 1
+                if created:
+                    self.conn.executemany(
+                        "INSERT INTO job_plan_items (plan_id, seq, job, status, updated_at) VALUES (?, ?, ?, ?, ?)",
+                        ((plan_id, seq, json.dumps(job, sort_keys=True), 'pending', now)
+                         for seq, job in enumerate(jobs)))
+        return created
+
+    def plan_items(self, plan_id: str) -> list:
+        """
+        :return: list of dicts (seq, job, status, output_path) in download order
+        """
+        with self._lock:
+            self.connect()
+            rows = self.conn.execute("SELECT seq, job, status, output_path FROM job_plan_items WHERE plan_id = ? "
+                                     "ORDER BY seq", (plan_id,)).fetchall()
+        return [{'seq': row['seq'], 'job': json.loads(row['job']), 'status': row['status'],
+                 'output_path': row['output_path']} for row in rows]
+
+    def complete_plan_item(self, plan_id: str, seq: int, output_path: str) -> None:
+        # one committed transaction per file, a crash loses at most the files still in flight
+        with self._lock:
+            self.connect()
+            with self.conn:
+                self.conn.execute("UPDATE job_plan_items SET status = 'done', output_path = ?, updated_at = ? "
+                                  "WHERE plan_id = ? AND seq = ?",
+                                  (None if output_path is None else str(output_path), self._now(), plan_id, seq))
+
+    def reset_plan(self, plan_id: str) -> None:
+        with self._lock:
+            self.connect()
+            with self.conn:
+                self.conn.execute("UPDATE job_plan_items SET status = 'pending', output_path = NULL, updated_at = ? "
+                                  "WHERE plan_id = ?", (self._now(), plan_id))
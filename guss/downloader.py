@@ -0,0 +1,108 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from guss.gussErrors import GussExceptions
+from guss.plan import JobPlan
+
+
+class DownloadExecutor:
+    """
+    Downloads several files at once through a shared Guss instance.
+
+    :param guss_instance: Guss, instance whose session, credentials and stop flag are shared by every worker
+    :param max_workers: int, max number of files downloading at the same time (defaults to guss.download_workers)
+    """
+
+    def __init__(self, guss_instance, max_workers=None):
+        self.guss_instance = guss_instance
+        if max_workers is None:
+            max_workers = guss_instance.download_workers
+        self.max_workers = max(int(max_workers), 1)
+
+    def __repr__(self):
+        return f"DownloadExecutor(max_workers={self.max_workers})"
+
+    def download(self, jobs, plan=None) -> list:
+        """
+        :param jobs: list of dicts holding the Guss.download_file keyword arguments, in download order
+        :param plan: JobPlan built from jobs, only its unfinished files are downloaded and each finished file is
+                     checkpointed in it
+        :return: list of saved output paths in the same order as jobs. When guss.stop is set no new file is
+                 started and only the files that finished are returned. With a plan, the files finished by
+                 earlier runs of the plan are included.
+        """
+        guss = self.guss_instance
+        if plan is not None:
+            pending_jobs = plan.pending()
+            seqs = [seq for seq, _ in pending_jobs]
+            jobs = [job for _, job in pending_jobs]
+        else:
+            jobs = list(jobs)
+        results = {}
+        error = None
+        stopped = False
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='guss-download') as executor:
+            pending = {}
+            next_job = 0
+
+            while next_job < len(jobs) or pending:
+
+                # keep at most max_workers files in flight so a cancel does not leave a long queue behind
+                while next_job < len(jobs) and len(pending) < self.max_workers and error is None:
+                    if guss.stop:
+                        stopped = True
+                        break
+                    future = executor.submit(guss.download_file, **jobs[next_job])
+                    pending[future] = next_job
+                    next_job += 1
+
+                if stopped or error is not None:
+                    next_job = len(jobs)
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = pending.pop(future)
+                    try:
+                        results[index] = future.result()
+                        if plan is not None:
+                            plan.complete(seqs[index], results[index])
+                    except GussExceptions as e:
+                        if error is None:
+                            error = e
+
+        if error is not None and not guss.stop:
+            raise error
+
+        if stopped or guss.stop:
+            print("Stopped download per User request")
+            guss.stop = True
+
+        if plan is not None:
+            return plan.outputs()
+        return [results[i] for i in sorted(results)]
+
+
+def download_jobs(guss_instance, name, jobs, max_workers=None, resume=True, as_of_date=None):
+    """
+    Downloads jobs the way the dealers do: through a DownloadExecutor and, with resume, a JobPlan kept in the
+    catalog, so a run that died halfway resumes from its first unfinished file.
+
+    :param name: str, dealer running the jobs, 'mobile', 'fixed' or 'challenge'
+    :param jobs: list of dicts holding the Guss.download_file keyword arguments, in download order
+    :param resume: bool, False downloads jobs without a persisted plan
+    :return: list of saved output paths, see DownloadExecutor.download
+    """
+    from guss import GUSS
+
+    plan = None
+    if resume:
+        # the output folder is part of the plan, a run into another folder does not reuse the files of this one
+        plan = JobPlan(guss_instance.catalog, name, jobs, as_of_date=as_of_date, output_dir=GUSS.DATA_OUTPUT)
+    output_paths = DownloadExecutor(guss_instance, max_workers=max_workers).download(jobs, plan=plan)
+
+    stats = guss_instance.connection_stats
+    print(f"Connections opened: {stats['opened']}, reused: {stats['reused']}")
+    return output_paths
@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+
+
+def is_all(values):
+    return any(str(x).strip().lower() == 'all' for x in values)
+
+
+class ReferenceFilter:
+    """
+    Selects rows of a download reference table with vectorized masks.
+
+    The selection is kept as sorted row positions. Clauses covered by a ReferenceIndex resolve by intersecting
+    position sets, the others are turned into boolean masks (set membership on the categorical codes) and the
+    table is sliced once in apply().
+
+    :param reference_df: pd.DataFrame, download reference table from Guss.get_download_reference or
+                         Guss.list_challenge_data
+    :param reference_index: ReferenceIndex, optional index built over reference_df
+    """
+
+    def __init__(self, reference_df, reference_index=None):
+        self.reference_df = reference_df
+        self.reference_index = reference_index
+        self.positions = np.arange(len(reference_df), dtype=np.int64)
+        self.clauses = []
+
+    def __repr__(self):
+        return f"ReferenceFilter({len(self.reference_df)} rows, {self.count()} selected)"
+
+    def __str__(self):
+        return ' and '.join(self.clauses) if self.clauses else 'all rows'
+
+    def count(self):
+        return len(self.positions)
+
+    @staticmethod
+    def _describe(values, limit=10):
+        values = list(values)
+        if len(values) > limit:
+            return f"[{', '.join(values[:limit])}, ... {len(values)} values]"
+        return f"[{', '.join(values)}]"
+
+    # masks, combine them with & and | before passing them to where()
+    def isin_mask(self, column, values):
+        return self.reference_df[column].isin([str(x).strip() for x in values]).to_numpy(dtype=bool)
+
+    def isna_mask(self, column):
+        return self.reference_df[column].isna().to_numpy(dtype=bool)
+
+    def contains_any_mask(self, column, values, sep=','):
+        # membership of any value in a separated list of codes such as technology_code '10,40,50'
+        wanted = {str(x).strip().lower() for x in values}
+        series = self.reference_df[column]
+
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            categories = series.cat.categories
+            if len(categories) == 0:
+                return np.zeros(len(series), dtype=bool)
+            category_mask = np.fromiter(
+                (not wanted.isdisjoint(token.strip().lower() for token in str(category).split(sep))
+                 for category in categories), dtype=bool, count=len(categories))
+            codes = series.cat.codes.to_numpy()
+            return np.where(codes >= 0, category_mask[codes], False)
+
+        series = series.reset_index(drop=True)
+        tokens = series.astype('string').str.lower().str.split(sep).explode().str.strip()
+        hits = tokens.isin(wanted).groupby(level=0).any()
+        return hits.reindex(series.index, fill_value=False).to_numpy(dtype=bool)
+
+    def where(self, mask, clause):
+        mask = np.asarray(mask, dtype=bool)
+        self.positions = self.positions[mask[self.positions]]
+        self.clauses.append(clause)
+        return self
+
+    def within(self, positions, clause):
+        # positions: sorted row positions, usually from the ReferenceIndex
+        self.positions = np.intersect1d(self.positions, positions, assume_unique=True)
+        self.clauses.append(clause)
+        return self
+
+    def _indexed(self, column):
+        return self.reference_index is not None and self.reference_index.has(column)
+
+    # clauses
+    def equals(self, column, value):
+        clause = f"{column} == '{value}'"
+        if self._indexed(column):
+            return self.within(self.reference_index.positions(column, [value]), clause)
+        return self.where(self.reference_df[column].eq(value).to_numpy(dtype=bool), clause)
+
+    def key(self, category, subcategory, technology_type, file_type):
+        if self.reference_index is not None and self.reference_index.keys:
+            clause = (f"category == '{category}' and subcategory == '{subcategory}' and "
+                      f"technology_type == '{technology_type}' and file_type == '{file_type}'")
+            return self.within(self.reference_index.key_positions(category, subcategory, technology_type, file_type),
+                               clause)
+        return self.equals('category', category).equals('subcategory', subcategory) \
+            .equals('technology_type', technology_type).equals('file_type', file_type)
+
+    def isin(self, column, values):
+        # 'all' anywhere in values keeps every row
+        if is_all(values):
+            return self
+        values = [str(x).strip() for x in values]
+        clause = f"{column} in {self._describe(values)}"
+        if self._indexed(column):
+            return self.within(self.reference_index.positions(column, values), clause)
+        return self.where(self.isin_mask(column, values), clause)
+
+    def contains_any(self, column, values, sep=','):
+        if is_all(values):
+            return self
+        values = [str(x).strip() for x in values]
+        clause = f"{column} contains any of {self._describe(values)}"
+        if column == 'technology_code' and sep == ',' and self._indexed(column):
+            return self.within(self.reference_index.technology_positions(values), clause)
+        return self.where(self.contains_any_mask(column, values, sep=sep), clause)
+
+    def file_ids(self):
+        return set(self.reference_df['file_id'].to_numpy()[self.positions].tolist())
+
+    def apply(self, sort_by=None):
+        filtered = self.reference_df.iloc[self.positions]
+        if sort_by:
+            filtered = filtered.sort_values(by=sort_by)
+        return filtered
@@ -0,0 +1,252 @@
+import itertools
+import sqlite3
+from collections import OrderedDict
+from pathlib import Path
+
+import h3
+from h3.api import basic_int as h3_int
+import numpy as np
+import pandas as pd
+import shapely
+
+
+# value of each ascii hex digit, and the shift of each of the 16 digits of a zero padded H3 id
+_HEX_VALUES = np.zeros(256, dtype=np.uint64)
+for _value, _digit in enumerate(b'0123456789abcdef'):
+    _HEX_VALUES[_digit] = _value
+    _HEX_VALUES[ord(chr(_digit).upper())] = _value
+_HEX_SHIFTS = np.arange(60, -4, -4, dtype=np.uint64)
+
+
+def hex_digits_to_int64(digits):
+    """
+    :param digits: np.ndarray, uint8 (n, 16) ascii hex digits of zero padded H3 ids
+    :return: np.ndarray, int64 H3 ids (a valid H3 index never sets the top bit)
+    """
+    return np.bitwise_or.reduce(_HEX_VALUES[digits] << _HEX_SHIFTS, axis=1).view(np.int64)
+
+
+def h3_to_int64(hex_ids):
+    """
+    Vectorized conversion of hex string H3 ids ('882a1340a9fffff') to 64-bit integers.
+    """
+    padded = np.char.rjust(np.asarray(hex_ids, dtype='S16'), 16, b'0')
+    return hex_digits_to_int64(padded.view(np.uint8).reshape(-1, 16))
+
+
+def h3_boundary_arrays(hex_ids):
+    """
+    Boundaries of H3 cells as contiguous arrays.
+
+    :param hex_ids: iterable of hex string H3 cell ids, or np.ndarray of integer ids
+    :return: tuple, (coords, counts): coords is a float64 (n_vertices, 2) array of lng/lat pairs for all cells one
+             after the other, counts holds the number of vertices of each cell (6, 5 for pentagons, more for cells
+             crossing an icosahedron edge)
+    """
+    if isinstance(hex_ids, np.ndarray) and np.issubdtype(hex_ids.dtype, np.integer):
+        boundaries = [h3_int.cell_to_boundary(hex_id) for hex_id in hex_ids.tolist()]
+    else:
+        boundaries = [h3.cell_to_boundary(hex_id) for hex_id in hex_ids]
+    counts = np.fromiter(map(len, boundaries), dtype=np.int64, count=len(boundaries))
+    coords = np.fromiter(itertools.chain.from_iterable(itertools.chain.from_iterable(boundaries)),
+                         dtype=np.float64, count=int(counts.sum()) * 2).reshape(-1, 2)
+    # h3 returns lat/lng, geometries are lng/lat
+    return coords[:, ::-1].copy(), counts
+
+
+def polygons_from_boundaries(coords, counts):
+    """
+    :return: np.ndarray of shapely Polygons, one per entry of counts, built in bulk
+    """
+    if len(counts) == 0:
+        return np.empty(0, dtype=object)
+    ring_index = np.repeat(np.arange(len(counts)), counts)
+    rings = shapely.linearrings(coords, indices=ring_index)
+    return shapely.polygons(rings)
+
+
+class H3BoundaryCache:
+    """
+    Bounded cache of H3 cell boundaries shared by every file polygonized in a run.
+
+    Boundaries are kept as (n_vertices, 2) lng/lat arrays in least recently used order and evicted once their
+    estimated size passes max_bytes. With disk_path the boundaries are also kept in an SQLite file, so later runs
+    only compute the cells they never saw.
+
+    :param max_bytes: int, memory budget of the in-memory cache
+    :param disk_path: path, SQLite file persisting boundaries across runs, None to keep them in memory only
+    """
+
+    ENTRY_OVERHEAD = 200  # bytes of dict slot, key and array header per cached cell, roughly
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, disk_path=None):
+        self.max_bytes = max_bytes
+        self.disk_path = disk_path
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size_bytes = 0
+        self._boundaries = OrderedDict()
+        self._conn = None
+
+    def __repr__(self):
+        return (f"H3BoundaryCache({len(self._boundaries)} cells, {self.size_bytes / 1024 / 1024:.1f} MB, "
+                f"hits={self.hits}, disk_hits={self.disk_hits}, misses={self.misses})")
+
+    def __len__(self):
+        return len(self._boundaries)
+
+    @property
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses, 'evictions': self.evictions,
+                'cells': len(self._boundaries), 'size_bytes': self.size_bytes,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0}
+
+    def _put(self, key, boundary):
+        if key in self._boundaries:
+            return
+        self._boundaries[key] = boundary
+        self.size_bytes += boundary.nbytes + self.ENTRY_OVERHEAD
+        while self.size_bytes > self.max_bytes and self._boundaries:
+            _, evicted = self._boundaries.popitem(last=False)
+            self.size_bytes -= evicted.nbytes + self.ENTRY_OVERHEAD
+            self.evictions += 1
+
+    @staticmethod
+    def disk_key(hex_id):
+        # integer and hex string ids of the same cell share one stored row
+        return hex_id if isinstance(hex_id, str) else format(int(hex_id), 'x')
+
+    def _connect(self):
+        if self._conn is None:
+            Path(self.disk_path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.disk_path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS h3_boundary (hex_id TEXT PRIMARY KEY, coords BLOB NOT NULL)")
+        return self._conn
+
+    def _load_from_disk(self, keys):
+        found = {}
+        conn = self._connect()
+        # stay under SQLite's bound-parameter limit
+        for start in range(0, len(keys), 900):
+            batch = keys[start:start + 900]
+            rows = conn.execute(f"SELECT hex_id, coords FROM h3_boundary WHERE hex_id IN ({','.join('?' * len(batch))})",
+                                [self.disk_key(key) for key in batch]).fetchall()
+            found.update((hex_id, np.frombuffer(coords, dtype=np.float64).reshape(-1, 2)) for hex_id, coords in rows)
+        return found
+
+    def _save_to_disk(self, keys, boundaries):
+        conn = self._connect()
+        with conn:
+            conn.executemany("INSERT OR IGNORE INTO h3_boundary (hex_id, coords) VALUES (?, ?)",
+                             ((self.disk_key(key), boundary.tobytes()) for key, boundary in zip(keys, boundaries)))
+
+    def boundary_arrays(self, hex_ids, compute):
+        """
+        :param hex_ids: sequence of distinct H3 cell ids, hex strings or np.ndarray of integer ids
+        :param compute: callable, takes the missing cell ids (same kind as hex_ids) and returns their (coords, counts) like h3_boundary_arrays
+        :return: tuple, (coords, counts) for hex_ids in order
+        """
+        integer_ids = isinstance(hex_ids, np.ndarray) and np.issubdtype(hex_ids.dtype, np.integer)
+        hex_ids = hex_ids.tolist() if isinstance(hex_ids, np.ndarray) else list(hex_ids)
+        boundaries = [None] * len(hex_ids)
+        missing = []
+        for position, hex_id in enumerate(hex_ids):
+            boundary = self._boundaries.get(hex_id)
+            if boundary is None:
+                missing.append(position)
+            else:
+                self._boundaries.move_to_end(hex_id)
+                boundaries[position] = boundary
+        self.hits += len(hex_ids) - len(missing)
+
+        if missing and self.disk_path is not None:
+            stored = self._load_from_disk([hex_ids[position] for position in missing])
+            still_missing = []
+            for position in missing:
+                boundary = stored.get(self.disk_key(hex_ids[position]))
+                if boundary is None:
+                    still_missing.append(position)
+                else:
+                    boundaries[position] = boundary
+                    self._put(hex_ids[position], boundary)
+            self.disk_hits += len(missing) - len(still_missing)
+            missing = still_missing
+
+        if missing:
+            self.misses += len(missing)
+            missing_ids = [hex_ids[position] for position in missing]
+            coords, counts = compute(np.asarray(missing_ids) if integer_ids else missing_ids)
+            # copies, a view would keep the whole batch array alive for as long as one of its cells is cached
+            computed = [boundary.copy() for boundary in np.split(coords, np.cumsum(counts)[:-1])]
+            for position, hex_id, boundary in zip(missing, missing_ids, computed):
+                boundaries[position] = boundary
+                self._put(hex_id, boundary)
+            if self.disk_path is not None:
+                self._save_to_disk(missing_ids, computed)
+
+        counts = np.fromiter(map(len, boundaries), dtype=np.int64, count=len(boundaries))
+        coords = np.concatenate(boundaries) if boundaries else np.empty((0, 2), dtype=np.float64)
+        return coords, counts
+
+    def clear(self):
+        self._boundaries.clear()
+        self.size_bytes = 0
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def _compute_boundary_arrays(hex_ids, executor=None, chunk_size=100_000):
+    if executor is None or len(hex_ids) <= chunk_size:
+        return h3_boundary_arrays(hex_ids)
+    chunks = [hex_ids[start:start + chunk_size] for start in range(0, len(hex_ids), chunk_size)]
+    # map keeps the chunk order so the cells line up with hex_ids again
+    parts = list(executor.map(h3_boundary_arrays, chunks))
+    return np.concatenate([part[0] for part in parts]), np.concatenate([part[1] for part in parts])
+
+
+def h3_polygons(hex_ids, executor=None, chunk_size=100_000, cache=None):
+    """
+    Polygons of H3 cells, each distinct cell is computed once.
+
+    :param hex_ids: pd.Series, np.ndarray or list of H3 cell ids, hex strings or 64-bit integers
+    :param executor: concurrent.futures.ProcessPoolExecutor, computes the boundaries of chunk_size cells per task
+                     on the other cores, None to compute them in this process
+    :param chunk_size: int, distinct cells per task sent to the executor
+    :param cache: H3BoundaryCache, reuses boundaries computed for earlier files, only unseen cells are computed
+    :return: np.ndarray of shapely Polygons in the order of hex_ids, the same with or without executor or cache.
+             Missing ids (None, NaN, pd.NA) get None
+    """
+    if not isinstance(hex_ids, (pd.Series, pd.Index, np.ndarray)):
+        # np.asarray would turn a NaN among hex strings into the string 'nan'
+        hex_ids = pd.Series(hex_ids)
+    if isinstance(hex_ids, (pd.Series, pd.Index)) and pd.api.types.is_integer_dtype(hex_ids.dtype):
+        # nullable Int64 from the Arrow reader, factorize leaves pd.NA out of the uniques
+        codes, uniques = pd.factorize(hex_ids)
+        uniques = np.asarray(uniques, dtype=np.int64)
+    else:
+        hex_ids = np.asarray(hex_ids)
+        if not np.issubdtype(hex_ids.dtype, np.integer):
+            hex_ids = hex_ids.astype(object)
+        codes, uniques = pd.factorize(hex_ids)
+
+    def compute(cells):
+        return _compute_boundary_arrays(cells, executor=executor, chunk_size=chunk_size)
+
+    if cache is None:
+        coords, counts = compute(uniques)
+    else:
+        coords, counts = cache.boundary_arrays(uniques, compute)
+
+    polygons = polygons_from_boundaries(coords, counts)
+    # factorize gives missing ids the code -1, point it at an appended None instead of the last polygon
+    missing = codes < 0
+    if missing.any():
+        polygons = np.append(polygons, None)
+    return polygons[codes]
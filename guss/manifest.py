@@ -0,0 +1,68 @@
+import hashlib
+import os
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DownloadManifest:
+    """
+    Verified local copies of downloaded files, so a re-run only transfers files it does not hold yet.
+
+    The entries are the 'done' rows of the catalog's downloads table, keyed by data type, file_id and GIS type,
+    which carry the saved path, byte size, sha256 and modification time of the file. A file counts as present
+    when it is still at the recorded path with the recorded size; if its modification time changed since it was
+    recorded the checksum is computed again before trusting it.
+
+    :param catalog: DB, catalog holding the downloads table, usually Guss.catalog
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def __repr__(self):
+        return f"DownloadManifest({self.catalog.db_path})"
+
+    @staticmethod
+    def fingerprint(path, sha256=None):
+        """
+        :param sha256: str, checksum computed while the file was written, None to read the file back to hash it
+        :return: dict, record_download keyword arguments describing the saved file at path
+        """
+        stat = os.stat(path)
+        return {'bytes_written': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256 or file_sha256(path)}
+
+    def get(self, data_type, file_id, gis_type=None):
+        entry = self.catalog.download_status(data_type, file_id, gis_type)
+        if entry is None or entry['status'] != 'done' or not entry.get('sha256') or not entry['output_path']:
+            return None
+        return entry
+
+    def verified_path(self, data_type, file_id, gis_type=None, expected_path=None):
+        """
+        :param expected_path: path, where the file would be saved now, a recorded copy elsewhere is not reused
+        :return: str, path of the verified local copy, None when the file has to be downloaded
+        """
+        entry = self.get(data_type, file_id, gis_type)
+        if entry is None:
+            return None
+        path = entry['output_path']
+        if expected_path is not None and os.path.abspath(path) != os.path.abspath(expected_path):
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if stat.st_size != entry['bytes']:
+            return None
+        if stat.st_mtime_ns != entry['mtime_ns']:
+            # touched since it was recorded, trust it only if the content is unchanged
+            if file_sha256(path) != entry['sha256']:
+                return None
+            self.catalog.update_download_mtime(data_type, file_id, gis_type, stat.st_mtime_ns)
+        return path
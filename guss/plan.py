@@ -0,0 +1,67 @@
+import hashlib
+import json
+from pathlib import Path
+
+
+def _json_value(value):
+    # numpy scalars from the reference frame
+    return value.item() if hasattr(value, 'item') else str(value)
+
+
+def _is_done(item):
+    # a file deleted or moved since it was checkpointed is downloaded again
+    return item['status'] == 'done' and bool(item['output_path']) and Path(item['output_path']).exists()
+
+
+class JobPlan:
+    """
+    Download plan persisted in the catalog, so an interrupted run picks up where it stopped.
+
+    The plan id is derived from the dealer name, the job list and the output folder, so running the same query
+    into the same folder again finds the same plan, and a run into another folder starts its own. Each finished
+    file is checkpointed in its own transaction, the next run only schedules the files that are not done yet, or
+    whose saved file is gone. A plan that finished completely starts over on the next run.
+
+    :param catalog: DB, catalog holding the plan, usually Guss.catalog
+    :param name: str, dealer running the plan, e.g. 'mobile', 'fixed' or 'challenge'
+    :param jobs: list of dicts holding the Guss.download_file keyword arguments, in download order
+    :param as_of_date: str, vintage of the plan, kept for querying
+    :param output_dir: path, folder the files are saved under, e.g. GUSS.DATA_OUTPUT
+    """
+
+    def __init__(self, catalog, name, jobs, as_of_date=None, output_dir=None):
+        self.catalog = catalog
+        self.name = name
+        jobs = [json.loads(json.dumps(job, default=_json_value)) for job in jobs]
+        payload = {'name': name, 'jobs': jobs}
+        if output_dir is not None:
+            payload['output_dir'] = str(Path(output_dir).resolve())
+        payload = json.dumps(payload, sort_keys=True)
+        self.plan_id = hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+        if not catalog.create_plan(self.plan_id, name, jobs, as_of_date=as_of_date):
+            items = catalog.plan_items(self.plan_id)
+            done = sum(_is_done(item) for item in items)
+            if done == len(items):
+                catalog.reset_plan(self.plan_id)
+            elif done:
+                print(f"Resuming {name} download plan: {done} of {len(items)} files already done")
+
+    def __repr__(self):
+        return f"JobPlan({self.name}, {self.plan_id[:12]})"
+
+    def pending(self):
+        """
+        :return: list of (seq, job) tuples not done yet or whose saved file is missing, in download order
+        """
+        return [(item['seq'], item['job']) for item in self.catalog.plan_items(self.plan_id) if not _is_done(item)]
+
+    def complete(self, seq, output_path):
+        self.catalog.complete_plan_item(self.plan_id, seq, output_path)
+
+    def outputs(self):
+        """
+        :return: list of saved output paths of every done file still on disk, this run and earlier ones, in download
+                 order
+        """
+        return [item['output_path'] for item in self.catalog.plan_items(self.plan_id) if _is_done(item)]
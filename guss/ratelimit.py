@@ -0,0 +1,74 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket pacing the requests of every worker sharing it.
+
+    The rate adapts to the server: a 429 reply halves it and pauses the bucket (for Retry-After when given),
+    then each successful request adds back a small step until the configured max_rate is reached again.
+
+    :param max_rate: float, requests per second allowed when the server is not throttling
+    :param capacity: float, number of requests that can go out back to back after an idle period
+    :param min_rate: float, lowest rate the bucket slows down to after repeated 429 replies
+    :param recovery_step: float, requests per second added back after each successful request
+    """
+
+    def __init__(self, max_rate, capacity=None, min_rate=None, recovery_step=None):
+        self.max_rate = float(max_rate)
+        self.capacity = float(capacity) if capacity is not None else max(self.max_rate, 1.0)
+        self.min_rate = float(min_rate) if min_rate is not None else self.max_rate / 16
+        self.recovery_step = float(recovery_step) if recovery_step is not None else self.max_rate / 20
+        self.rate = self.max_rate
+        self.throttled = 0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"TokenBucket(rate={self.rate:.2f}/s, max_rate={self.max_rate:.2f}/s, capacity={self.capacity:.0f})"
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, should_stop=None):
+        """
+        Blocks until a request may be sent.
+
+        :param should_stop: callable, checked while waiting, returning True gives up
+        :return: bool, False if should_stop asked to give up
+        """
+        while True:
+            if should_stop is not None and should_stop():
+                return False
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return True
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(min(wait, 0.5))
+
+    def throttle(self, retry_after=None):
+        # called on a 429 reply
+        with self._lock:
+            now = time.monotonic()
+            self.throttled += 1
+            self._refill(now)
+            self._tokens = 0.0
+            self.rate = max(self.min_rate, self.rate / 2)
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+
+    def success(self):
+        if self.rate < self.max_rate:
+            with self._lock:
+                self._refill(time.monotonic())
+                self.rate = min(self.max_rate, self.rate + self.recovery_step)
@@ -0,0 +1,101 @@
+import numpy as np
+
+
+class ReferenceIndex:
+    """
+    Inverted index over a download reference table, built once when the listing is loaded.
+
+    Maps every value of the selection columns, every (category, subcategory, technology_type, file_type) key and
+    every single technology code to the sorted row positions holding it, so a dealer selection resolves by
+    intersecting position sets instead of scanning the table.
+
+    :param reference_df: pd.DataFrame, download reference table
+    """
+
+    KEY_COLUMNS = ('category', 'subcategory', 'technology_type', 'file_type')
+    INDEXED_COLUMNS = ('category', 'subcategory', 'technology_type', 'file_type', 'state_fips', 'provider_id',
+                       'technology_code', 'speed_tier')
+
+    def __init__(self, reference_df):
+        self.reference_df = reference_df
+        self.columns = {}
+        self.keys = {}
+        self.technologies = {}
+
+        for column in self.INDEXED_COLUMNS:
+            if column in reference_df.columns:
+                self.columns[column] = self._group_positions(reference_df, column)
+
+        if all(column in reference_df.columns for column in self.KEY_COLUMNS):
+            self.keys = self._group_positions(reference_df, list(self.KEY_COLUMNS))
+
+        # technology_code can hold several comma separated codes, index each code on its own
+        for value, positions in self.columns.get('technology_code', {}).items():
+            for token in str(value).split(','):
+                token = token.strip()
+                if token in self.technologies:
+                    self.technologies[token] = np.union1d(self.technologies[token], positions)
+                else:
+                    self.technologies[token] = positions
+
+    def __repr__(self):
+        return f"ReferenceIndex({len(self.reference_df)} rows, {len(self.keys)} keys)"
+
+    def __len__(self):
+        return len(self.reference_df)
+
+    @staticmethod
+    def _group_positions(df, columns):
+        groups = df.groupby(columns, observed=True, sort=False, dropna=True).indices
+        return {(tuple(str(v) for v in key) if isinstance(key, tuple) else str(key)): np.asarray(positions,
+                                                                                                 dtype=np.int64)
+                for key, positions in groups.items()}
+
+    def has(self, column):
+        return column in self.columns
+
+    def positions(self, column, values):
+        """
+        :return: np.ndarray, sorted row positions where column holds any of values
+        """
+        groups = self.columns[column]
+        values = dict.fromkeys(str(x).strip() for x in values)
+        found = [groups[x] for x in values if x in groups]
+        # the groups of one column never share a row, no de-duplication needed
+        return self._union(found, disjoint=True)
+
+    def key_positions(self, category, subcategory, technology_type, file_type):
+        key = (str(category), str(subcategory), str(technology_type), str(file_type))
+        return self.keys.get(key, np.empty(0, dtype=np.int64))
+
+    def technology_positions(self, values):
+        found = [self.technologies[str(x).strip()] for x in values if str(x).strip() in self.technologies]
+        return self._union(found)
+
+    @staticmethod
+    def _union(found, disjoint=False):
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        if len(found) == 1:
+            return found[0]
+        if disjoint:
+            return np.sort(np.concatenate(found))
+        return np.unique(np.concatenate(found))
+
+    def file_ids(self, positions):
+        return set(self.reference_df['file_id'].to_numpy()[positions].tolist())
+
+    def values(self, column, positions=None):
+        """
+        Valid values of a column, e.g. to fill GUI dropdowns.
+
+        :param positions: np.ndarray, only list values found in these rows
+        """
+        if column == 'technology':
+            groups = self.technologies
+        else:
+            groups = self.columns[column]
+        if positions is None:
+            return sorted(groups)
+        return sorted(value for value, rows in groups.items()
+                      if len(np.intersect1d(rows, positions, assume_unique=True)))
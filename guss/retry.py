@@ -0,0 +1,73 @@
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+
+
+class RetryPolicy:
+    """
+    Decides which failed requests are retried and how long to wait between attempts.
+
+    :param max_attempts: int, total number of attempts per request, the first one included
+    :param backoff_base: float, seconds to wait before the first retry, doubled on every following retry
+    :param backoff_cap: float, max seconds to wait between two attempts
+    :param jitter: bool, True to wait a random time between 0 and the backoff ("full jitter") so parallel
+                   downloads do not retry in lock step
+    :param retry_statuses: tuple, HTTP status codes worth retrying
+    :param retry_exceptions: tuple, requests exceptions worth retrying
+    """
+
+    def __init__(self, max_attempts=5, backoff_base=1.0, backoff_cap=60.0, jitter=True,
+                 retry_statuses=(429, 500, 502, 503, 504),
+                 retry_exceptions=(requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                                   requests.exceptions.ChunkedEncodingError)):
+        self.max_attempts = max(int(max_attempts), 1)
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.jitter = jitter
+        self.retry_statuses = tuple(retry_statuses)
+        self.retry_exceptions = tuple(retry_exceptions)
+
+    def __repr__(self):
+        return (f"RetryPolicy(max_attempts={self.max_attempts}, backoff_base={self.backoff_base}, "
+                f"backoff_cap={self.backoff_cap}, jitter={self.jitter})")
+
+    def can_retry(self, attempt):
+        return attempt < self.max_attempts
+
+    def is_retryable_status(self, status):
+        return status in self.retry_statuses
+
+    def is_retryable_exception(self, exc):
+        return isinstance(exc, self.retry_exceptions)
+
+    def delay(self, attempt, retry_after=None):
+        """
+        :param attempt: int, number of the attempt that just failed (1 for the first one)
+        :param retry_after: float, seconds asked by the server, always honored even above backoff_cap
+        :return: float, seconds to wait before the next attempt
+        """
+        backoff = min(self.backoff_cap, self.backoff_base * (2 ** (attempt - 1)))
+        if self.jitter:
+            backoff = random.uniform(0, backoff)
+        if retry_after is not None:
+            return max(backoff, retry_after)
+        return backoff
+
+    @staticmethod
+    def parse_retry_after(value):
+        # Retry-After is either a number of seconds or an HTTP date
+        if not value:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
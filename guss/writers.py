@@ -0,0 +1,193 @@
+import itertools
+import json
+import os
+import sqlite3
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pyogrio.raw
+import shapely
+
+GEOMETRY_COLUMN = 'geometry'
+BBOX_COLUMN = 'bbox'
+# files GDAL writes next to a .shp
+SHAPEFILE_SUFFIXES = ('.shp', '.shx', '.dbf', '.prj', '.cpg')
+
+
+def _plain_type(arrow_type):
+    # GDAL takes dictionary and 64-bit offset columns less well than plain ones, decode them once per batch
+    if pa.types.is_dictionary(arrow_type):
+        return _plain_type(arrow_type.value_type)
+    if pa.types.is_large_string(arrow_type) or pa.types.is_string_view(arrow_type):
+        return pa.string()
+    if pa.types.is_large_binary(arrow_type):
+        return pa.binary()
+    return arrow_type
+
+
+def frame_to_record_batch(df, geometries, geometry_name=GEOMETRY_COLUMN, bbox=False):
+    """
+    Attribute columns of df plus a WKB geometry column as one Arrow record batch, no GeoDataFrame in between.
+
+    :param df: pd.DataFrame, attributes
+    :param geometries: np.ndarray of shapely geometries, one per row of df
+    :param bbox: bool, add a bbox struct column (xmin, ymin, xmax, ymax) for GeoParquet readers to filter on
+    :return: pyarrow.RecordBatch
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    columns = []
+    for field, column in zip(table.schema, table.columns):
+        plain_type = _plain_type(field.type)
+        column = column.combine_chunks()
+        columns.append(pc.cast(column, plain_type) if plain_type != field.type else column)
+    names = table.schema.names + [geometry_name]
+    columns.append(pa.array(shapely.to_wkb(geometries), type=pa.binary()))
+    if bbox:
+        bounds = shapely.bounds(geometries)
+        columns.append(pa.StructArray.from_arrays([pa.array(bounds[:, i]) for i in range(4)],
+                                                  names=['xmin', 'ymin', 'xmax', 'ymax']))
+        names.append(BBOX_COLUMN)
+    return pa.RecordBatch.from_arrays(columns, names=names)
+
+
+def write_arrow_layer(path, batches, layer=None, driver=None, geometry_type='Polygon', crs='EPSG:4326',
+                      geometry_name=GEOMETRY_COLUMN, append=False, **options):
+    """
+    Streams record batches into one layer with a single pyogrio.raw.write_arrow call.
+
+    The output is opened once and every batch goes through GDAL's Arrow writer, inside one transaction for
+    transactional formats such as GeoPackage, so the write runs at disk speed instead of per-feature Python.
+    Batches after the first are cast to its schema, so chunks of one file always match.
+
+    :param path: path, output file
+    :param batches: iterable of pyarrow.RecordBatch from frame_to_record_batch, consumed lazily
+    :param layer: str, layer name, None for the driver default
+    :param driver: str, OGR driver, e.g. 'GPKG' or 'ESRI Shapefile'
+    :param options: dataset and layer creation options passed through to GDAL
+    :return: int, number of features written, 0 when batches was empty and nothing was written
+    """
+    batches = iter(batches)
+    first = next(batches, None)
+    if first is None:
+        return 0
+    schema = first.schema
+    written = [0]
+
+    def stream():
+        for batch in itertools.chain([first], batches):
+            if batch.schema != schema:
+                batch = batch.cast(schema)
+            written[0] += batch.num_rows
+            yield batch
+
+    reader = pa.RecordBatchReader.from_batches(schema, stream())
+    pyogrio.raw.write_arrow(reader, str(path), layer=layer, driver=driver, geometry_name=geometry_name,
+                            geometry_type=geometry_type, crs=crs, append=append, **options)
+    return written[0]
+
+
+def geoparquet_metadata(schema, geometry_name=GEOMETRY_COLUMN, geometry_types=('Polygon',)):
+    # GeoParquet 1.1 'geo' file metadata, no crs means OGC:CRS84 (lng/lat WGS 84)
+    column = {'encoding': 'WKB', 'geometry_types': list(geometry_types)}
+    if BBOX_COLUMN in schema.names:
+        column['covering'] = {'bbox': {key: [BBOX_COLUMN, key] for key in ('xmin', 'ymin', 'xmax', 'ymax')}}
+    return {'version': '1.1.0', 'primary_column': geometry_name, 'columns': {geometry_name: column}}
+
+
+def write_geoparquet(path, batches, row_group_size=100_000, compression='zstd', geometry_name=GEOMETRY_COLUMN,
+                     geometry_types=('Polygon',)):
+    """
+    Streams record batches into a GeoParquet file.
+
+    Batches are regrouped into row groups of row_group_size rows, each with column statistics, so readers can
+    skip row groups by bbox and read only the columns they ask for.
+
+    :param path: path, output .parquet file
+    :param batches: iterable of pyarrow.RecordBatch from frame_to_record_batch, bbox=True adds the bbox covering
+    :param row_group_size: int, rows per row group
+    :param compression: str, parquet codec: 'zstd', 'snappy', 'gzip', 'lz4', 'brotli' or 'none'
+    :return: int, number of features written, 0 when batches was empty and nothing was written
+    """
+    batches = iter(batches)
+    first = next(batches, None)
+    if first is None:
+        return 0
+    geo = geoparquet_metadata(first.schema, geometry_name, geometry_types)
+    schema = first.schema.with_metadata({b'geo': json.dumps(geo).encode('utf-8')})
+
+    written = 0
+    pending = []
+    pending_rows = 0
+    with pq.ParquetWriter(str(path), schema, compression=compression) as writer:
+        for batch in itertools.chain([first], batches):
+            if batch.schema != first.schema:
+                batch = batch.cast(first.schema)
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            if pending_rows >= row_group_size:
+                table = pa.Table.from_batches(pending, schema=schema)
+                # keep the rows past the last full row group for the next one
+                full_rows = pending_rows - pending_rows % row_group_size
+                writer.write_table(table.slice(0, full_rows), row_group_size=row_group_size)
+                pending = table.slice(full_rows).to_batches()
+                pending_rows -= full_rows
+                written += full_rows
+        if pending_rows:
+            writer.write_table(pa.Table.from_batches(pending, schema=schema), row_group_size=row_group_size)
+            written += pending_rows
+    return written
+
+
+def partial_path(path):
+    """
+    :return: Path, name an output is written under until it is complete, 'x.gpkg' -> 'x.partial.gpkg'
+    """
+    path = Path(path)
+    return path.with_name(f"{path.stem}.partial{path.suffix}")
+
+
+def output_files(path):
+    # a shapefile is several files sharing its stem
+    path = Path(path)
+    if path.suffix.lower() == '.shp':
+        return [path.with_suffix(suffix) for suffix in SHAPEFILE_SUFFIXES if path.with_suffix(suffix).exists()]
+    return [path] if path.exists() else []
+
+
+def finish_output(partial, path):
+    """
+    Moves a complete output from its partial name to path, replacing an earlier output of the same name.
+    """
+    for source in output_files(partial):
+        os.replace(source, Path(path).with_suffix(source.suffix))
+
+
+def discard_output(path):
+    for file in output_files(path):
+        os.remove(file)
+
+
+def drop_gpkg_layer(path, layer):
+    """
+    Removes a layer, its spatial index and its registrations from a GeoPackage, the other layers stay.
+    GDAL keeps the rows written before a failed write_arrow, this takes a partial layer out again.
+    """
+    if not os.path.exists(path):
+        return
+    conn = sqlite3.connect(str(path))
+    try:
+        with conn:
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            if 'gpkg_geometry_columns' in tables:
+                for (column,) in conn.execute("SELECT column_name FROM gpkg_geometry_columns "
+                                              "WHERE lower(table_name) = lower(?)", (layer,)).fetchall():
+                    conn.execute(f'DROP TABLE IF EXISTS "rtree_{layer}_{column}"')
+            conn.execute(f'DROP TABLE IF EXISTS "{layer}"')
+            for registry in ('gpkg_geometry_columns', 'gpkg_contents', 'gpkg_ogr_contents', 'gpkg_extensions',
+                             'gpkg_data_columns', 'gpkg_metadata_reference'):
+                if registry in tables:
+                    conn.execute(f"DELETE FROM {registry} WHERE lower(table_name) = lower(?)", (layer,))
+    finally:
+        conn.close()
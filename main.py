@@ -3,6 +3,8 @@ import sys
 import os
 import json
 import typing
+import multiprocessing
+import threading
 
 from PyQt5 import uic
 from PyQt5.QtWidgets import QApplication, QMainWindow, QDialog, QFileDialog, QShortcut
@@ -10,12 +12,12 @@ from PyQt5.QtGui import QKeySequence, QMouseEvent, QIcon, QPixmap
 from PyQt5.QtCore import Qt, QObject, pyqtSignal, QThread, QProcess, QPoint
 
 from dotenv import load_dotenv
-from bin.download_mb_coverage import MobileCoverageDealer
-from bin.download_fixed_coverage import FixedCoverageDealer
-from bin.download_challenge_data import Challenger
-from guss import GUSS, BASE_DIR
+# the dealers and guss.GUSS pull in pandas, pyarrow, h3 and shapely, they are imported when a workflow starts
+# (or by preload_workflows once the window is up) so the window opens without waiting for them
+from guss import BASE_DIR, DATA_DIR, DATA_OUTPUT
 from guss.gussErrors import GussExceptions
 from gui.dark_mode import set_dark_pallet
+from gui.log_sink import LogSink
 
 
 def resource_path(relative_path:str)->str:
@@ -35,6 +37,16 @@ def resource_path(relative_path:str)->str:
     return os.path.join(bundle_dir, relative_path)
 
 
+def preload_workflows():
+    # warms the import cache on a background thread, a workflow started meanwhile waits on the import lock
+    def load():
+        import bin.download_mb_coverage
+        import bin.download_fixed_coverage
+        import bin.download_challenge_data
+
+    threading.Thread(target=load, name='guss-preload', daemon=True).start()
+
+
 def tech_split_entry(s: str):
     s = s.replace(" ", "")
     s_list = [int(x) if x.isdigit() else x.strip(" ") for x in s.split(',')]
@@ -66,7 +78,6 @@ class MessageDialog(QDialog):
 
 # noinspection PyUnresolvedReferences
 class MobileWorker(QObject):
-    progress = pyqtSignal(str)
     finished = pyqtSignal()
 
     def __init__(self, params):
@@ -76,31 +87,23 @@ class MobileWorker(QObject):
         self.message_dialog = MessageDialog()
 
     def run(self):
-        def print_hook(*args, **kwargs):
-
-            message = f"\n{args[1]}"
-            self.progress.emit(message + '\n')
-
-        original_stdout = sys.stdout
-        sys.stdout = type('', (), {'write': print_hook, 'flush': lambda: None})()
-
+        # prints go to the window's LogSink, which is safe to write from this thread
         try:
+            from bin.download_mb_coverage import MobileCoverageDealer
 
             mobile_coverage_dealer = MobileCoverageDealer(**self.params)
             output_path_list = mobile_coverage_dealer.download()
             self.message_dialog.write_message(f"Download Complete, {len(output_path_list)} number of file(s) saved.")
 
         except GussExceptions as e:
-            self.progress.emit(f"{e}")
+            print(f"{e}")
             self.message_dialog.write_message(f"{e}")
         finally:
             self.message_dialog.show_model()
-            sys.stdout = original_stdout
             self.finished.emit()
 
 
 class FixedWorker(QObject):
-    progress = pyqtSignal(str)
     finished = pyqtSignal()
 
     def __init__(self, params):
@@ -110,32 +113,24 @@ class FixedWorker(QObject):
         self.message_dialog = MessageDialog()
 
     def run(self):
-        def print_hook(*args, **kwargs):
-
-            message = f"\n{args[1]}"
-            self.progress.emit(message + '\n')
-
-        original_stdout = sys.stdout
-        sys.stdout = type('', (), {'write': print_hook, 'flush': lambda: None})()
-
+        # prints go to the window's LogSink, which is safe to write from this thread
         try:
+            from bin.download_fixed_coverage import FixedCoverageDealer
 
             fixed_coverage_dealer = FixedCoverageDealer(**self.params)
             output_path_list = fixed_coverage_dealer.download()
             self.message_dialog.write_message(f"Download Complete, {len(output_path_list)} number of file(s) saved.")
 
         except GussExceptions as e:
-            self.progress.emit(f"{e}")
+            print(f"{e}")
             self.message_dialog.write_message(f"{e}")
         finally:
             self.message_dialog.show_model()
-            sys.stdout = original_stdout
             self.finished.emit()
 
 
 # noinspection PyUnresolvedReferences
 class ChallengeWorker(QObject):
-    progress = pyqtSignal(str)
     finished = pyqtSignal()
 
     def __init__(self, params):
@@ -145,26 +140,19 @@ class ChallengeWorker(QObject):
         self.message_dialog = MessageDialog()
 
     def run(self):
-        def print_hook(*args, **kwargs):
-
-            message = f"\n{args[1]}"
-            self.progress.emit(message + '\n')
-
-        original_stdout = sys.stdout
-        sys.stdout = type('', (), {'write': print_hook, 'flush': lambda: None})()
-
+        # prints go to the window's LogSink, which is safe to write from this thread
         try:
+            from bin.download_challenge_data import Challenger
 
             challenge_dealer = Challenger(**self.params)
             output_path_list = challenge_dealer.download()
             self.message_dialog.write_message(f"Download Complete, {len(output_path_list)} number of file(s) saved.")
 
         except GussExceptions as e:
-            self.progress.emit(f"{e}")
+            print(f"{e}")
             self.message_dialog.write_message(f"{e}")
         finally:
             self.message_dialog.show_model()
-            sys.stdout = original_stdout
             self.finished.emit()
 
 
@@ -207,8 +195,9 @@ class GussMainWindow(QMainWindow):
         self.message_dialog = MessageDialog()
         self.message_dialog.setWindowModality(2)
 
-        # Redirect stdout to QTextBrowser (initial setup)
-        sys.stdout = EmittingStream(self.app_stdOut)
+        # Redirect stdout to the log view, batched by a timer and kept in data/logs/guss.log
+        self.log_sink = LogSink(self.app_stdOut, log_path=DATA_DIR / 'logs' / 'guss.log')
+        sys.stdout = self.log_sink
 
         # Connect submit buttons
         self.m_submitt.clicked.connect(lambda: self.m_submit_clicked(self.is_env_set()))
@@ -231,7 +220,7 @@ class GussMainWindow(QMainWindow):
         self.clear_messages_btn.clicked.connect(lambda: self.clear_message_box())
 
         # Base Output Path
-        self.base_file_path.setText(str(GUSS.DATA_OUTPUT))
+        self.base_file_path.setText(str(DATA_OUTPUT))
         self.base_folder_select_btn.clicked.connect(lambda: self.set_new_base_dirs())
 
         # Fixed logic
@@ -256,11 +245,19 @@ class GussMainWindow(QMainWindow):
                 btn.setEnabled(True)
 
     def clear_message_box(self):
-        self.app_stdOut.clear()
+        self.log_sink.clear()
 
     def create_Guss_instance(self):
+        from guss import GUSS
         credentials = ast.literal_eval(os.environ['credentials'])
-        guss = GUSS.Guss(**credentials)
+        # reuse the instance (and its pooled keep-alive connections) while the credentials stay the same
+        guss = getattr(self, 'guss_instance', None)
+        if guss is None or self.guss_credentials != credentials:
+            if guss is not None:
+                guss.close()
+            guss = GUSS.Guss(**credentials)
+            self.guss_credentials = credentials
+        guss.stop = None
         print(f"\n----------------------------------------------------------------------------")
         print(f"Guss User: {guss}")
         self.guss_instance = guss
@@ -289,9 +286,11 @@ class GussMainWindow(QMainWindow):
     def set_new_base_dirs(self):
         folder_path = QFileDialog.getExistingDirectory(self, 'Select Output folder')
         if folder_path:
+            from guss import GUSS
             GUSS.BASE_DIR, GUSS.DATA_DIR, GUSS.DATA_INPUT, \
             GUSS.DATA_OUTPUT, GUSS.CSV_OUTPUT, GUSS.SHP_OUTPUT, \
-            GUSS.GPK_OUTPUT = GUSS.create_initial_directories(folder_path)  # todo: this is a bug
+            GUSS.GPK_OUTPUT, GUSS.PARQUET_OUTPUT, \
+            GUSS.FGB_OUTPUT = GUSS.create_initial_directories(folder_path)  # todo: this is a bug
             self.base_file_path.setText(str(GUSS.BASE_DIR))
 
     def is_env_set(self):
@@ -305,10 +304,6 @@ class GussMainWindow(QMainWindow):
     def enable_other_field(self, checked):
         self.f_GIS_Output_type_com.setEnabled(checked)
 
-    def update_text_browser(self, text):
-        self.app_stdOut.moveCursor(self.app_stdOut.textCursor().End)
-        self.app_stdOut.insertPlainText(text)
-
     def m_submit_clicked(self, env_set):
         if env_set:
             self.set_credentials()
@@ -345,7 +340,6 @@ class GussMainWindow(QMainWindow):
 
             # 3. Connect signals for communication
             self.thread.started.connect(self.m_worker.run)
-            self.m_worker.progress.connect(self.update_text_browser)
             self.m_worker.finished.connect(self.on_worker_finished)
 
             # 4. Connect cleanup operations (recommended)
@@ -394,7 +388,6 @@ class GussMainWindow(QMainWindow):
 
             # 3. Connect signals for communication
             self.thread.started.connect(self.f_worker.run)
-            self.f_worker.progress.connect(self.update_text_browser)
             self.f_worker.finished.connect(self.on_worker_finished)
 
             # 4. Connect cleanup operations (recommended)
@@ -435,7 +428,6 @@ class GussMainWindow(QMainWindow):
 
             # 3. Connect signals for communication
             self.thread.started.connect(self.c_worker.run)
-            self.c_worker.progress.connect(self.update_text_browser)
             self.c_worker.finished.connect(self.on_worker_finished)
 
             # 4. Connect cleanup operations (recommended)
@@ -449,24 +441,6 @@ class GussMainWindow(QMainWindow):
             self.toggle_lock_buttons()
 
 
-class EmittingStream:
-    def __init__(self, text_browser):
-        self.text_browser = text_browser
-        self.original_stdout = sys.__stdout__
-        self.original_stderr = sys.__stderr__
-
-    def write(self, text):
-        if not isinstance(text, str):
-            text = str(text)
-
-        self.text_browser.moveCursor(self.text_browser.textCursor().End)
-        self.text_browser.insertPlainText(text)
-
-    def flush(self):
-        self.original_stdout.flush()
-        self.original_stderr.flush()
-
-
 EXIT_CODE_RESTART = -123
 
 
@@ -480,7 +454,10 @@ def main():
         Guss_window = GussMainWindow()
         Guss_window.setWindowTitle("GUSS")
         Guss_window.show()
+        preload_workflows()
         exit_code = app.exec()
+        Guss_window.log_sink.close()
+        sys.stdout = sys.__stdout__
 
         if exit_code != EXIT_CODE_RESTART:
             break
@@ -488,4 +465,6 @@ def main():
 
 
 if __name__ == '__main__':
+    # needed by the polygonization process pool in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
     main()
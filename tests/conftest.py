@@ -0,0 +1,93 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from guss import GUSS
+from guss.retry import RetryPolicy
+
+
+class FileServer:
+    """
+    Local HTTP server for the download tests, each path maps to a handler(request) callable. Every request is
+    recorded as (path with query string, headers) in requests.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                server.requests.append((self.path, dict(self.headers)))
+                route = server.routes.get(path)
+                if route is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                route(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def send_body(request, body, status=200, headers=None, cut_at=None):
+    """
+    Replies with body, cut_at closes the connection after that many bytes although Content-Length announced
+    the full body.
+    """
+    request.send_response(status)
+    request.send_header('Content-Length', str(len(body)))
+    for name, value in (headers or {}).items():
+        request.send_header(name, value)
+    if cut_at is not None:
+        request.send_header('Connection', 'close')
+    request.end_headers()
+    request.wfile.write(body if cut_at is None else body[:cut_at])
+    request.wfile.flush()
+    if cut_at is not None:
+        request.close_connection = True
+
+
+@pytest.fixture
+def file_server():
+    server = FileServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def data_dirs(tmp_path, monkeypatch):
+    # keep the data tree of the tests out of the repository
+    dirs = GUSS.create_initial_directories(tmp_path)
+    for name, path in zip(['BASE_DIR', 'DATA_DIR', 'DATA_INPUT', 'DATA_OUTPUT', 'CSV_OUTPUT', 'SHP_OUTPUT',
+                           'GPK_OUTPUT', 'PARQUET_OUTPUT', 'FGB_OUTPUT'], dirs):
+        monkeypatch.setattr(GUSS, name, path, raising=False)
+    return dict(zip(['BASE_DIR', 'DATA_DIR', 'DATA_INPUT', 'DATA_OUTPUT', 'CSV_OUTPUT'], dirs))
+
+
+@pytest.fixture
+def guss(file_server, data_dirs, monkeypatch):
+    monkeypatch.setenv('BASE_URL', file_server.base_url)
+    instance = GUSS.Guss(USERNAME='user', HASH_VALUE='hash', chunk_size=1024, download_burst=100,
+                         download_rate=1000, listing_burst=100, listing_rate=1000,
+                         retry_policy=RetryPolicy(max_attempts=3, backoff_base=0.01, jitter=False))
+    yield instance
+    instance.close()
@@ -0,0 +1,70 @@
+import os
+import statistics
+import subprocess
+import sys
+
+# cold-start cost of the entry points, each import runs in a fresh interpreter
+MODULES = ['guss', 'guss.cli', 'guss.GUSS', 'bin.download_mb_coverage', 'bin.download_fixed_coverage',
+           'bin.download_challenge_data', 'main']
+
+# stacks that should only load once a workflow starts
+HEAVY_MODULES = ['pandas', 'numpy', 'pyarrow', 'geopandas', 'pyogrio', 'shapely', 'h3', 'requests']
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(f"{{elapsed:.6f}} {{','.join(heavy)}}")
+"""
+
+
+def import_time(module, repeat=5, cwd=None):
+    """
+    :return: tuple, (median seconds to import module in a new interpreter, heavy modules it loaded)
+    """
+    times = []
+    heavy = ''
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                                cwd=cwd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1])
+        elapsed, _, heavy = result.stdout.strip().partition(' ')
+        times.append(float(elapsed))
+    return statistics.median(times), heavy
+
+
+def slowest_imports(module, top=10, cwd=None):
+    # python -X importtime breakdown, cumulative microseconds per imported module
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"], cwd=cwd,
+                            capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        if cumulative_us.strip().isdigit():
+            rows.append((int(cumulative_us), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def run_benchmark(modules=MODULES, repeat=5):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    print(f"{'module':<32}{'median s':>10}  heavy modules loaded")
+    for module in modules:
+        try:
+            seconds, heavy = import_time(module, repeat=repeat, cwd=root)
+        except RuntimeError as e:
+            print(f"{module:<32}{'failed':>10}  {e}")
+            continue
+        print(f"{module:<32}{seconds:>10.3f}  {heavy or '-'}")
+
+    print("\nslowest imports of guss.GUSS (cumulative ms):")
+    for cumulative_us, name in slowest_imports('guss.GUSS', cwd=root):
+        print(f"  {cumulative_us / 1000:>8.1f}  {name}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
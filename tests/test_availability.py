@@ -0,0 +1,115 @@
+import zipfile
+
+import h3
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+import shapely
+
+from guss.availability import arrow_h3_to_int64, read_availability_chunks
+from guss.geometry import h3_polygons, h3_to_int64
+
+HEX_IDS = ['882a1340a9fffff', '882a1340a1fffff', '8828308281fffff', '88283082b9fffff', '8844c0a303fffff']
+
+
+def test_h3_to_int64_matches_python_parsing():
+    assert h3_to_int64(HEX_IDS).tolist() == [int(x, 16) for x in HEX_IDS]
+    assert h3_to_int64([x.upper() for x in HEX_IDS]).tolist() == [int(x, 16) for x in HEX_IDS]
+
+
+def test_arrow_h3_to_int64_decodes_data_buffer():
+    column = pa.array(HEX_IDS)
+    result = arrow_h3_to_int64(column)
+    assert result.dtype == np.int64
+    assert result.tolist() == [int(x, 16) for x in HEX_IDS]
+
+
+def test_arrow_h3_to_int64_sliced_and_chunked():
+    chunked = pa.chunked_array([pa.array(HEX_IDS[:2]), pa.array(HEX_IDS[2:])])
+    assert arrow_h3_to_int64(chunked).tolist() == [int(x, 16) for x in HEX_IDS]
+    # a slice starts at an offset into the shared buffers
+    assert arrow_h3_to_int64(pa.array(HEX_IDS).slice(2)).tolist() == [int(x, 16) for x in HEX_IDS[2:]]
+
+
+def test_arrow_h3_to_int64_short_ids():
+    ids = ['1', 'ff', HEX_IDS[0]]
+    assert arrow_h3_to_int64(pa.array(ids)).tolist() == [int(x, 16) for x in ids]
+
+
+def test_arrow_h3_to_int64_nulls():
+    result = arrow_h3_to_int64(pa.array([HEX_IDS[0], None, HEX_IDS[1]]))
+    assert str(result.dtype) == 'Int64'
+    assert result[0] == int(HEX_IDS[0], 16) and result[2] == int(HEX_IDS[1], 16)
+    assert result.isna().tolist() == [False, True, False]
+
+
+def test_integer_ids_give_the_same_polygons_as_hex_strings():
+    from_hex = h3_polygons(HEX_IDS)
+    from_int = h3_polygons(h3_to_int64(HEX_IDS))
+    assert all(shapely.equals(a, b) for a, b in zip(from_hex, from_int))
+    assert h3.int_to_str(int(h3_to_int64(HEX_IDS[:1])[0])) == HEX_IDS[0]
+
+
+def write_availability_zip(path, rows):
+    columns = ['frn', 'provider_id', 'brand_name', 'location_id', 'technology', 'max_advertised_download_speed',
+               'max_advertised_upload_speed', 'low_latency', 'business_residential_code', 'state_usps',
+               'block_geoid', 'h3_res8_id']
+    df = pd.DataFrame(rows, columns=columns)
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('availability.csv', df.to_csv(index=False))
+
+
+@pytest.fixture
+def availability_zip(tmp_path):
+    rows = []
+    for i in range(23):
+        hex_id = HEX_IDS[i % len(HEX_IDS)] if i != 7 else None
+        rows.append(['0012345678', '130077', 'Brand A' if i % 2 else 'Brand B', 1000000000 + i, 40 if i % 3 else 50,
+                     1000, 100, 1, 'R', 'NY', f"3606100010{i:05d}", hex_id])
+    path = tmp_path / 'availability.zip'
+    write_availability_zip(path, rows)
+    return path
+
+
+def test_engines_read_the_same_rows(availability_zip):
+    c_chunks = list(read_availability_chunks(availability_zip, chunk_size=5, engine='c'))
+    arrow_chunks = list(read_availability_chunks(availability_zip, chunk_size=5, engine='pyarrow'))
+
+    assert [len(chunk) for chunk in c_chunks] == [len(chunk) for chunk in arrow_chunks] == [5, 5, 5, 5, 3]
+    c_df = pd.concat(c_chunks, ignore_index=True)
+    arrow_df = pd.concat(arrow_chunks, ignore_index=True)
+    assert list(c_df.columns) == list(arrow_df.columns)
+
+    for column in ['brand_name', 'state_usps', 'block_geoid', 'business_residential_code']:
+        assert c_df[column].astype(str).tolist() == arrow_df[column].astype(str).tolist(), column
+    for column in ['frn', 'provider_id', 'location_id', 'technology', 'max_advertised_download_speed',
+                   'max_advertised_upload_speed', 'low_latency']:
+        assert c_df[column].astype('int64').tolist() == arrow_df[column].astype('int64').tolist(), column
+    # the default engine keeps the integer ids it inferred before chunking, block GEOIDs stay text
+    for column in ['frn', 'provider_id', 'location_id']:
+        assert pd.api.types.is_integer_dtype(c_df[column]), column
+    assert c_df['block_geoid'].str.len().eq(15).all()
+    assert set(arrow_df['frn']) == {'0012345678'}
+
+    c_h3 = c_df['h3_res8_id']
+    arrow_h3 = arrow_df['h3_res8_id']
+    assert c_h3.isna().tolist() == arrow_h3.isna().tolist()
+    assert arrow_h3.dropna().astype('int64').tolist() == [int(x, 16) for x in c_h3.dropna()]
+
+
+def test_pyarrow_chunks_without_nulls_are_plain_int64(tmp_path):
+    rows = [['1', '130077', 'Brand', i, 40, 100, 10, 1, 'R', 'NY', '360610001000000', HEX_IDS[i % 5]]
+            for i in range(12)]
+    path = tmp_path / 'availability.zip'
+    write_availability_zip(path, rows)
+
+    chunks = list(read_availability_chunks(path, chunk_size=4, engine='pyarrow'))
+
+    assert [len(chunk) for chunk in chunks] == [4, 4, 4]
+    assert all(chunk['h3_res8_id'].dtype == np.int64 for chunk in chunks)
+
+
+def test_unknown_engine(availability_zip):
+    with pytest.raises(ValueError):
+        next(read_availability_chunks(availability_zip, engine='python'))
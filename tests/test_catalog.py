@@ -0,0 +1,94 @@
+import pandas as pd
+import pytest
+
+from guss.connection import DB
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    db = DB(str(tmp_path / 'catalog.db'))
+    assert db.createDB()
+    yield db
+    db.close()
+
+
+def reference_frame(file_ids, state_fips='36'):
+    return pd.DataFrame({'file_id': file_ids, 'file_name': [f"file_{x}" for x in file_ids],
+                         'category': 'Provider', 'state_fips': state_fips, 'provider_id': '130077',
+                         'technology_code': '10,40', 'speed_tier': None})
+
+
+def test_reference_round_trip(catalog):
+    assert not catalog.has_reference('2024-06-30', 'availability')
+
+    assert catalog.insert_reference(reference_frame([1, 2, 3]), '2024-06-30', 'availability', batch_size=2) == 3
+    stored = catalog.query("SELECT file_id, file_name, state_fips, technology_code, speed_tier FROM reference "
+                           "WHERE as_of_date = ? AND data_type = ? ORDER BY file_id", ('2024-06-30', 'availability'))
+
+    assert catalog.has_reference('2024-06-30', 'availability')
+    assert not catalog.has_reference('2024-06-30', 'challenge')
+    assert stored['file_id'].tolist() == [1, 2, 3]
+    assert stored['state_fips'].tolist() == ['36', '36', '36']
+    assert stored['technology_code'].tolist() == ['10,40'] * 3
+    assert stored['speed_tier'].isna().all()
+
+
+def test_reference_listing_replaces_the_vintage(catalog):
+    catalog.insert_reference(reference_frame([1, 2, 3]), '2024-06-30', 'availability')
+    catalog.insert_reference(reference_frame([1, 2, 3]), '2023-12-31', 'availability')
+    catalog.insert_reference(reference_frame([4], state_fips='06'), '2024-06-30', 'availability')
+
+    counts = catalog.query("SELECT as_of_date, COUNT(*) AS n FROM reference GROUP BY as_of_date ORDER BY as_of_date")
+    assert counts.to_dict('records') == [{'as_of_date': '2023-12-31', 'n': 3}, {'as_of_date': '2024-06-30', 'n': 1}]
+
+
+def test_challenge_categories_keep_their_own_rows(catalog):
+    catalog.insert_reference(reference_frame([1, 2]), '2024-06-30', 'challenge', params={'category': 'A'})
+    assert not catalog.has_reference('2024-06-30', 'challenge', params={'category': 'B'})
+    catalog.insert_reference(reference_frame([3]), '2024-06-30', 'challenge', params={'category': 'B'})
+    catalog.insert_reference(reference_frame([4]), '2024-06-30', 'challenge', params={'category': 'B'})
+
+    stored = catalog.query("SELECT listing, file_id FROM reference WHERE data_type = 'challenge' "
+                           "ORDER BY file_id")
+    assert stored['file_id'].tolist() == [1, 2, 4]
+    assert catalog.has_reference('2024-06-30', 'challenge', params={'category': 'A'})
+    assert catalog.has_reference('2024-06-30', 'challenge', params={'category': 'B'})
+    assert not catalog.has_reference('2024-06-30', 'challenge')
+
+
+def test_reference_indexes_serve_file_state_and_provider_lookups(catalog):
+    for column in ('file_id', 'state_fips', 'provider_id'):
+        plan = catalog.query(f"EXPLAIN QUERY PLAN SELECT file_id FROM reference "
+                             f"WHERE as_of_date = ? AND data_type = ? AND {column} = ?",
+                             ('2024-06-30', 'availability', '36'))
+        assert plan['detail'].str.contains(f"{column}=?").any()
+
+
+def test_download_status_round_trip(catalog):
+    catalog.record_download('Availability', 7, None, 'running', file_name='f.zip', as_of_date='2024-06-30')
+    catalog.record_download('availability', 7, None, 'done', bytes_written=10, duration_s=0.5, output_path='f.zip')
+    catalog.record_download('availability', 7, 'GPKG', 'failed', error='HTTP 500')
+
+    raw = catalog.download_status('availability', 7)
+    gpkg = catalog.download_status('availability', 7, 'gpkg')
+    # as_of_date and file_name of the running row survive the update that does not know them
+    assert raw['status'] == 'done' and raw['as_of_date'] == '2024-06-30' and raw['file_name'] == 'f.zip'
+    assert raw['bytes'] == 10 and raw['output_path'] == 'f.zip'
+    assert gpkg['status'] == 'failed' and gpkg['error'] == 'HTTP 500'
+    assert catalog.download_status('availability', 8) is None
+
+    with pytest.raises(ValueError):
+        catalog.record_download('availability', 7, None, 'finished')
+
+
+def test_catalog_reopens_with_its_rows(tmp_path):
+    db = DB(str(tmp_path / 'catalog.db'))
+    db.createDB()
+    db.record_download('challenge', 1, None, 'done', output_path='c.zip')
+    db.close()
+
+    reopened = DB(str(tmp_path / 'catalog.db'))
+    assert reopened.createDB()
+    assert reopened.download_status('challenge', 1)['output_path'] == 'c.zip'
+    assert reopened.query("PRAGMA journal_mode")['journal_mode'][0] == 'wal'
+    reopened.close()
@@ -0,0 +1,126 @@
+import io
+import json
+import signal
+import threading
+
+import pytest
+
+from guss import cli
+from guss.gussErrors import GussExceptions
+
+
+def run_cli(argv, capsys):
+    code = cli.main(argv)
+    events = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.strip()]
+    return code, events
+
+
+@pytest.fixture
+def cli_args(file_server, data_dirs, monkeypatch):
+    # the handlers would stay installed in the test process
+    monkeypatch.setattr(signal, 'signal', lambda *args: None)
+    return ['--username', 'user', '--api-key', 'hash', '--base-url', file_server.base_url]
+
+
+def test_mobile_defaults_ask_for_every_technology_and_both_tiers():
+    args = cli.build_parser().parse_args(['mobile', '--as-of-date', '2024-06-30'])
+    (job_type, params), = cli.jobs_from_args(args)
+
+    assert job_type == 'mobile'
+    assert params['technology_list'] == ['all']
+    assert params['fiveG_speed_tier_list'] == ['35/3', '7/1']
+
+
+def test_unexpected_error_ends_the_job_with_a_summary(cli_args, capsys, monkeypatch, tmp_path):
+    job_file = tmp_path / 'jobs.json'
+    job_file.write_text(json.dumps([{'type': 'challenge', 'as_of_date': '2024-06-30', 'category': 'A'},
+                                    {'type': 'challenge', 'as_of_date': '2024-06-30', 'category': 'B'}]))
+
+    def run_job(guss, job_type, params):
+        if params['category'] == 'A':
+            raise KeyError('file_id')
+        print("downloaded")
+        return ['b.zip']
+    monkeypatch.setattr(cli, 'run_job', run_job)
+
+    code, events = run_cli(cli_args + ['run', str(job_file)], capsys)
+
+    assert code == 1
+    assert [event['event'] for event in events] == ['job_start', 'job_error', 'job_start', 'log', 'job_done']
+    assert events[1]['error'] == "KeyError: 'file_id'"
+    assert events[4]['outputs'] == ['b.zip']
+
+
+def test_guss_error_message_is_kept(cli_args, capsys, monkeypatch):
+    def run_job(guss, job_type, params):
+        raise GussExceptions(message="No state fips list provided")
+    monkeypatch.setattr(cli, 'run_job', run_job)
+
+    code, events = run_cli(cli_args + ['challenge', '--as-of-date', '2024-06-30', '--category', 'A'], capsys)
+
+    assert code == 1
+    assert events[-1]['event'] == 'job_error'
+    assert 'No state fips list provided' in events[-1]['error']
+
+
+def test_bad_job_file_is_a_usage_error(cli_args, tmp_path):
+    job_file = tmp_path / 'jobs.json'
+    job_file.write_text(json.dumps({'type': 'satellite'}))
+
+    with pytest.raises(SystemExit) as exit_info:
+        cli.main(cli_args + ['run', str(job_file)])
+    assert exit_info.value.code == 2
+
+
+def test_concurrent_prints_are_each_one_log_event(capsys):
+    out = io.StringIO()
+    stream = cli.JsonLinesStream(out)
+
+    def worker(number):
+        for line in range(200):
+            stream.write(f"worker {number} ")
+            stream.write(f"line {line}\n")
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stream.flush()
+
+    messages = [json.loads(line)['message'] for line in out.getvalue().splitlines()]
+    assert len(messages) == 8 * 200
+    assert all(message.count('worker') == 1 and message.count('line') == 1 for message in messages)
+
+
+def test_output_dir_is_created_with_its_parents(cli_args, capsys, monkeypatch, tmp_path):
+    monkeypatch.setattr(cli, 'run_job', lambda guss, job_type, params: [])
+    base = tmp_path / 'x' / 'base'
+
+    code, events = run_cli(cli_args + ['--output-dir', str(base), 'challenge', '--as-of-date', '2024-06-30',
+                                       '--category', 'A'], capsys)
+
+    assert code == 0
+    assert events[-1]['event'] == 'job_done'
+    assert (base / 'data' / 'output' / 'csv').is_dir()
+
+
+def test_flush_keeps_the_unfinished_line_of_a_running_thread():
+    out = io.StringIO()
+    stream = cli.JsonLinesStream(out)
+    started, release = threading.Event(), threading.Event()
+
+    def worker():
+        stream.write("half ")
+        started.set()
+        release.wait()
+        stream.write("line\n")
+    thread = threading.Thread(target=worker)
+    thread.start()
+    started.wait()
+    stream.write("main")
+    stream.flush()
+    release.set()
+    thread.join()
+    stream.flush()
+
+    assert [json.loads(line)['message'] for line in out.getvalue().splitlines()] == ['main', 'half line']
@@ -0,0 +1,140 @@
+import json
+import os
+
+import pytest
+
+from guss.gussErrors import GussExceptions
+from tests.conftest import send_body
+
+BODY = bytes(range(256)) * 64  # 16 KiB
+
+
+def range_route(body, cut_first_at=None):
+    """
+    Serves body with Range support, the first reply is cut after cut_first_at bytes.
+    """
+    state = {'calls': 0}
+
+    def route(request):
+        state['calls'] += 1
+        cut_at = cut_first_at if state['calls'] == 1 else None
+        range_header = request.headers.get('Range')
+        if range_header:
+            start = int(range_header.split('=', 1)[1].split('-', 1)[0])
+            send_body(request, body[start:], status=206, cut_at=cut_at,
+                      headers={'Content-Range': f"bytes {start}-{len(body) - 1}/{len(body)}"})
+        else:
+            send_body(request, body, cut_at=cut_at)
+    return route
+
+
+def test_dropped_connection_is_retried_from_part_file(guss, file_server, tmp_path):
+    file_server.routes['/downloadFile/1'] = range_route(BODY, cut_first_at=5000)
+
+    output = guss.download_to_file(str(tmp_path), 'file.zip', url_endpoint='/downloadFile/1')
+
+    with open(output, 'rb') as f:
+        assert f.read() == BODY
+    assert not os.path.exists(f"{output}.part")
+    assert len(file_server.requests) == 2
+    assert 'Range' not in file_server.requests[0][1]
+    assert file_server.requests[1][1]['Range'].startswith('bytes=')
+    assert int(file_server.requests[1][1]['Range'][6:-1]) > 0
+
+
+def test_dropped_connection_gives_up_after_max_attempts(guss, file_server, tmp_path):
+    def route(request):
+        send_body(request, BODY, cut_at=100)
+    file_server.routes['/downloadFile/1'] = route
+
+    with pytest.raises(GussExceptions):
+        guss.download_to_file(str(tmp_path), 'file.zip', url_endpoint='/downloadFile/1')
+    assert len(file_server.requests) == guss.retry_policy.max_attempts
+    assert not os.path.exists(tmp_path / 'file.zip')
+    assert os.path.exists(tmp_path / 'file.zip.part')
+
+
+def write_part_file(directory, name, data):
+    with open(os.path.join(directory, f"{name}.part"), 'wb') as f:
+        f.write(data)
+
+
+def test_part_file_is_resumed_with_range_request(guss, file_server, tmp_path):
+    file_server.routes['/downloadFile/1'] = range_route(BODY)
+    write_part_file(tmp_path, 'file.zip', BODY[:3000])
+
+    output = guss.download_to_file(str(tmp_path), 'file.zip', url_endpoint='/downloadFile/1')
+
+    with open(output, 'rb') as f:
+        assert f.read() == BODY
+    assert [headers.get('Range') for _, headers in file_server.requests] == ['bytes=3000-']
+
+
+def test_full_reply_to_range_request_replaces_part_file(guss, file_server, tmp_path):
+    def route(request):
+        send_body(request, BODY)
+    file_server.routes['/downloadFile/1'] = route
+    write_part_file(tmp_path, 'file.zip', b'stale' * 100)
+
+    output = guss.download_to_file(str(tmp_path), 'file.zip', url_endpoint='/downloadFile/1')
+
+    with open(output, 'rb') as f:
+        assert f.read() == BODY
+    assert len(file_server.requests) == 1
+
+
+def test_mismatched_content_range_is_not_saved_as_the_file(guss, file_server, tmp_path):
+    def route(request):
+        if request.headers.get('Range'):
+            # ignores the asked offset and sends another range
+            send_body(request, BODY[1000:2000], status=206,
+                      headers={'Content-Range': f"bytes 1000-1999/{len(BODY)}"})
+        else:
+            send_body(request, BODY)
+    file_server.routes['/downloadFile/1'] = route
+    write_part_file(tmp_path, 'file.zip', BODY[:3000])
+
+    output = guss.download_to_file(str(tmp_path), 'file.zip', url_endpoint='/downloadFile/1')
+
+    with open(output, 'rb') as f:
+        assert f.read() == BODY
+    assert [headers.get('Range') for _, headers in file_server.requests] == ['bytes=3000-', None]
+
+
+def test_partial_body_without_range_request_fails(guss, file_server, tmp_path):
+    def route(request):
+        send_body(request, BODY[:1000], status=206, headers={'Content-Range': f"bytes 0-999/{len(BODY)}"})
+    file_server.routes['/downloadFile/1'] = route
+
+    with pytest.raises(GussExceptions):
+        guss.download_to_file(str(tmp_path), 'file.zip', url_endpoint='/downloadFile/1')
+    assert not os.path.exists(tmp_path / 'file.zip')
+
+
+LISTING_ENDPOINT = '/api/public/map/downloads/listAvailabilityData/2024-06-30'
+LISTING_BODY = json.dumps({'data': [{'file_id': i, 'state_fips': '36', 'provider_id': '130077'}
+                                    for i in range(200)]}).encode()
+
+
+def test_listing_body_cut_partway_is_retried(guss, file_server):
+    state = {'calls': 0}
+
+    def route(request):
+        state['calls'] += 1
+        send_body(request, LISTING_BODY, cut_at=len(LISTING_BODY) // 2 if state['calls'] == 1 else None)
+    file_server.routes[LISTING_ENDPOINT] = route
+
+    reference_df = guss.get_download_reference(as_of_date='2024-06-30')
+
+    assert len(file_server.requests) == 2
+    assert list(reference_df['file_id']) == list(range(200))
+
+
+def test_listing_body_cut_every_time_raises_guss_exception(guss, file_server):
+    def route(request):
+        send_body(request, LISTING_BODY, cut_at=len(LISTING_BODY) // 2)
+    file_server.routes[LISTING_ENDPOINT] = route
+
+    with pytest.raises(GussExceptions):
+        guss.get_download_reference(as_of_date='2024-06-30')
+    assert len(file_server.requests) == guss.retry_policy.max_attempts
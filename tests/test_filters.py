@@ -0,0 +1,201 @@
+import itertools
+import re
+
+import pandas as pd
+import pytest
+
+import bin.download_fixed_coverage as fixed_module
+import bin.download_mb_coverage as mobile_module
+from guss.GUSS import set_reference_dtypes
+from guss.gussErrors import GussExceptions
+from guss.reference_index import ReferenceIndex
+
+PROVIDERS = ['130077', '130235', '131425']
+STATES = ['06', '36']
+TIERS = ['35/3', '7/1']
+
+
+def mobile_reference():
+    rows = []
+    for provider, state in itertools.product(PROVIDERS, STATES):
+        for subcategory in ('Hexagon Coverage', 'Raw Coverage'):
+            for technology_code, speed_tier in (('300', None), ('400', None), ('500', '35/3'), ('500', '7/1')):
+                rows.append({'category': 'Provider', 'subcategory': subcategory, 'file_type': 'gis',
+                             'technology_type': 'Mobile Broadband', 'provider_id': provider, 'state_fips': state,
+                             'technology_code': technology_code, 'speed_tier': speed_tier})
+            rows.append({'category': 'Provider', 'subcategory': subcategory, 'file_type': 'gis',
+                         'technology_type': 'Mobile Voice', 'provider_id': provider, 'state_fips': state,
+                         'technology_code': '999', 'speed_tier': None})
+    return finish(rows)
+
+
+def fixed_reference():
+    rows = []
+    codes = ['0', '10', '40', '50', '70', '71', '72', '10,40', '40,50,70']
+    for provider, state, technology_code in itertools.product(PROVIDERS, STATES, codes):
+        rows.append({'category': 'Provider', 'subcategory': 'Location Coverage', 'file_type': 'csv',
+                     'technology_type': 'Fixed Broadband', 'provider_id': provider, 'state_fips': state,
+                     'technology_code': technology_code, 'speed_tier': None})
+    return finish(rows)
+
+
+def finish(rows):
+    df = pd.DataFrame(rows)
+    df.insert(0, 'file_id', range(1, len(df) + 1))
+    df['file_name'] = 'file_' + df['file_id'].astype(str)
+    return df
+
+
+class FakeGuss:
+    category_subcategory = {'Provider': {1: 'Location Coverage', 2: 'Hexagon Coverage'}}
+    technology_type = {1: 'Fixed Broadband', 2: 'Mobile Broadband', 3: 'Mobile Voice'}
+    connection_stats = {'opened': 0, 'reused': 0}
+    stop = None
+
+    def __init__(self, reference_df):
+        self.reference_df = set_reference_dtypes(reference_df.copy())
+
+    def get_download_reference(self, as_of_date=None, refresh=False):
+        return self.reference_df
+
+    def reference_index(self, reference_df):
+        return ReferenceIndex(reference_df)
+
+
+@pytest.fixture
+def planned_file_ids(monkeypatch):
+    # the file ids the dealers hand to the download executor, nothing is downloaded
+    planned = []
+
+    def plan_jobs(guss, name, jobs, **kwargs):
+        planned[:] = [int(job['file_id']) for job in jobs]
+        return []
+
+    monkeypatch.setattr(mobile_module, 'download_jobs', plan_jobs)
+    monkeypatch.setattr(fixed_module, 'download_jobs', plan_jobs)
+    return planned
+
+
+def run_mobile(reference_df, planned, providers, states, technologies, tiers, technology_type='Mobile Broadband'):
+    mobile_module.MobileCoverageDealer(
+        run=True, guss_instance=FakeGuss(reference_df), as_of_date='2024-06-30', provider_id_list=providers,
+        state_fips_list=states, technology_list=technologies, technology_type=technology_type,
+        subcategory='Hexagon Coverage', fiveG_speed_tier_list=tiers, data_type='availability', gis_type='shp',
+        resume=False).download()
+    return set(planned)
+
+
+def run_fixed(reference_df, planned, providers, states, technologies):
+    fixed_module.FixedCoverageDealer(
+        run=True, guss_instance=FakeGuss(reference_df), as_of_date='2024-06-30', provider_id_list=providers,
+        state_fips_list=states, technology_list=technologies, data_type='availability', polygonize=False,
+        resume=False).download()
+    return set(planned)
+
+
+def baseline_mobile_file_ids(reference_df, providers, states, technologies, tiers, technology_type):
+    # the pandas query the mobile dealer built before the ReferenceFilter, for the cases it supported
+    df = reference_df[(reference_df['category'] == 'Provider') & (reference_df['subcategory'] == 'Hexagon Coverage')
+                      & (reference_df['technology_type'] == technology_type) & (reference_df['file_type'] == 'gis')]
+    provider_query = ' or '.join(f"provider_id == '{x}'" for x in providers)
+    state_query = ' or '.join(f"state_fips == '{x}'" for x in states)
+    technology_query = ' or '.join(f"technology_code == '{x}'" for x in technologies)
+    if (400 in technologies) and (300 in technologies) and not (500 in technologies):
+        tier_query = ['speed_tier.isna()']
+    elif ((400 in technologies or 300 in technologies) and 500 in technologies) if len(tiers) == 2 \
+            else (400 in technologies or 300 in technologies or 500 in technologies):
+        tier_query = ['speed_tier.isna()'] + [f"speed_tier == '{x}'" for x in tiers]
+    else:
+        tier_query = [f"speed_tier == '{x}'" for x in tiers]
+    clauses = [] if providers == ['all'] else [provider_query]
+    clauses += [] if states == ['all'] else [state_query]
+    clauses.append(technology_query)
+    if '999' not in technologies:
+        clauses.append(' or '.join(tier_query))
+    query = ' and '.join(f"({clause})" for clause in clauses)
+    return set(df.query(query, engine='python')['file_id'])
+
+
+MOBILE_TECHNOLOGIES = [[300], [400], [500], [300, 400], [300, 500], [400, 500], [300, 400, 500]]
+MOBILE_TIERS = [['35/3'], ['7/1'], ['35/3', '7/1']]
+SELECTIONS = [['all'], ['130077'], ['130077', '131425']]
+STATE_SELECTIONS = [['all'], ['36'], ['06', '36']]
+
+
+@pytest.mark.parametrize('technologies', MOBILE_TECHNOLOGIES)
+@pytest.mark.parametrize('tiers', MOBILE_TIERS)
+@pytest.mark.parametrize('providers', SELECTIONS)
+@pytest.mark.parametrize('states', STATE_SELECTIONS)
+def test_mobile_filter_matches_baseline_query(planned_file_ids, technologies, tiers, providers, states):
+    reference_df = mobile_reference()
+    expected = baseline_mobile_file_ids(reference_df, providers, states, technologies, tiers, 'Mobile Broadband')
+    if not expected:
+        with pytest.raises(GussExceptions):
+            run_mobile(reference_df, planned_file_ids, providers, states, technologies, tiers)
+    else:
+        assert run_mobile(reference_df, planned_file_ids, providers, states, technologies, tiers) == expected
+
+
+@pytest.mark.parametrize('providers', SELECTIONS)
+def test_mobile_voice_matches_baseline_query(planned_file_ids, providers):
+    reference_df = mobile_reference()
+    expected = baseline_mobile_file_ids(reference_df, providers, ['36'], ['999'], TIERS, 'Mobile Voice')
+    assert run_mobile(reference_df, planned_file_ids, providers, ['36'], [500], TIERS,
+                      technology_type='Mobile Voice') == expected
+
+
+@pytest.mark.parametrize('tiers', MOBILE_TIERS)
+def test_mobile_all_technologies_keeps_files_without_speed_tier(planned_file_ids, tiers):
+    reference_df = mobile_reference()
+    hexagons = reference_df[(reference_df['subcategory'] == 'Hexagon Coverage')
+                            & (reference_df['technology_type'] == 'Mobile Broadband')
+                            & (reference_df['state_fips'] == '36')]
+    expected = set(hexagons.loc[hexagons['speed_tier'].isna() | hexagons['speed_tier'].isin(tiers), 'file_id'])
+
+    selected = run_mobile(reference_df, planned_file_ids, ['all'], ['36'], ['all'], tiers)
+
+    assert selected == expected
+    assert {'300', '400', '500'} <= set(reference_df.set_index('file_id').loc[sorted(selected), 'technology_code'])
+
+
+def token_file_ids(reference_df, providers, states, technologies):
+    wanted = {str(x) for x in technologies}
+    selected = set()
+    for row in reference_df.itertuples():
+        if providers != ['all'] and row.provider_id not in providers:
+            continue
+        if states != ['all'] and row.state_fips not in states:
+            continue
+        if technologies != ['all'] and wanted.isdisjoint(row.technology_code.split(',')):
+            continue
+        selected.add(row.file_id)
+    return selected
+
+
+FIXED_TECHNOLOGIES = [[0], [10], [40], [70], [10, 40], [0, 50], [70, 71, 72], ['all']]
+
+
+@pytest.mark.parametrize('technologies', FIXED_TECHNOLOGIES)
+@pytest.mark.parametrize('providers', SELECTIONS)
+@pytest.mark.parametrize('states', STATE_SELECTIONS)
+def test_fixed_filter_matches_whole_technology_codes(planned_file_ids, technologies, providers, states):
+    reference_df = fixed_reference()
+    expected = token_file_ids(reference_df, providers, states, technologies)
+    assert run_fixed(reference_df, planned_file_ids, providers, states, technologies) == expected
+
+
+@pytest.mark.parametrize('technologies', [[10, 40], [0, 50], [70, 71, 72], [40, 70]])
+def test_fixed_multi_code_filter_matches_baseline_regex(planned_file_ids, technologies):
+    reference_df = fixed_reference()
+    pattern = fr"\b(?:{'|'.join(str(x) for x in technologies)})\b"
+    expected = set(reference_df.loc[reference_df['technology_code'].str.contains(pattern, flags=re.IGNORECASE,
+                                                                                  regex=True), 'file_id'])
+    assert run_fixed(reference_df, planned_file_ids, ['all'], ['all'], technologies) == expected
+
+
+def test_fixed_single_code_no_longer_matches_as_substring(planned_file_ids):
+    reference_df = fixed_reference()
+    selected = run_fixed(reference_df, planned_file_ids, ['all'], ['all'], [0])
+    codes = set(reference_df.set_index('file_id').loc[sorted(selected), 'technology_code'])
+    # the old single code filter was str.contains('0'), which also picked 10, 40, 50 and 70
+    assert codes == {'0'}
@@ -0,0 +1,68 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import h3
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+
+from guss.geometry import H3BoundaryCache, h3_polygons, h3_to_int64
+
+HEX_A = '882a1340a9fffff'
+HEX_B = '882a1340a1fffff'
+
+
+@pytest.mark.parametrize('missing', [None, np.nan])
+def test_h3_polygons_missing_hex_ids(missing):
+    polygons = h3_polygons([HEX_A, missing, HEX_B, HEX_A])
+    expected = h3_polygons([HEX_A, HEX_B])
+
+    assert polygons[1] is None
+    assert shapely.equals(polygons[0], expected[0])
+    assert shapely.equals(polygons[2], expected[1])
+    assert shapely.equals(polygons[3], expected[0])
+
+
+@pytest.mark.parametrize('cache', [None, H3BoundaryCache()])
+def test_h3_polygons_nullable_int64(cache):
+    ids = pd.Series(list(h3_to_int64([HEX_A, HEX_B])) + [pd.NA], dtype='Int64')
+    polygons = h3_polygons(ids, cache=cache)
+    expected = h3_polygons([HEX_A, HEX_B])
+
+    assert polygons[2] is None
+    assert shapely.equals(polygons[0], expected[0])
+    assert shapely.equals(polygons[1], expected[1])
+
+
+def test_h3_polygons_only_missing():
+    assert list(h3_polygons([None, None])) == [None, None]
+
+
+def test_boundary_cache_entries_own_their_memory():
+    cache = H3BoundaryCache()
+    h3_polygons([HEX_A, HEX_B], cache=cache)
+
+    for boundary in cache._boundaries.values():
+        assert boundary.base is None
+    assert cache.size_bytes == sum(boundary.nbytes + cache.ENTRY_OVERHEAD for boundary in cache._boundaries.values())
+
+
+def test_boundary_cache_hits_match_computed_polygons():
+    cache = H3BoundaryCache(max_bytes=1)
+    first = h3_polygons([HEX_A, HEX_B], cache=cache)
+    second = h3_polygons([HEX_B, HEX_A], cache=cache)
+
+    assert cache.evictions > 0
+    assert shapely.equals(first[0], second[1]) and shapely.equals(first[1], second[0])
+
+
+def test_h3_polygons_process_pool_matches_serial():
+    cells = list(h3.grid_disk(HEX_A, 6)) + [HEX_A, None]
+    serial = h3_polygons(cells)
+
+    with ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context('spawn')) as executor:
+        pooled = h3_polygons(cells, executor=executor, chunk_size=16)
+
+    assert pooled[-1] is None
+    assert shapely.equals(pooled[:-1], serial[:-1]).all()
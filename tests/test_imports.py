@@ -0,0 +1,14 @@
+import os
+
+import pytest
+
+from tests.import_benchmark import HEAVY_MODULES, import_time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('module', ['guss', 'guss.cli'])
+def test_entry_points_do_not_load_heavy_modules(module):
+    # a fresh interpreter, the test process already has every stack loaded
+    _, heavy = import_time(module, repeat=1, cwd=ROOT)
+    assert heavy == '', f"importing {module} loaded {heavy}, expected none of {HEAVY_MODULES}"
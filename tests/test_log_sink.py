@@ -0,0 +1,130 @@
+import os
+import threading
+
+import pytest
+
+from gui.log_buffer import LogBuffer
+
+
+def log_lines(path):
+    # the file lines carry a timestamp before the message
+    return [line.split(' ', 2)[2] for line in path.read_text(encoding='utf-8').splitlines()]
+
+
+def test_take_returns_everything_written_in_order():
+    buffer = LogBuffer()
+    buffer.write('a')
+    buffer.write('b\n')
+    buffer.write(42)
+
+    assert buffer.take() == 'ab\n42'
+    assert buffer.take() == ''
+    assert buffer.empty()
+
+
+def test_take_stops_at_max_batch(monkeypatch):
+    monkeypatch.setattr(LogBuffer, 'MAX_BATCH', 3)
+    buffer = LogBuffer()
+    for i in range(7):
+        buffer.write(str(i))
+
+    assert [buffer.take(), buffer.take(), buffer.take(), buffer.take()] == ['012', '345', '6', '']
+
+
+def test_writes_from_threads_are_all_taken():
+    buffer = LogBuffer()
+
+    def worker(n):
+        for i in range(500):
+            buffer.write(f"{n}-{i}\n")
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    text = ''
+    while not buffer.empty():
+        text += buffer.take()
+    assert sorted(text.splitlines()) == sorted(f"{n}-{i}" for n in range(4) for i in range(500))
+
+
+def test_file_gets_whole_lines_across_writes(tmp_path):
+    path = tmp_path / 'logs' / 'guss.log'
+    buffer = LogBuffer(path)
+    buffer.write('Downloading ')
+    buffer.take()
+    assert path.read_text(encoding='utf-8') == ''
+
+    buffer.write('file 1\n\nDownloading file 2')
+    buffer.take()
+    assert log_lines(path) == ['Downloading file 1']
+
+    # the unfinished last line is written on close
+    buffer.close()
+    assert log_lines(path) == ['Downloading file 1', 'Downloading file 2']
+
+
+def test_log_file_rotates(tmp_path):
+    path = tmp_path / 'guss.log'
+    buffer = LogBuffer(path, max_bytes=200, backup_count=2)
+    for i in range(50):
+        buffer.write(f"line {i:03d}\n")
+        buffer.take()
+    buffer.close()
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['guss.log', 'guss.log.1', 'guss.log.2']
+    assert all(p.stat().st_size <= 200 for p in tmp_path.iterdir())
+    assert log_lines(path)[-1] == 'line 049'
+
+
+def test_without_log_path_no_file_is_written(tmp_path):
+    buffer = LogBuffer()
+    buffer.write('text\n')
+    assert buffer.take() == 'text\n'
+    buffer.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.fixture
+def text_browser():
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    pytest.importorskip('PyQt5')
+    from PyQt5.QtWidgets import QApplication, QTextBrowser
+
+    app = QApplication.instance() or QApplication([])
+    browser = QTextBrowser()
+    yield browser
+    browser.deleteLater()
+    app.processEvents()
+
+
+def test_log_sink_write_drain_close(text_browser, tmp_path):
+    from gui.log_sink import LogSink
+
+    path = tmp_path / 'guss.log'
+    sink = LogSink(text_browser, log_path=path, interval_ms=60_000)
+    print('first line', file=sink)
+    sink.write('second ')
+    sink.drain()
+    assert text_browser.toPlainText() == 'first line\nsecond '
+
+    sink.write('line')
+    sink.close()
+    assert not sink.timer.isActive()
+    assert text_browser.toPlainText() == 'first line\nsecond line'
+    assert log_lines(path) == ['first line', 'second line']
+
+
+def test_log_sink_keeps_max_lines(text_browser):
+    from gui.log_sink import LogSink
+
+    sink = LogSink(text_browser, max_lines=10, interval_ms=60_000)
+    for i in range(25):
+        sink.write(f"line {i}\n")
+    sink.close()
+
+    lines = text_browser.toPlainText().splitlines()
+    assert text_browser.document().blockCount() <= 10
+    assert lines[-1] == 'line 24'
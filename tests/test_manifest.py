@@ -0,0 +1,130 @@
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import guss.manifest as manifest_module
+from guss.gussErrors import GussExceptions
+from tests.conftest import send_body
+from tests.test_download import range_route
+
+BODY = b'availability,csv\n' * 500
+ENDPOINT = '/api/public/map/downloads/downloadFile/availability/{}'
+
+
+def serve_files(file_server, count):
+    def route(request):
+        send_body(request, BODY)
+    for file_id in range(1, count + 1):
+        file_server.routes[ENDPOINT.format(file_id)] = route
+
+
+def test_verified_file_is_not_downloaded_again(guss, file_server):
+    serve_files(file_server, 1)
+
+    first = guss.download_file('availability', 1, 'file_1.zip', None, as_of_date='2024-06-30')
+    second = guss.download_file('availability', 1, 'file_1.zip', None, as_of_date='2024-06-30')
+
+    assert first == second
+    assert len(file_server.requests) == 1
+    row = guss.catalog.download_status('availability', 1)
+    assert row['status'] == 'done' and row['bytes'] == len(BODY) and row['sha256']
+
+
+@pytest.fixture
+def hashed_from_disk(monkeypatch):
+    # paths read back from disk to be hashed
+    paths = []
+
+    def file_sha256(path, chunk_size=1024 * 1024):
+        paths.append(path)
+        return original(path, chunk_size)
+    original = manifest_module.file_sha256
+    monkeypatch.setattr(manifest_module, 'file_sha256', file_sha256)
+    return paths
+
+
+def test_streamed_file_is_hashed_while_written(guss, file_server, hashed_from_disk):
+    serve_files(file_server, 1)
+
+    guss.download_file('availability', 1, 'file_1.zip', None)
+
+    assert hashed_from_disk == []
+    assert guss.catalog.download_status('availability', 1)['sha256'] == hashlib.sha256(BODY).hexdigest()
+
+
+def test_resumed_file_is_hashed_from_disk(guss, file_server, data_dirs, hashed_from_disk):
+    file_server.routes[ENDPOINT.format(1)] = range_route(BODY)
+    with open(os.path.join(data_dirs['CSV_OUTPUT'], 'file_1.zip.part'), 'wb') as f:
+        f.write(BODY[:1000])
+
+    path = guss.download_file('availability', 1, 'file_1.zip', None)
+
+    assert file_server.requests[0][1]['Range'] == 'bytes=1000-'
+    assert hashed_from_disk == [path]
+    assert guss.catalog.download_status('availability', 1)['sha256'] == hashlib.sha256(BODY).hexdigest()
+
+
+def test_touched_file_is_rehashed_and_kept(guss, file_server):
+    serve_files(file_server, 1)
+    path = guss.download_file('availability', 1, 'file_1.zip', None)
+    later = time.time() + 10
+    os.utime(path, (later, later))
+
+    assert guss.download_file('availability', 1, 'file_1.zip', None) == path
+    assert len(file_server.requests) == 1
+    assert guss.catalog.download_status('availability', 1)['mtime_ns'] == os.stat(path).st_mtime_ns
+
+
+def test_changed_or_missing_file_is_downloaded_again(guss, file_server):
+    serve_files(file_server, 1)
+    path = guss.download_file('availability', 1, 'file_1.zip', None)
+
+    with open(path, 'r+b') as f:
+        f.write(b'X')
+    guss.download_file('availability', 1, 'file_1.zip', None)
+    os.remove(path)
+    guss.download_file('availability', 1, 'file_1.zip', None)
+    guss.download_file('availability', 1, 'file_1.zip', None, force=True)
+
+    assert len(file_server.requests) == 4
+    with open(path, 'rb') as f:
+        assert f.read() == BODY
+
+
+def test_manifest_is_created_once_across_threads(guss):
+    barrier = threading.Barrier(8)
+
+    def get_manifest(_):
+        barrier.wait()
+        return guss.download_manifest
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        manifests = list(executor.map(get_manifest, range(8)))
+
+    assert all(manifest is manifests[0] for manifest in manifests)
+    assert all(manifest.catalog is guss.catalog for manifest in manifests)
+
+
+@pytest.mark.parametrize('file_name, gis_type', [('file_1.zip', 'kml'), ('', None)])
+def test_file_that_cannot_be_saved_fails_before_its_row_is_written(guss, file_server, file_name, gis_type):
+    serve_files(file_server, 1)
+
+    with pytest.raises(GussExceptions):
+        guss.download_file('availability', 1, file_name, gis_type)
+
+    assert file_server.requests == []
+    assert guss.catalog.download_status('availability', 1, gis_type) is None
+
+
+def test_download_saving_no_file_is_recorded_as_failed(guss, file_server, monkeypatch):
+    serve_files(file_server, 1)
+    monkeypatch.setattr(guss, 'get_request', lambda **kwargs: None)
+
+    with pytest.raises(GussExceptions):
+        guss.download_file('availability', 1, 'file_1.zip', None)
+
+    assert guss.catalog.download_status('availability', 1)['status'] == 'failed'
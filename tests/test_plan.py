@@ -0,0 +1,129 @@
+import os
+
+import pytest
+
+from guss import GUSS
+from guss.downloader import DownloadExecutor, download_jobs
+from guss.gussErrors import GussExceptions
+from guss.plan import JobPlan
+from tests.conftest import send_body
+
+ENDPOINT = '/api/public/map/downloads/downloadFile/availability/{}'
+
+
+def jobs_for(file_ids):
+    return [{'data_type': 'availability', 'file_id': file_id, 'file_name': f"file_{file_id}.zip", 'gis_type': None,
+             'as_of_date': '2024-06-30'} for file_id in file_ids]
+
+
+def test_plan_round_trip(guss, tmp_path):
+    jobs = jobs_for([1, 2, 3])
+    plan = JobPlan(guss.catalog, 'fixed', jobs, as_of_date='2024-06-30')
+
+    assert [seq for seq, _ in plan.pending()] == [0, 1, 2]
+    assert [job for _, job in plan.pending()] == jobs
+    saved = tmp_path / 'file_2.zip'
+    saved.write_bytes(b'file 2')
+    plan.complete(1, str(saved))
+
+    again = JobPlan(guss.catalog, 'fixed', jobs, as_of_date='2024-06-30')
+    assert again.plan_id == plan.plan_id
+    assert [seq for seq, _ in again.pending()] == [0, 2]
+    assert again.outputs() == [str(saved)]
+    # another query is another plan
+    assert JobPlan(guss.catalog, 'fixed', jobs_for([1, 2]), as_of_date='2024-06-30').plan_id != plan.plan_id
+
+
+def test_finished_plan_starts_over(guss):
+    jobs = jobs_for([1, 2])
+    plan = JobPlan(guss.catalog, 'mobile', jobs)
+    plan.complete(0, 'a.zip')
+    plan.complete(1, 'b.zip')
+
+    assert JobPlan(guss.catalog, 'mobile', jobs).pending() == list(enumerate(jobs))
+
+
+def test_interrupted_run_resumes_with_the_unfinished_files(guss, file_server):
+    failing = {3}
+
+    def route_for(file_id):
+        def route(request):
+            if file_id in failing:
+                send_body(request, b'', status=404)
+            else:
+                send_body(request, f"file {file_id}".encode())
+        return route
+    for file_id in range(1, 6):
+        file_server.routes[ENDPOINT.format(file_id)] = route_for(file_id)
+    jobs = jobs_for(range(1, 6))
+
+    with pytest.raises(GussExceptions):
+        DownloadExecutor(guss, max_workers=1).download(jobs, plan=JobPlan(guss.catalog, 'fixed', jobs))
+    # one worker: files 1 and 2 finish, file 3 fails and nothing after it starts
+    assert [path for path, _ in file_server.requests] == [ENDPOINT.format(x) for x in (1, 2, 3)]
+
+    failing.clear()
+    file_server.requests.clear()
+    outputs = DownloadExecutor(guss, max_workers=2).download(jobs, plan=JobPlan(guss.catalog, 'fixed', jobs))
+
+    assert {path for path, _ in file_server.requests} == {ENDPOINT.format(x) for x in (3, 4, 5)}
+    assert [path.rsplit('/', 1)[-1] for path in outputs] == [f"file_{x}.zip" for x in range(1, 6)]
+
+
+def test_done_file_missing_from_disk_is_downloaded_again(guss, file_server):
+    failing = {2}
+
+    def route_for(file_id):
+        def route(request):
+            if file_id in failing:
+                send_body(request, b'', status=404)
+            else:
+                send_body(request, f"file {file_id}".encode())
+        return route
+    for file_id in (1, 2, 3):
+        file_server.routes[ENDPOINT.format(file_id)] = route_for(file_id)
+    jobs = jobs_for([1, 2, 3])
+
+    with pytest.raises(GussExceptions):
+        DownloadExecutor(guss, max_workers=1).download(jobs, plan=JobPlan(guss.catalog, 'fixed', jobs))
+    plan = JobPlan(guss.catalog, 'fixed', jobs)
+    saved, = plan.outputs()
+    # removed between the runs, the plan still holds it as done
+    os.remove(saved)
+    assert plan.outputs() == []
+    assert [seq for seq, _ in plan.pending()] == [0, 1, 2]
+
+    failing.clear()
+    file_server.requests.clear()
+    outputs = DownloadExecutor(guss, max_workers=1).download(jobs, plan=plan)
+
+    assert [path for path, _ in file_server.requests] == [ENDPOINT.format(x) for x in (1, 2, 3)]
+    assert outputs[0] == saved and all(os.path.exists(path) for path in outputs)
+
+
+def test_plan_is_tied_to_the_output_folder(guss, tmp_path):
+    jobs = jobs_for([1, 2])
+    plan = JobPlan(guss.catalog, 'fixed', jobs, output_dir=tmp_path / 'a')
+    plan.complete(0, str(tmp_path / 'a' / 'file_1.zip'))
+
+    assert JobPlan(guss.catalog, 'fixed', jobs, output_dir=tmp_path / 'a').plan_id == plan.plan_id
+    moved = JobPlan(guss.catalog, 'fixed', jobs, output_dir=tmp_path / 'b')
+    assert moved.plan_id != plan.plan_id
+    assert moved.pending() == list(enumerate(jobs)) and moved.outputs() == []
+
+
+def test_download_jobs_in_a_new_folder_does_not_resume_the_old_plan(guss, file_server, tmp_path, monkeypatch):
+    for file_id in (1, 2):
+        file_server.routes[ENDPOINT.format(file_id)] = lambda request, x=file_id: send_body(request, f"{x}".encode())
+    jobs = jobs_for([1, 2])
+    # a run into the first folder died after file 1
+    JobPlan(guss.catalog, 'fixed', jobs, output_dir=GUSS.DATA_OUTPUT).complete(0, str(GUSS.CSV_OUTPUT / 'file_1.zip'))
+
+    (tmp_path / 'moved').mkdir()
+    dirs = GUSS.create_initial_directories(tmp_path / 'moved')
+    for name, path in zip(['BASE_DIR', 'DATA_DIR', 'DATA_INPUT', 'DATA_OUTPUT', 'CSV_OUTPUT'], dirs):
+        monkeypatch.setattr(GUSS, name, path)
+    outputs = download_jobs(guss, 'fixed', jobs, max_workers=1, as_of_date='2024-06-30')
+
+    assert outputs == [str(dirs[4] / 'file_1.zip'), str(dirs[4] / 'file_2.zip')]
+    assert len(file_server.requests) == 2
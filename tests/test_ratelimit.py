@@ -0,0 +1,35 @@
+from tests.conftest import send_body
+
+
+def test_rate_recovers_only_on_successful_replies(guss, file_server):
+    replies = iter([503, 503, 200])
+
+    def route(request):
+        status = next(replies)
+        send_body(request, b'{}' if status == 200 else b'', status=status)
+    file_server.routes['/downloadFile/1'] = route
+
+    bucket = guss.rate_limiters['download']
+    bucket.rate = bucket.max_rate / 4
+    throttled_rate = bucket.rate
+
+    response = guss.api_request(url_endpoint='/downloadFile/1')
+
+    assert response.status_code == 200
+    assert len(file_server.requests) == 3
+    assert bucket.rate == throttled_rate + bucket.recovery_step
+
+
+def test_429_halves_the_rate(guss, file_server):
+    replies = iter([429, 200])
+
+    def route(request):
+        status = next(replies)
+        send_body(request, b'{}' if status == 200 else b'', status=status)
+    file_server.routes['/downloadFile/1'] = route
+
+    bucket = guss.rate_limiters['download']
+    guss.api_request(url_endpoint='/downloadFile/1')
+
+    assert bucket.throttled == 1
+    assert bucket.rate == bucket.max_rate / 2 + bucket.recovery_step
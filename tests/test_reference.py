@@ -0,0 +1,61 @@
+import json
+
+from tests.conftest import send_body
+
+AS_OF_DATE = '2024-06-30'
+CHALLENGE_ENDPOINT = f'/api/public/map/downloads/listChallengeData/{AS_OF_DATE}'
+AVAILABILITY_ENDPOINT = f'/api/public/map/downloads/listAvailabilityData/{AS_OF_DATE}'
+
+
+def listing_route(rows):
+    def route(request):
+        send_body(request, json.dumps({'data': rows}).encode(), headers={'Content-Type': 'application/json'})
+    return route
+
+
+def test_challenge_params_are_not_sent_with_later_requests(guss, file_server):
+    file_server.routes[CHALLENGE_ENDPOINT] = listing_route(
+        [{'file_id': 1, 'category': 'Fixed Challenge - Resolved', 'state_fips': '36', 'state_name': 'New York'}])
+    file_server.routes[AVAILABILITY_ENDPOINT] = listing_route(
+        [{'file_id': 2, 'category': 'Provider', 'state_fips': '36', 'provider_id': '130077'}])
+
+    guss.list_challenge_data(as_of_date=AS_OF_DATE, file_name='challenge.csv',
+                             params={'category': 'Fixed Challenge - Resolved'})
+    reference_df = guss.get_download_reference(as_of_date=AS_OF_DATE)
+
+    paths = [path for path, _ in file_server.requests]
+    assert paths == [f"{CHALLENGE_ENDPOINT}?category=Fixed+Challenge+-+Resolved", AVAILABILITY_ENDPOINT]
+    assert list(reference_df['file_id']) == [2]
+
+
+def test_reference_cache_key_holds_only_the_listing_params(guss, file_server):
+    file_server.routes[CHALLENGE_ENDPOINT] = listing_route([{'file_id': 1, 'state_fips': '36'}])
+    file_server.routes[AVAILABILITY_ENDPOINT] = listing_route([{'file_id': 2, 'state_fips': '36'}])
+
+    guss.list_challenge_data(as_of_date=AS_OF_DATE, file_name='challenge.csv', params={'category': 'A'})
+    guss.get_download_reference(as_of_date=AS_OF_DATE)
+    guss.list_challenge_data(as_of_date=AS_OF_DATE, file_name='challenge.csv', params={'category': 'A'})
+    guss.get_download_reference(as_of_date=AS_OF_DATE)
+
+    # the second round comes from the cache
+    assert len(file_server.requests) == 2
+    assert guss.reference_cache.load(endpoint=AVAILABILITY_ENDPOINT, as_of_date=AS_OF_DATE, params=None) is not None
+
+
+def test_challenge_categories_are_all_kept_in_the_catalog(guss, file_server):
+    def route(request):
+        category = 'A' if 'category=A' in request.path else 'B'
+        rows = [{'file_id': 1 if category == 'A' else 2, 'category': category, 'state_fips': '36'}]
+        send_body(request, json.dumps({'data': rows}).encode(), headers={'Content-Type': 'application/json'})
+    file_server.routes[CHALLENGE_ENDPOINT] = route
+
+    guss.list_challenge_data(as_of_date=AS_OF_DATE, file_name='challenge.csv', params={'category': 'A'})
+    guss.list_challenge_data(as_of_date=AS_OF_DATE, file_name='challenge.csv', params={'category': 'B'})
+    # a category loaded from the cache is recorded when the catalog does not hold it
+    guss.catalog.conn.execute("DELETE FROM reference WHERE category = 'A'")
+    guss.list_challenge_data(as_of_date=AS_OF_DATE, file_name='challenge.csv', params={'category': 'A'})
+
+    stored = guss.catalog.query("SELECT category, file_id FROM reference WHERE data_type = 'challenge' "
+                                "ORDER BY file_id")
+    assert stored.to_dict('records') == [{'category': 'A', 'file_id': 1}, {'category': 'B', 'file_id': 2}]
+    assert len(file_server.requests) == 2
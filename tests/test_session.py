@@ -0,0 +1,28 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def test_session_created_once_across_threads(guss, monkeypatch):
+    create_session = guss._create_session
+    created = []
+
+    def slow_create_session():
+        # widen the window between the None check and the assignment
+        time.sleep(0.05)
+        session = create_session()
+        created.append(session)
+        return session
+    monkeypatch.setattr(guss, '_create_session', slow_create_session)
+
+    barrier = threading.Barrier(8)
+
+    def get_session(_):
+        barrier.wait()
+        return guss.session
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        sessions = list(executor.map(get_session, range(8)))
+
+    assert len(created) == 1
+    assert all(session is created[0] for session in sessions)
@@ -0,0 +1,196 @@
+import json
+
+import geopandas as gpd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyogrio
+import pytest
+import shapely
+
+import bin.download_fixed_coverage as fixed_module
+from guss import GUSS
+from guss.geometry import h3_polygons
+from guss.gussErrors import GussExceptions
+from guss.writers import drop_gpkg_layer, finish_output, partial_path, write_arrow_layer
+from tests.test_availability import HEX_IDS, write_availability_zip
+
+
+def polygon_batch(n):
+    polygons = shapely.buffer(shapely.points(range(n), range(n)), 0.4)
+    return pa.RecordBatch.from_arrays([pa.array(range(n)), pa.array(shapely.to_wkb(polygons))],
+                                      names=['value', 'geometry'])
+
+
+class PolygonizingGuss:
+    """
+    The parts of Guss the fixed dealer polygonizes with, fail_at or stop_at act on that polygonized chunk.
+    """
+
+    def __init__(self, fail_at=None, stop_at=None):
+        self.stop = None
+        self.calls = 0
+        self.fail_at = fail_at
+        self.stop_at = stop_at
+
+    def polygonize_many(self, hex_ids, executor=None):
+        self.calls += 1
+        if self.calls == self.fail_at:
+            raise RuntimeError("disk full")
+        if self.calls == self.stop_at:
+            self.stop = True
+        return h3_polygons(hex_ids)
+
+
+@pytest.fixture
+def availability_zip(tmp_path):
+    rows = [['1', '130077', 'Brand', 1000 + i, 40, 100, 10, 1, 'R', 'NY', '360610001000000', HEX_IDS[i % 5]]
+            for i in range(23)]
+    path = tmp_path / 'Provider_availability.zip'
+    write_availability_zip(path, rows)
+    return path
+
+
+@pytest.fixture
+def output_dirs(tmp_path, monkeypatch):
+    dirs = {}
+    for name in ('GPK_OUTPUT', 'SHP_OUTPUT', 'PARQUET_OUTPUT', 'FGB_OUTPUT'):
+        dirs[name] = tmp_path / name.lower()
+        dirs[name].mkdir()
+        monkeypatch.setattr(GUSS, name, dirs[name])
+    return dirs
+
+
+def fixed_dealer(gis_type, **kwargs):
+    return fixed_module.FixedCoverageDealer(gis_type=gis_type, csv_chunk_size=5, as_of_date='2024-06-30', **kwargs)
+
+
+def test_partial_shapefile_is_renamed_with_its_sidecars(tmp_path):
+    path = tmp_path / 'coverage.shp'
+    partial = partial_path(path)
+    write_arrow_layer(partial, [polygon_batch(3)], driver='ESRI Shapefile')
+
+    finish_output(partial, path)
+
+    assert sorted(file.name for file in tmp_path.iterdir()) == \
+        ['coverage.cpg', 'coverage.dbf', 'coverage.prj', 'coverage.shp', 'coverage.shx']
+    assert pyogrio.read_info(path)['features'] == 3
+
+
+def test_dropping_a_gpkg_layer_keeps_the_others(tmp_path):
+    path = tmp_path / 'run.gpkg'
+    write_arrow_layer(path, [polygon_batch(3)], layer='kept', driver='GPKG')
+    write_arrow_layer(path, [polygon_batch(4)], layer='partial', driver='GPKG')
+
+    drop_gpkg_layer(path, 'partial')
+
+    assert pyogrio.list_layers(path)[:, 0].tolist() == ['kept']
+    assert pyogrio.read_info(path, layer='kept')['features'] == 3
+    # the name is free again
+    write_arrow_layer(path, [polygon_batch(2)], layer='partial', driver='GPKG')
+    assert pyogrio.read_info(path, layer='partial')['features'] == 2
+
+
+@pytest.mark.parametrize('gis_type, folder', [('gpkg', 'GPK_OUTPUT'), ('shp', 'SHP_OUTPUT'),
+                                              ('parquet', 'PARQUET_OUTPUT'), ('fgb', 'FGB_OUTPUT')])
+@pytest.mark.parametrize('interruption', [{'stop_at': 2}, {'fail_at': 3}], ids=['stop', 'fail'])
+def test_interrupted_file_leaves_no_output(interruption, gis_type, folder, availability_zip, output_dirs):
+    with pytest.raises(GussExceptions):
+        fixed_dealer(gis_type).polygonize_file(PolygonizingGuss(**interruption), str(availability_zip))
+
+    assert list(output_dirs[folder].iterdir()) == []
+
+
+def test_interrupted_layer_is_dropped_from_the_consolidated_gpkg(tmp_path, availability_zip, output_dirs):
+    second_zip = tmp_path / 'Provider_second.zip'
+    second_zip.write_bytes(availability_zip.read_bytes())
+    dealer = fixed_dealer('gpkg', gpkg_layout='single', gpkg_layers='provider')
+    # 23 rows in chunks of 5: the first file takes calls 1 to 5, the second file stops at its second chunk
+    guss = PolygonizingGuss(stop_at=7)
+
+    with pytest.raises(GussExceptions):
+        dealer.polygonize_consolidated(guss, [str(availability_zip), str(second_zip)], {})
+
+    output = output_dirs['GPK_OUTPUT'] / 'availability_2024-06-30.gpkg'
+    assert pyogrio.list_layers(output)[:, 0].tolist() == ['Provider_availability']
+    assert pyogrio.read_info(output, layer='Provider_availability')['features'] == 23
+
+
+def read_polygonized(path, **kwargs):
+    return gpd.read_parquet(path, **kwargs) if str(path).endswith('.parquet') else gpd.read_file(path, **kwargs)
+
+
+@pytest.mark.parametrize('gis_type, folder, suffix', [('PARQUET', 'PARQUET_OUTPUT', '.parquet'),
+                                                      ('FGB', 'FGB_OUTPUT', '.fgb'), ('Gpkg', 'GPK_OUTPUT', '.gpkg')])
+def test_polygonized_file_round_trips(gis_type, folder, suffix, availability_zip, output_dirs):
+    dealer = fixed_dealer(gis_type, parquet_row_group_size=10)
+    dealer.polygonize_file(PolygonizingGuss(), str(availability_zip))
+
+    output = output_dirs[folder] / f"Provider_availability{suffix}"
+    # the FlatGeobuf spatial index orders the features along its tree
+    gdf = read_polygonized(output).sort_values('location_id', key=lambda x: x.astype(int), ignore_index=True)
+    assert len(gdf) == 23
+    assert gdf.crs.equals('OGC:CRS84' if suffix == '.parquet' else 'EPSG:4326')
+    expected = h3_polygons([HEX_IDS[i % 5] for i in range(23)])
+    assert shapely.equals(gdf.geometry.values, expected).all()
+    assert gdf['location_id'].astype(int).tolist() == [1000 + i for i in range(23)]
+
+
+def test_geoparquet_metadata_bbox_and_row_groups(availability_zip, output_dirs):
+    fixed_dealer('parquet', parquet_row_group_size=10).polygonize_file(PolygonizingGuss(), str(availability_zip))
+    output = output_dirs['PARQUET_OUTPUT'] / 'Provider_availability.parquet'
+
+    parquet_file = pq.ParquetFile(output)
+    geo = json.loads(parquet_file.schema_arrow.metadata[b'geo'])
+    assert geo['primary_column'] == 'geometry'
+    # no crs in the metadata: OGC:CRS84
+    assert 'crs' not in geo['columns']['geometry']
+    assert geo['columns']['geometry']['covering']['bbox']['xmin'] == ['bbox', 'xmin']
+    assert [parquet_file.metadata.row_group(i).num_rows for i in range(parquet_file.num_row_groups)] == [10, 10, 3]
+
+    table = pq.read_table(output, columns=['geometry', 'bbox'])
+    bounds = shapely.bounds(shapely.from_wkb(table['geometry'].to_numpy(zero_copy_only=False)))
+    assert [[box[key] for key in ('xmin', 'ymin', 'xmax', 'ymax')] for box in table['bbox'].to_pylist()] == \
+        bounds.tolist()
+    # readers filtering on the bbox covering skip the cells outside it
+    xmin, ymin, xmax, ymax = bounds[0]
+    assert len(read_polygonized(output, bbox=(xmin, ymin, xmax, ymax))) < 23
+
+
+def test_unknown_gis_type(availability_zip, output_dirs):
+    with pytest.raises(GussExceptions, match='gis_type'):
+        fixed_dealer('kml').polygonize_file(PolygonizingGuss(), str(availability_zip))
+
+
+@pytest.mark.parametrize('layout, layers, expected', [
+    ('single', 'provider', {'availability_2024-06-30.gpkg': {'Provider_a': 23, 'Provider_b': 23, 'Provider_c': 23}}),
+    ('single', 'partitioned', {'availability_2024-06-30.gpkg': {'availability': 69}}),
+    ('state', 'provider', {'availability_2024-06-30_36.gpkg': {'Provider_a': 23, 'Provider_b': 23},
+                           'availability_2024-06-30_06.gpkg': {'Provider_c': 23}}),
+    ('state', 'partitioned', {'availability_2024-06-30_36.gpkg': {'availability': 46},
+                              'availability_2024-06-30_06.gpkg': {'availability': 23}}),
+])
+def test_consolidated_gpkg_layouts(layout, layers, expected, tmp_path, availability_zip, output_dirs):
+    saved_outputs = []
+    for name in ('a', 'b', 'c'):
+        saved_output = tmp_path / f"Provider_{name}.zip"
+        saved_output.write_bytes(availability_zip.read_bytes())
+        saved_outputs.append(str(saved_output))
+    state_by_file = {'Provider_a.zip': '36', 'Provider_b.zip': '36', 'Provider_c.zip': '06'}
+
+    fixed_dealer('gpkg', gpkg_layout=layout, gpkg_layers=layers) \
+        .polygonize_consolidated(PolygonizingGuss(), saved_outputs, state_by_file)
+
+    written = {}
+    for output in sorted(output_dirs['GPK_OUTPUT'].iterdir()):
+        # every write_arrow call adds its layer, the layers written before it stay
+        written[output.name] = {layer: pyogrio.read_info(output, layer=layer)['features']
+                                for layer in pyogrio.list_layers(output)[:, 0]}
+    assert written == expected
+
+
+def test_polygon_workers_default_to_every_core(monkeypatch):
+    monkeypatch.setattr(fixed_module.os, 'cpu_count', lambda: 6)
+
+    # the Fixed tab passes no polygon_workers
+    assert fixed_dealer('gpkg').polygon_workers == 6
+    assert fixed_dealer('gpkg', polygon_workers=1).polygon_workers == 1